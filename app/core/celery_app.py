@@ -1,9 +1,125 @@
+from typing import Any, Dict, Iterable, Optional
+import time
+
 from celery import Celery
-from .config import CELERY_BROKER_URL, CELERY_RESULT_BACKEND
+from celery.signals import before_task_publish
+from kombu import Queue
+from .config import (
+    CELERY_BROKER_URL,
+    CELERY_RESULT_BACKEND,
+    CELERY_PREFETCH_MULTIPLIER,
+    HUGE_INPUT_BYTES,
+    HUGE_INPUT_PIXELS,
+    INLINE_MAX_BYTES,
+    TASK_RESULT_TTL,
+    SWEEP_INTERVAL,
+)
+from .worker_tuning import worker_settings
+
+# Очереди по классу стоимости: дешевые операции не ждут за тяжелыми,
+# огромные входные файлы обрабатываются отдельными воркерами
+QUEUE_FAST = "images.fast"
+QUEUE_HEAVY = "images.heavy"
+QUEUE_HUGE = "images.huge"
+
+# Класс стоимости операций (тип обработки -> очередь)
+OPERATION_QUEUES = {
+    "crop": QUEUE_FAST,
+    "grayscale": QUEUE_FAST,
+    "resize": QUEUE_FAST,
+    "sepia": QUEUE_HEAVY,
+    "color_matrix": QUEUE_HEAVY,
+    "pipeline": QUEUE_HEAVY,
+    "variants": QUEUE_HEAVY,
+}
+
+# Приоритеты запроса. В Redis-транспорте меньшее число забирается из очереди раньше.
+TASK_PRIORITIES = {"high": 0, "normal": 5, "low": 9}
 
 celery_app = Celery(
     'image_worker',
     broker=CELERY_BROKER_URL,
     backend=CELERY_RESULT_BACKEND,
     include=['app.tasks.tasks']
-)
\ No newline at end of file
+)
+
+celery_app.conf.update(
+    task_queues=[Queue(QUEUE_FAST), Queue(QUEUE_HEAVY), Queue(QUEUE_HUGE)],
+    task_default_queue=QUEUE_HEAVY,
+    task_routes={
+        "app.tasks.tasks.process_image_to_crop": {"queue": QUEUE_FAST},
+        "app.tasks.tasks.process_image_to_grayscale": {"queue": QUEUE_FAST},
+        "app.tasks.tasks.process_image_to_resize": {"queue": QUEUE_FAST},
+        "app.tasks.tasks.process_image_to_sepia": {"queue": QUEUE_HEAVY},
+        "app.tasks.tasks.process_image_pipeline": {"queue": QUEUE_HEAVY},
+        "app.tasks.tasks.process_image_inline": {"queue": QUEUE_FAST},
+        "app.tasks.tasks.process_image_variants": {"queue": QUEUE_HEAVY},
+        "app.tasks.tasks.sweep_expired_files": {"queue": QUEUE_FAST},
+    },
+    task_default_priority=TASK_PRIORITIES["normal"],
+    # Отдельный список Redis на каждый уровень приоритета (0..9)
+    broker_transport_options={
+        "priority_steps": list(range(10)),
+        "sep": ":",
+        "queue_order_strategy": "priority",
+    },
+    # Переопределяется для каждой очереди флагом --prefetch-multiplier воркера
+    worker_prefetch_multiplier=CELERY_PREFETCH_MULTIPLIER,
+    # Результаты задач (и метаданные групп) в Redis хранятся с этим TTL
+    result_expires=TASK_RESULT_TTL,
+    # Профиль воркера: процессы пула по числу ядер, перезапуск дочерних процессов
+    # по памяти и числу задач, компактная сериализация сообщений и результатов
+    **worker_settings(),
+    # Сборщик устаревших файлов запускается процессом celery beat
+    beat_schedule={
+        "sweep-expired-files": {
+            "task": "app.tasks.tasks.sweep_expired_files",
+            "schedule": SWEEP_INTERVAL,
+            "options": {"queue": QUEUE_FAST, "priority": TASK_PRIORITIES["low"], "expires": SWEEP_INTERVAL},
+        },
+    },
+)
+
+
+@before_task_publish.connect
+def stamp_enqueue_time(headers=None, **kwargs):
+    """
+    Добавляет в заголовки сообщения время постановки в очередь, чтобы воркер
+    мог замерить ожидание в очереди. Подключается здесь, а не в сигналах воркера:
+    API ставит задачи по имени и модуль задач не импортирует.
+    """
+    if headers is not None:
+        headers["enqueued_at"] = time.time()
+
+
+def select_queue(process_type: str, input_size: Optional[int] = None,
+                 operations: Optional[Iterable[Dict[str, Any]]] = None,
+                 pixels: Optional[int] = None) -> str:
+    """
+    Выбирает очередь для задачи: огромные входные файлы и изображения (по числу пикселей
+    из пробы заголовка) — в QUEUE_HUGE, маленькие (быстрый путь, до INLINE_MAX_BYTES) —
+    в QUEUE_FAST при любой операции, иначе по классу стоимости операции. Пайплайн
+    только из дешевых операций идет в QUEUE_FAST.
+    """
+    if input_size is not None and input_size >= HUGE_INPUT_BYTES:
+        return QUEUE_HUGE
+    if pixels is not None and HUGE_INPUT_PIXELS and pixels >= HUGE_INPUT_PIXELS:
+        return QUEUE_HUGE
+    if input_size is not None and input_size <= INLINE_MAX_BYTES:
+        return QUEUE_FAST
+    if process_type == "pipeline" and operations:
+        if all(OPERATION_QUEUES.get(operation["op"]) == QUEUE_FAST for operation in operations):
+            return QUEUE_FAST
+    return OPERATION_QUEUES.get(process_type, QUEUE_HEAVY)
+
+
+def task_routing(process_type: str, input_size: Optional[int] = None, priority: str = "normal",
+                 operations: Optional[Iterable[Dict[str, Any]]] = None,
+                 pixels: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Параметры apply_async (queue, priority) для задачи обработки.
+    """
+    return {
+        "queue": select_queue(process_type, input_size, operations, pixels),
+        "priority": TASK_PRIORITIES[priority],
+    }
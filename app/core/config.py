@@ -1,4 +1,153 @@
 import os
+from pathlib import Path
 
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
-CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
\ No newline at end of file
+CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
+# Сколько задач воркер резервирует на процесс (для отдельных очередей задается флагом воркера)
+CELERY_PREFETCH_MULTIPLIER = int(os.getenv("CELERY_PREFETCH_MULTIPLIER", "1"))
+# Профиль воркера: число процессов пула (0 — по числу доступных ядер с учетом cgroup),
+# перезапуск дочернего процесса, если после задачи его RSS больше WORKER_MAX_MEMORY_PER_CHILD
+# (КиБ, 0 — не ограничивать) или он выполнил WORKER_MAX_TASKS_PER_CHILD задач (0 — без ограничения).
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "0"))
+WORKER_MAX_MEMORY_PER_CHILD = int(os.getenv("WORKER_MAX_MEMORY_PER_CHILD", str(1024 * 1024)))
+WORKER_MAX_TASKS_PER_CHILD = int(os.getenv("WORKER_MAX_TASKS_PER_CHILD", "1000"))
+# Сериализация сообщений и результатов: "msgpack" (компактнее JSON, если установлен пакет msgpack)
+# или "json". CELERY_COMPRESSION — сжатие тел сообщений и результатов ("zlib", "gzip", "bzip2"
+# или пусто — без сжатия; полезно только для больших аргументов задач).
+CELERY_SERIALIZER = os.getenv("CELERY_SERIALIZER", "msgpack")
+CELERY_COMPRESSION = os.getenv("CELERY_COMPRESSION", "") or None
+# Входные файлы от этого размера направляются в отдельную очередь для огромных изображений
+HUGE_INPUT_BYTES = int(os.getenv("HUGE_INPUT_BYTES", str(25 * 1024 * 1024)))
+# ...и изображения от этого числа пикселей (по пробе заголовка): маленький сжатый файл
+# может распаковаться в сотни мегапикселей
+HUGE_INPUT_PIXELS = int(os.getenv("HUGE_INPUT_PIXELS", str(50_000_000)))
+# Предельный размер одного загружаемого изображения (и каждого изображения в zip-пакете);
+# больше — ответ 413 до сохранения
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(200 * 1024 * 1024)))
+
+# Кэш результатов: ключ = SHA-256 входного файла + операция и её параметры
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# Быстрый путь для маленьких изображений: загрузки до INLINE_MAX_BYTES (0 — выключено)
+# передаются воркеру и обратно через Redis и не записываются в хранилище файлов.
+# INLINE_BLOB_TTL — сколько секунд хранятся исходник и результат, если их не скачали.
+INLINE_MAX_BYTES = int(os.getenv("INLINE_MAX_BYTES", str(256 * 1024)))
+INLINE_BLOB_TTL = int(os.getenv("INLINE_BLOB_TTL", "600"))
+
+# Синхронный режим (?mode=sync): обработка в пуле потоков процесса API и ответ готовыми байтами.
+# SYNC_POOL_WORKERS — число потоков, SYNC_POOL_QUEUE — сколько запросов может ждать свободный поток.
+# Файлы больше SYNC_MAX_BYTES и запросы сверх емкости пула обрабатываются по политике
+# SYNC_SATURATED_POLICY: "celery" — обычная задача Celery (ответ 202), "reject" — ответ 429.
+SYNC_POOL_WORKERS = int(os.getenv("SYNC_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+SYNC_POOL_QUEUE = int(os.getenv("SYNC_POOL_QUEUE", "8"))
+SYNC_MAX_BYTES = int(os.getenv("SYNC_MAX_BYTES", str(4 * 1024 * 1024)))
+SYNC_SATURATED_POLICY = os.getenv("SYNC_SATURATED_POLICY", "celery")
+
+# Жизненный цикл файлов и результатов: периодическая задача Celery beat раз в SWEEP_INTERVAL секунд
+# удаляет исходники и результаты старше FILE_TTL_SECONDS (не больше SWEEP_BATCH_SIZE файлов за запуск),
+# а при заполнении тома хранилища выше DISK_HIGH_WATER (доля) удаляет самые старые файлы
+# всех областей до DISK_LOW_WATER. Результаты задач в Redis хранятся TASK_RESULT_TTL секунд.
+FILE_TTL_SECONDS = int(os.getenv("FILE_TTL_SECONDS", str(24 * 3600)))
+TASK_RESULT_TTL = int(os.getenv("TASK_RESULT_TTL", str(24 * 3600)))
+SWEEP_INTERVAL = float(os.getenv("SWEEP_INTERVAL", "300"))
+SWEEP_BATCH_SIZE = int(os.getenv("SWEEP_BATCH_SIZE", "1000"))
+DISK_HIGH_WATER = float(os.getenv("DISK_HIGH_WATER", "0.9"))
+DISK_LOW_WATER = float(os.getenv("DISK_LOW_WATER", "0.8"))
+# Сколько секунд результат остается доступным после скачивания (повторы, докачка по Range,
+# кэширующий прокси или CDN перед API). 0 — файлы удаляются сразу после первого полного скачивания.
+DOWNLOAD_GRACE_SECONDS = int(os.getenv("DOWNLOAD_GRACE_SECONDS", "0"))
+
+# Контроль допуска новых задач: ожидание в очереди оценивается по ее длине в брокере и числу
+# задач, завершенных воркерами за последние ADMISSION_THROUGHPUT_WINDOW секунд. Если оценка
+# больше ADMISSION_MAX_WAIT_SECONDS (0 — без ограничения) или очередь дольше этого предела не пуста
+# без единого завершения, запрос отклоняется с 503 и Retry-After.
+# ADMISSION_MAX_QUEUE_DEPTH — предел длины очереди, когда завершенных задач в окне нет (0 — без предела),
+# ADMISSION_DISK_LIMIT — заполнение тома хранилища, выше которого загрузки не принимаются,
+# ADMISSION_RETRY_AFTER — Retry-After (секунды), когда время ожидания оценить нельзя.
+ADMISSION_MAX_WAIT_SECONDS = int(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "300"))
+ADMISSION_THROUGHPUT_WINDOW = int(os.getenv("ADMISSION_THROUGHPUT_WINDOW", "60"))
+ADMISSION_MAX_QUEUE_DEPTH = int(os.getenv("ADMISSION_MAX_QUEUE_DEPTH", "0"))
+ADMISSION_DISK_LIMIT = float(os.getenv("ADMISSION_DISK_LIMIT", "0.97"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "10"))
+# Лимит запросов на обработку от одного клиента (token bucket в Redis): запросов в минуту
+# (0 — без лимита) и размер допустимого всплеска. Сверх лимита — ответ 429 с Retry-After.
+RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT_PER_MINUTE", "0"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "10"))
+
+# Объединение одинаковых запросов: пока задача с тем же ключом (хэш входа, операция, параметры)
+# стоит в очереди или выполняется, повторные запросы получают ее task_id.
+# COALESCE_LOCK_TTL — срок блокировки ключа в Redis, если задача не сняла ее сама (сбой воркера).
+COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "true").lower() == "true"
+COALESCE_LOCK_TTL = int(os.getenv("COALESCE_LOCK_TTL", "300"))
+
+# Адаптивные варианты (/variants): не больше VARIANTS_MAX_WIDTHS ширин и VARIANTS_MAX_FORMATS форматов
+# на запрос, ширина до VARIANT_MAX_WIDTH, число потоков кодирования вариантов в задаче
+VARIANTS_MAX_WIDTHS = int(os.getenv("VARIANTS_MAX_WIDTHS", "12"))
+VARIANTS_MAX_FORMATS = int(os.getenv("VARIANTS_MAX_FORMATS", "4"))
+VARIANT_MAX_WIDTH = int(os.getenv("VARIANT_MAX_WIDTH", "8192"))
+VARIANT_ENCODE_THREADS = int(os.getenv("VARIANT_ENCODE_THREADS", str(min(4, os.cpu_count() or 1))))
+
+# Пакетная обработка
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "1000"))
+# Предельный суммарный размер изображений zip-архива после распаковки (по заголовкам архива)
+BATCH_MAX_TOTAL_BYTES = int(os.getenv("BATCH_MAX_TOTAL_BYTES", str(2 * 1024 * 1024 * 1024)))
+
+# Изменение размера: фильтр передискретизации (nearest, box, bilinear, hamming, bicubic, lanczos)
+# и reducing_gap — во сколько раз промежуточный размер (JPEG draft / Image.reduce)
+# должен превышать целевой, чтобы сохранить качество.
+RESIZE_RESAMPLE = os.getenv("RESIZE_RESAMPLE", "bicubic")
+RESIZE_REDUCING_GAP = float(os.getenv("RESIZE_REDUCING_GAP", "3.0"))
+
+# Хранилище файлов: "local" (общий том DATA_DIR) или "s3" (S3-совместимое объектное хранилище)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+DATA_DIR = Path(os.getenv("DATA_DIR", "/app/data"))
+STORAGE_BUFFER_SIZE = int(os.getenv("STORAGE_BUFFER_SIZE", str(1024 * 1024)))
+# Локальное хранилище раскладывает файлы по подкаталогам из первых STORAGE_SHARD_CHARS символов
+# имени (UUID или SHA-256), чтобы ни в одном каталоге не было миллионов записей (0 — плоский каталог)
+STORAGE_SHARD_CHARS = int(os.getenv("STORAGE_SHARD_CHARS", "2"))
+S3_BUCKET = os.getenv("S3_BUCKET", "image-worker")
+S3_PREFIX = os.getenv("S3_PREFIX", "")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+
+# Redis для служебных данных приложения (pub/sub событий задач и т.п.)
+REDIS_URL = os.getenv("REDIS_URL", CELERY_BROKER_URL)
+
+# События задач (SSE/WebSocket): максимальная длительность подписки,
+# интервал heartbeat и время хранения последнего события задачи
+TASK_EVENTS_TIMEOUT = float(os.getenv("TASK_EVENTS_TIMEOUT", "300"))
+TASK_EVENTS_HEARTBEAT = float(os.getenv("TASK_EVENTS_HEARTBEAT", "15"))
+TASK_EVENTS_TTL = int(os.getenv("TASK_EVENTS_TTL", "3600"))
+# Кэш статусов завершенных задач (SUCCESS/FAILURE/REVOKED) в памяти процесса API:
+# время жизни записи в секундах (0 — не кэшировать) и максимальное число записей
+TASK_STATUS_CACHE_TTL = float(os.getenv("TASK_STATUS_CACHE_TTL", "30"))
+TASK_STATUS_CACHE_SIZE = int(os.getenv("TASK_STATUS_CACHE_SIZE", "10000"))
+
+# Большие изображения: предел Pillow на число пикселей (вместо защиты по умолчанию ~179 Мп),
+# потолок памяти на один декод в воркере, порог включения полосной обработки,
+# высота полосы и число потоков для обработки полос
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(1_000_000_000)))
+WORKER_MEMORY_LIMIT_BYTES = int(os.getenv("WORKER_MEMORY_LIMIT_BYTES", str(6 * 1024 * 1024 * 1024)))
+TILED_THRESHOLD_PIXELS = int(os.getenv("TILED_THRESHOLD_PIXELS", str(16_000_000)))
+TILE_STRIP_HEIGHT = int(os.getenv("TILE_STRIP_HEIGHT", "512"))
+TILE_THREADS = int(os.getenv("TILE_THREADS", str(min(4, os.cpu_count() or 1))))
+# Параллельная обработка одного большого изображения полосами: движок ("threads"; "processes" —
+# пул процессов над общей памятью; "auto" — процессы, если процесс воркера может их создавать,
+# иначе потоки), потолок параллелизма задачи (0 — все доступные ядра) и длина очереди задачи,
+# до которой задача занимает простаивающие ядра. При длинной очереди ядра заняты другими задачами.
+PARALLEL_ENGINE = os.getenv("PARALLEL_ENGINE", "auto")
+PARALLEL_MAX_WORKERS = int(os.getenv("PARALLEL_MAX_WORKERS", "0"))
+PARALLEL_QUEUE_THRESHOLD = int(os.getenv("PARALLEL_QUEUE_THRESHOLD", "2"))
+# Проба заголовка загрузки до сохранения: допустимые реальные форматы (по содержимому,
+# а не по Content-Type клиента) и предел длины стороны в пикселях (0 — без предела)
+UPLOAD_ALLOWED_FORMATS = [name.strip().upper() for name in os.getenv("UPLOAD_ALLOWED_FORMATS", "JPEG,PNG").split(",")]
+UPLOAD_MAX_DIMENSION = int(os.getenv("UPLOAD_MAX_DIMENSION", "65535"))
+
+# Выходные форматы: порядок предпочтения при output_format=auto и при
+# перекодировании результата по заголовку Accept в /download-result
+AUTO_OUTPUT_FORMATS = [name.strip() for name in os.getenv("AUTO_OUTPUT_FORMATS", "webp,avif,jpeg,png").split(",")]
+
+# Метрики Prometheus: порт HTTP-экспортера в главном процессе воркера Celery (0 — не запускать).
+# Для prefork-воркера нужен PROMETHEUS_MULTIPROC_DIR — общий каталог метрик дочерних процессов.
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9808"))
@@ -0,0 +1,260 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+import logging
+import os
+import time
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client import multiprocess
+
+from .config import CELERY_BROKER_URL, WORKER_METRICS_PORT
+
+logger = logging.getLogger(__name__)
+
+# Каталог для метрик нескольких процессов (prefork-воркер Celery, несколько процессов uvicorn).
+# prometheus_client читает его при импорте, поэтому он задается переменной окружения процесса.
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Границы гистограмм этапов: от долей миллисекунды (crop маленького файла) до минут (огромные входы)
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+STAGE_SECONDS = Histogram(
+    "image_stage_duration_seconds",
+    "Duration of a processing stage: upload, enqueue, queue_wait, decode, transform, encode, task",
+    ["operation", "stage"], buckets=STAGE_BUCKETS)
+REQUEST_SECONDS = Histogram(
+    "api_request_duration_seconds",
+    "HTTP handler duration including streaming of the response body",
+    ["handler", "method", "status"], buckets=STAGE_BUCKETS)
+BYTES_TOTAL = Counter(
+    "image_bytes",
+    "Image bytes received from clients (in) and produced by encoders (out)",
+    ["operation", "direction"])
+MEGAPIXELS_TOTAL = Counter(
+    "image_megapixels",
+    "Megapixels decoded for processing",
+    ["operation"])
+TASKS_TOTAL = Counter(
+    "image_tasks",
+    "Finished processing tasks by final state",
+    ["operation", "state"])
+CACHE_REQUESTS_TOTAL = Counter(
+    "result_cache_requests",
+    "Result cache lookups by outcome",
+    ["result"])
+SWEPT_FILES_TOTAL = Counter(
+    "storage_swept_files",
+    "Files deleted by the storage sweeper by area and reason: ttl, downloaded (grace period over), disk "
+    "or tmp (temporary file of an interrupted write)",
+    ["area", "reason"])
+SYNC_REQUESTS_TOTAL = Counter(
+    "sync_requests",
+    "Requests in synchronous mode by outcome: processed, fallback (to Celery), rejected (429)",
+    ["result"])
+ADMISSION_REJECTED_TOTAL = Counter(
+    "admission_rejected",
+    "Requests rejected before upload by reason: rate_limit (429), queue_wait, queue_depth or disk (503)",
+    ["reason"])
+
+_operation: ContextVar[str] = ContextVar("image_operation", default="unknown")
+
+
+def set_operation(operation: Optional[str]) -> None:
+    """
+    Задает имя операции для метрик, снятых в текущем контексте (задаче воркера).
+    """
+    _operation.set(operation or "unknown")
+
+
+def current_operation() -> str:
+    return _operation.get()
+
+
+def operation_for_task(task_name: str) -> str:
+    """
+    Имя операции по имени задачи: app.tasks.tasks.process_image_to_crop -> crop.
+    """
+    name = task_name.rsplit(".", 1)[-1]
+    for prefix in ("process_image_to_", "process_image_"):
+        if name.startswith(prefix):
+            return name[len(prefix):]
+    return name
+
+
+@contextmanager
+def stage_timer(stage: str, operation: Optional[str] = None):
+    """
+    Замеряет длительность этапа обработки; без operation берется операция текущего контекста.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(operation or current_operation(), stage).observe(time.perf_counter() - started)
+
+
+def observe_stage(stage: str, seconds: float, operation: Optional[str] = None) -> None:
+    STAGE_SECONDS.labels(operation or current_operation(), stage).observe(seconds)
+
+
+def count_bytes(direction: str, size: int, operation: Optional[str] = None) -> None:
+    BYTES_TOTAL.labels(operation or current_operation(), direction).inc(size)
+
+
+def count_megapixels(width: int, height: int, operation: Optional[str] = None) -> None:
+    MEGAPIXELS_TOTAL.labels(operation or current_operation()).inc(width * height / 1_000_000)
+
+
+class QueueDepthCollector:
+    """
+    Длина очередей брокера Celery на момент запроса /metrics (для Redis-брокера:
+    LLEN основного списка очереди и списков ее уровней приоритета).
+    """
+
+    def __init__(self, broker_url: str = CELERY_BROKER_URL):
+        self.broker_url = broker_url
+        self._client = None
+
+    def _queue_keys(self) -> dict[str, list[str]]:
+        from app.core.celery_app import celery_app
+
+        transport_options = celery_app.conf.broker_transport_options or {}
+        separator = transport_options.get("sep", "\x06\x16")
+        steps = transport_options.get("priority_steps", [0, 3, 6, 9])
+        return {
+            queue.name: [queue.name] + [f"{queue.name}{separator}{step}" for step in steps if step]
+            for queue in celery_app.conf.task_queues or ()
+        }
+
+    def depths(self) -> dict[str, int]:
+        """
+        Длина каждой очереди (одним конвейером LLEN). Для брокеров, отличных от Redis, — пустой словарь.
+        """
+        if not self.broker_url.startswith(("redis://", "rediss://")):
+            return {}
+        import redis
+
+        if self._client is None:
+            self._client = redis.Redis.from_url(self.broker_url, socket_timeout=1)
+        queue_keys = self._queue_keys()
+        pipe = self._client.pipeline(transaction=False)
+        for keys in queue_keys.values():
+            for key in keys:
+                pipe.llen(key)
+        lengths = iter(pipe.execute())
+        return {queue: sum(next(lengths) for _ in keys) for queue, keys in queue_keys.items()}
+
+    def collect(self):
+        gauge = GaugeMetricFamily("celery_queue_depth", "Messages waiting in a Celery queue", labels=["queue"])
+        try:
+            for queue, depth in self.depths().items():
+                gauge.add_metric([queue], depth)
+        except Exception as e:
+            logger.warning(f"Failed to collect queue depth: {e}")
+        yield gauge
+
+
+queue_depth_collector = QueueDepthCollector()
+_queue_registry = CollectorRegistry(auto_describe=False)
+_queue_registry.register(queue_depth_collector)
+
+
+def queue_depth(queue: str) -> Optional[int]:
+    """
+    Число сообщений в очереди брокера или None, если длину узнать не удалось.
+    """
+    try:
+        return queue_depth_collector.depths().get(queue)
+    except Exception as e:
+        logger.warning(f"Failed to read depth of queue {queue}: {e}")
+        return None
+
+
+def metrics_registry() -> CollectorRegistry:
+    """
+    Реестр для выдачи: в многопроцессном режиме собирает метрики всех процессов из MULTIPROC_DIR.
+    """
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    from prometheus_client import REGISTRY
+
+    return REGISTRY
+
+
+def render_metrics(include_queue_depth: bool = True) -> bytes:
+    """
+    Метрики в текстовом формате Prometheus.
+    """
+    output = generate_latest(metrics_registry())
+    if include_queue_depth:
+        output += generate_latest(_queue_registry)
+    return output
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware: длительность каждого обработчика по шаблону маршрута, методу и статусу.
+    Время считается до отправки последнего блока тела ответа, поэтому включает
+    потоковую отдачу файлов (FileResponse, StreamingResponse).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            handler = getattr(route, "path", None) or "unmatched"
+            REQUEST_SECONDS.labels(handler, scope["method"], str(status["code"])).observe(
+                time.perf_counter() - started)
+
+
+def prepare_multiprocess_dir() -> None:
+    """
+    Очищает файлы метрик прошлых запусков в MULTIPROC_DIR (вызывается в главном процессе
+    до запуска дочерних).
+    """
+    if not MULTIPROC_DIR:
+        return
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+    for name in os.listdir(MULTIPROC_DIR):
+        if name.endswith(".db"):
+            os.remove(os.path.join(MULTIPROC_DIR, name))
+
+
+def mark_process_dead(pid: int) -> None:
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
+
+
+
+def start_worker_metrics_server(port: int = WORKER_METRICS_PORT) -> bool:
+    """
+    Запускает HTTP-экспортер метрик воркера (в фоновом потоке главного процесса).
+    """
+    if not port:
+        return False
+    from prometheus_client import start_http_server
+
+    prepare_multiprocess_dir()
+    start_http_server(port, registry=metrics_registry())
+    logger.info(f"Worker metrics exporter listening on :{port}")
+    return True
@@ -0,0 +1,43 @@
+from typing import Optional
+
+import redis
+import redis.asyncio as aioredis
+
+from .config import REDIS_URL, CELERY_RESULT_BACKEND
+
+_redis: Optional[redis.Redis] = None
+_async_redis: Optional[aioredis.Redis] = None
+_async_backend_redis: Optional[aioredis.Redis] = None
+
+
+def get_redis() -> redis.Redis:
+    """
+    Возвращает общий синхронный клиент Redis процесса (с пулом соединений).
+    """
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis.from_url(REDIS_URL)
+    return _redis
+
+
+def get_async_redis() -> aioredis.Redis:
+    """
+    Возвращает общий асинхронный клиент Redis процесса (с пулом соединений).
+    """
+    global _async_redis
+    if _async_redis is None:
+        _async_redis = aioredis.Redis.from_url(REDIS_URL)
+    return _async_redis
+
+
+def get_async_backend_redis() -> aioredis.Redis:
+    """
+    Асинхронный клиент Redis бэкенда результатов Celery. Если бэкенд на том же Redis,
+    что и REDIS_URL, используется общий клиент и его пул соединений.
+    """
+    global _async_backend_redis
+    if CELERY_RESULT_BACKEND == REDIS_URL:
+        return get_async_redis()
+    if _async_backend_redis is None:
+        _async_backend_redis = aioredis.Redis.from_url(CELERY_RESULT_BACKEND)
+    return _async_backend_redis
@@ -0,0 +1,98 @@
+from pathlib import Path
+from typing import Any, Dict, Optional
+import importlib.util
+import io
+import logging
+import math
+import os
+
+from .config import (
+    WORKER_CONCURRENCY,
+    WORKER_MAX_MEMORY_PER_CHILD,
+    WORKER_MAX_TASKS_PER_CHILD,
+    CELERY_SERIALIZER,
+    CELERY_COMPRESSION,
+)
+
+logger = logging.getLogger(__name__)
+
+# Квота CPU контейнера (cgroup v2): "<квота> <период>" или "max <период>"
+CGROUP_CPU_MAX = Path("/sys/fs/cgroup/cpu.max")
+
+
+def available_cpus(cpu_max_path: Path = CGROUP_CPU_MAX) -> int:
+    """
+    Число ядер, доступных процессу: привязка к CPU (affinity) и квота cgroup контейнера.
+    os.cpu_count() в контейнере возвращает ядра всего хоста.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        quota, period = cpu_max_path.read_text().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def select_serializer(preferred: str = CELERY_SERIALIZER) -> str:
+    """
+    Сериализатор сообщений: msgpack, если он выбран и пакет установлен, иначе json.
+    """
+    if preferred == "msgpack" and importlib.util.find_spec("msgpack") is None:
+        logger.warning("CELERY_SERIALIZER=msgpack, but the 'msgpack' package is not installed; using json")
+        return "json"
+    return preferred
+
+
+def worker_settings(concurrency: int = WORKER_CONCURRENCY) -> Dict[str, Any]:
+    """
+    Настройки Celery профиля воркера. Флаги командной строки воркера
+    (--concurrency, --max-memory-per-child и т.п.) имеют приоритет.
+    """
+    serializer = select_serializer()
+    return {
+        "worker_concurrency": concurrency or available_cpus(),
+        "worker_max_memory_per_child": WORKER_MAX_MEMORY_PER_CHILD or None,
+        "worker_max_tasks_per_child": WORKER_MAX_TASKS_PER_CHILD or None,
+        "task_serializer": serializer,
+        "result_serializer": serializer,
+        # JSON принимается всегда: сообщения, поставленные до смены сериализатора, и внешние клиенты
+        "accept_content": sorted({serializer, "json"}),
+        "result_accept_content": sorted({serializer, "json"}),
+        "task_compression": CELERY_COMPRESSION,
+        "result_compression": CELERY_COMPRESSION,
+    }
+
+
+def preload_pillow(formats: Optional[tuple[str, ...]] = None) -> list[str]:
+    """
+    Загружает плагины Pillow и прогревает кодеки в главном процессе воркера до fork:
+    дочерние процессы получают уже инициализированные модули и библиотеки (copy-on-write)
+    и не платят за это на первой задаче. Возвращает прогретые форматы.
+    """
+    from PIL import Image
+
+    from app.services.formats import supported_output_formats, OUTPUT_FORMATS
+
+    Image.init()
+    warmed = []
+    sample = Image.new("RGB", (16, 16), "white")
+    for name in formats or supported_output_formats():
+        pillow_format = OUTPUT_FORMATS[name]["pillow"]
+        try:
+            buffer = io.BytesIO()
+            sample.save(buffer, format=pillow_format)
+            buffer.seek(0)
+            with Image.open(buffer) as decoded:
+                decoded.load()
+        except Exception as e:
+            logger.warning(f"Failed to warm up {pillow_format} codec: {e}")
+            continue
+        warmed.append(name)
+
+    logger.info(f"Preloaded Pillow {Image.__version__} codecs: {', '.join(warmed)}")
+    return warmed
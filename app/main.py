@@ -1,13 +1,47 @@
 
+from contextlib import asynccontextmanager
+import logging
+
 from fastapi import FastAPI
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response
 
+from app.core.metrics import CONTENT_TYPE_LATEST, MetricsMiddleware, render_metrics
 from app.routers.image_processing import router as image_router
+from app.services.storage import get_storage
+from app.services.sync_executor import sync_executor
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Подготовка процесса API при старте сервера, а не при импорте модулей: каталоги
+    хранилища. Недоступный том не мешает старту — ошибка будет у запросов, которым он нужен.
+    При остановке дожидается задач пула синхронного режима.
+    """
+    try:
+        await run_in_threadpool(get_storage().prepare)
+    except OSError as e:
+        logger.error(f"Failed to prepare storage: {e}")
+    yield
+    await run_in_threadpool(sync_executor.shutdown)
 
-app = FastAPI(title="Image Processing Worker API")
+
+app = FastAPI(title="Image Processing Worker API", lifespan=lifespan)
 
 app.include_router(image_router)
 
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Метрики Prometheus: этапы обработки, длительность обработчиков, глубина очередей, кэш.
+    """
+    return Response(await run_in_threadpool(render_metrics), media_type=CONTENT_TYPE_LATEST)
+
 origins = [
     "http://localhost:8000",
 ]
@@ -18,4 +52,5 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-)
\ No newline at end of file
+)
+app.add_middleware(MetricsMiddleware)
@@ -1,26 +1,107 @@
-from fastapi import APIRouter, File, UploadFile, Form, HTTPException
-from starlette.responses import JSONResponse, FileResponse
+from collections import Counter
+from contextlib import aclosing
+import hashlib
+import json
+from pathlib import Path
+
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, File, UploadFile, Form, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, FileResponse, Response, StreamingResponse
 from starlette.background import BackgroundTasks
+import zipfile
+
+from app.core.config import (
+    BATCH_MAX_FILES,
+    BATCH_MAX_TOTAL_BYTES,
+    UPLOAD_MAX_BYTES,
+    INLINE_MAX_BYTES,
+    SYNC_MAX_BYTES,
+    SYNC_SATURATED_POLICY,
+    DOWNLOAD_GRACE_SECONDS,
+    VARIANTS_MAX_WIDTHS,
+    VARIANTS_MAX_FORMATS,
+    VARIANT_MAX_WIDTH
+)
+from app.core.celery_app import select_queue, task_routing
+from app.core.metrics import SYNC_REQUESTS_TOTAL, count_bytes, set_operation, stage_timer
 
 from app.services.file_manager import (
     generate_filenames,
     save_uploaded_file,
+    save_stream,
+    is_zip_upload,
+    iter_zip_images,
+    ZipLimitError,
+    stream_zip,
     get_processed_file_path,
+    processed_file_exists,
+    stat_processed_file,
+    iter_processed_file,
+    transcode_processed_file,
+    delete_raw_file,
     cleanup_files
 )
+from app.services.formats import (
+    OUTPUT_FORMATS,
+    supported_output_formats,
+    format_for_filename,
+    media_type_for_filename,
+    negotiate_output_format,
+    negotiate_download_format
+)
+from app.services.admission import AdmissionRejected, check_admission, check_rate_limit
+from app.services.blob_store import put_blob, get_blob, delete_blobs, expire_blobs, transcode_blob
+from app.services.result_cache import build_cache_key, result_cache
+from app.services.coalescing import result_still_shared
+from app.services.probe import ImageProbeError, check_probe, probe_image
+from app.services.retention import schedule_result_expiry
+from app.services.sync_executor import PoolSaturatedError, sync_executor
+from app.services.task_events import iter_task_events
 from app.services.celery_service import (
     dispatch_image_processing_task_grayscale,
     dispatch_image_processing_task_resize,
     dispatch_image_processing_task_sepia,
     dispatch_image_processing_task_crop,
-    get_task_result,
-    get_task_status_data
+    dispatch_image_processing_task_pipeline,
+    dispatch_image_processing_task_inline,
+    dispatch_image_variants,
+    dispatch_batch,
+    dispatch_coalesced,
+    operations_for,
+    get_batch_task_metas,
+    store_completed_task_result,
+    get_task_meta_async,
+    task_status_data,
+    TASK_NAMES,
+    INLINE_TASK_NAME,
+    VARIANTS_TASK_NAME
 )
 
 
 router = APIRouter(prefix="",
     tags=["Image Processing"])
 
+# Допустимые операции пайплайна и их обязательные целочисленные параметры
+PIPELINE_OPERATION_PARAMS = {
+    "grayscale": (),
+    "sepia": (),
+    "resize": ("width", "height"),
+    "crop": ("left", "top", "right", "bottom"),
+    "color_matrix": (),
+}
+PIPELINE_MAX_OPERATIONS = 16
+COLOR_MATRIX_MAX_ABS_VALUE = 1024
+# Приоритет задачи, который клиент может указать в запросе
+TaskPriority = Literal["high", "normal", "low"]
+# Режим обработки: async — задача Celery и опрос статуса, sync — ответ готовыми байтами
+ProcessingMode = Literal["async", "sync"]
+# Сообщение WebSocket /task-events в паузах между событиями задачи
+WEBSOCKET_PING = json.dumps({"type": "ping"})
+# Значения output_format помимо конкретных форматов: исходный формат и выбор по заголовку Accept
+OUTPUT_FORMAT_CHOICES = ("original", "auto", *OUTPUT_FORMATS)
+
 def validate_image_file(image: UploadFile):
     """Общая функция для проверки типа файла."""
     if image.content_type not in ["image/jpeg", "image/png"]:
@@ -30,66 +111,467 @@ def validate_image_file(image: UploadFile):
             detail=f"Unsupported file type: {image.content_type}. Only JPG and PNG are allowed.")
 
 
-async def _common_processing_pipeline(image: UploadFile, process_type: str, **kwargs) -> JSONResponse:
+async def probe_upload(image: UploadFile, process_type: str, operations: Optional[list] = None) -> dict:
     """
-    Общий пайплайн для всех ручек обработки изображений.
-    Выполняет проверку, сохранение, диспетчеризацию Celery и форматирует ответ.
+    Проба загрузки до сохранения: читает только заголовок изображения и проверяет реальный
+    формат, размеры и число пикселей (и бюджет памяти воркера для цепочек, декодирующих
+    кадр целиком). Битые файлы, подмененные форматы и decompression bomb отклоняются
+    с 4xx, не занимая хранилище и воркер. Файлы больше UPLOAD_MAX_BYTES получают 413.
+    Возвращает метаданные для задачи.
     """
-    validate_image_file(image)
-    input_filename, output_filename = generate_filenames(image.filename, process_type)
-    await save_uploaded_file(image, input_filename)
+    if UPLOAD_MAX_BYTES and image.size is not None and image.size > UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Image exceeds the limit of {UPLOAD_MAX_BYTES} bytes.")
+    try:
+        with stage_timer("probe", process_type):
+            metadata = await run_in_threadpool(probe_image, image.file)
+        check_probe(metadata, operations)
+    except ImageProbeError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return metadata
+
+
+def _client_id(request: Request) -> str:
+    """
+    Клиент для лимита запросов: адрес подключения (за прокси — из заголовков, если
+    uvicorn запущен с --proxy-headers).
+    """
+    return request.client.host if request.client else "unknown"
+
+
+def _rejection(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+async def enforce_rate_limit(request: Request) -> None:
+    """
+    Зависимость ручек постановки задач: лимит запросов клиента (token bucket в Redis), сверх него 429.
+    """
+    try:
+        await run_in_threadpool(check_rate_limit, _client_id(request))
+    except AdmissionRejected as e:
+        raise _rejection(e)
+
+
+async def admit_jobs(queue: str, jobs: int = 1) -> None:
+    """
+    Контроль допуска до сохранения загрузки: 503 с Retry-After, если очередь не успеет
+    обработать новые задачи за допустимое время или том хранилища почти заполнен.
+    """
+    try:
+        await run_in_threadpool(check_admission, queue, jobs)
+    except AdmissionRejected as e:
+        raise _rejection(e)
+
+
+def encode_options_form(request: Request,
+                        output_format: str = Form("original"),
+                        quality: Optional[int] = Form(None, ge=1, le=100),
+                        effort: Optional[int] = Form(None, ge=0, le=9),
+                        progressive: Optional[bool] = Form(None),
+                        optimize: Optional[bool] = Form(None)) -> dict:
+    """
+    Общие параметры кодирования результата для всех ручек обработки.
+    quality — качество 1..100 (JPEG/WebP/AVIF), effort — усилие кодировщика 0..9
+    (0 — быстрее, 9 — меньше файл). output_format=auto выбирает формат по заголовку Accept.
+    Возвращает словарь только с заданными параметрами.
+    """
+    output_format = output_format.lower()
+    if output_format not in OUTPUT_FORMAT_CHOICES:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unknown output format: '{output_format}'. Allowed: {', '.join(OUTPUT_FORMAT_CHOICES)}.")
+    if output_format == "auto":
+        output_format = negotiate_output_format(request.headers.get("accept")) or "original"
+    elif output_format != "original" and output_format not in supported_output_formats():
+        raise HTTPException(
+            status_code=422,
+            detail=f"Output format '{output_format}' is not supported by this server.")
+
+    options = {
+        "format": None if output_format == "original" else output_format,
+        "quality": quality,
+        "effort": effort,
+        "progressive": progressive,
+        "optimize": optimize,
+    }
+    return {name: value for name, value in options.items() if value is not None}
+
+
+def _output_extension(process_type: str, encode_options: dict) -> Optional[str]:
+    """
+    Расширение выходного файла: по выбранному формату; сепия без явного формата
+    всегда пишется в JPEG; иначе — как у исходника (None).
+    """
+    if encode_options.get("format"):
+        return OUTPUT_FORMATS[encode_options["format"]]["extension"]
+    if process_type == "sepia":
+        return OUTPUT_FORMATS["jpeg"]["extension"]
+    return None
+
 
+def _cache_params(params: dict, encode_options: dict) -> dict:
+    """
+    Параметры для ключа кэша: настройки кодирования влияют на результат,
+    поэтому входят в ключ (только если заданы — ключи прежних запросов не меняются).
+    """
+    if not encode_options:
+        return params
+    return {**params, "encode": encode_options}
+
+
+def normalize_color_matrix(matrix, index: int = 0) -> list[list[float]]:
+    """
+    Проверяет пользовательскую цветовую матрицу 3x4:
+    [[r_R, r_G, r_B, r_offset], [g_R, ...], [b_R, ...]].
+    """
+    if (not isinstance(matrix, list) or len(matrix) != 3
+            or not all(isinstance(row, list) and len(row) == 4 for row in matrix)):
+        raise HTTPException(
+            status_code=422,
+            detail=f"Operation #{index} (color_matrix): 'matrix' must be a 3x4 list of numbers.")
+
+    normalized = []
+    for row in matrix:
+        if not all(isinstance(value, (int, float)) and not isinstance(value, bool)
+                   and abs(value) <= COLOR_MATRIX_MAX_ABS_VALUE for value in row):
+            raise HTTPException(
+                status_code=422,
+                detail=f"Operation #{index} (color_matrix): matrix values must be numbers "
+                       f"within ±{COLOR_MATRIX_MAX_ABS_VALUE}.")
+        normalized.append([float(value) for value in row])
+    return normalized
+
+
+def normalize_operation(operation, index: int = 0) -> dict:
+    """
+    Проверяет одну операцию вида {"op": "<имя>", <параметры>...}
+    и возвращает ее нормализованную копию только с известными параметрами.
+    """
+    if not isinstance(operation, dict) or operation.get("op") not in PIPELINE_OPERATION_PARAMS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Operation #{index} is invalid. Allowed: {', '.join(PIPELINE_OPERATION_PARAMS)}.")
+
+    name = operation["op"]
+    params = {}
+    for param in PIPELINE_OPERATION_PARAMS[name]:
+        value = operation.get(param)
+        if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Operation #{index} ({name}): '{param}' must be a non-negative integer.")
+        params[param] = value
+
+    if name == "resize" and not all(16 <= params[p] <= 4096 for p in ("width", "height")):
+        raise HTTPException(
+            status_code=422,
+            detail=f"Operation #{index} (resize): width and height must be between 16 and 4096.")
+    if name == "crop" and (params["right"] <= params["left"] or params["bottom"] <= params["top"]):
+        raise HTTPException(
+            status_code=422,
+            detail=f"Operation #{index} (crop): crop area is invalid.")
+    if name == "color_matrix":
+        params["matrix"] = normalize_color_matrix(operation.get("matrix"), index)
+
+    return {"op": name, **params}
+
+
+def parse_pipeline_operations(raw_operations: str) -> list[dict]:
+    """
+    Разбирает и проверяет JSON-список операций пайплайна.
+    Возвращает нормализованный список вида [{"op": "resize", "width": 100, "height": 100}, ...].
+    """
+    try:
+        operations = json.loads(raw_operations)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=422, detail="Operations must be a valid JSON list.")
+
+    if not isinstance(operations, list) or not operations:
+        raise HTTPException(status_code=422, detail="Operations must be a non-empty JSON list.")
+    if len(operations) > PIPELINE_MAX_OPERATIONS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Too many operations: {len(operations)}. Maximum is {PIPELINE_MAX_OPERATIONS}.")
+
+    return [normalize_operation(operation, index) for index, operation in enumerate(operations)]
+
+
+def _specific_response_data(process_type: str, **kwargs) -> dict:
+    """
+    Возвращает поля ответа, специфичные для типа обработки.
+    """
+    if process_type == "sepia":
+        return {"effect": 'sepia'}
+    if process_type == "resize":
+        return {"size": f"{kwargs['width']}x{kwargs['height']}"}
+    if process_type == "crop":
+        return {"crop_box": (kwargs['left'], kwargs['top'], kwargs['right'], kwargs['bottom'])}
+    if process_type == "pipeline":
+        return {"operations": [operation["op"] for operation in kwargs['operations']]}
+    if process_type == "color_matrix":
+        return {"matrix": kwargs['matrix']}
+    return {}
+
+
+def _complete_from_cache(cache_key: str, input_filename: str, output_filename: str,
+                         specific_data: dict) -> str | None:
+    """
+    При попадании в кэш копирует готовый результат в область PROCESSED и
+    записывает завершенную задачу в бэкенд результатов без постановки в очередь.
+    Возвращает id задачи или None при промахе.
+    """
+    if not result_cache.lookup(cache_key):
+        return None
+    if not result_cache.materialize(cache_key, output_filename):
+        return None
+
+    # Исходник больше не нужен: результат уже готов
+    delete_raw_file(input_filename)
+
+    result = {"status": "COMPLETED", "input": input_filename, "output": output_filename, "cached": True}
+    result.update(specific_data)
+    return store_completed_task_result(result)
+
+
+def _dispatch_task(process_type: str, input_filename: str, output_filename: str, cache_key: str,
+                   encode_options: dict, routing: dict, source: Optional[dict] = None, **kwargs):
+    """
+    Ставит задачу Celery для типа обработки.
+    """
+    options = {"cache_key": cache_key, "encode_options": encode_options, "routing": routing, "source": source}
     if process_type == "grayscale":
-        task = dispatch_image_processing_task_grayscale(input_filename, output_filename)
-        specific_data = {}
-    elif process_type == "sepia":
-        task = dispatch_image_processing_task_sepia(input_filename, output_filename)
-        specific_data = {"effect": 'sepia'}
-    elif process_type == "resize":
-        task = dispatch_image_processing_task_resize(input_filename, output_filename,
-                                                     kwargs['width'], kwargs['height'])
-        specific_data = {"size": f"{kwargs['width']}x{kwargs['height']}"}
-    elif process_type == "crop":
-        task = dispatch_image_processing_task_crop(input_filename, output_filename,
+        return dispatch_image_processing_task_grayscale(input_filename, output_filename, **options)
+    if process_type == "sepia":
+        return dispatch_image_processing_task_sepia(input_filename, output_filename, **options)
+    if process_type == "resize":
+        return dispatch_image_processing_task_resize(input_filename, output_filename,
+                                                     kwargs['width'], kwargs['height'], **options)
+    if process_type == "crop":
+        return dispatch_image_processing_task_crop(input_filename, output_filename,
                                                    kwargs['left'], kwargs['top'],
-                                                   kwargs['right'], kwargs['bottom'])
-        specific_data = {"crop_box": (kwargs['left'], kwargs['top'], kwargs['right'], kwargs['bottom'])}
-    else:
+                                                   kwargs['right'], kwargs['bottom'], **options)
+    if process_type == "color_matrix":
+        return dispatch_image_processing_task_pipeline(input_filename, output_filename,
+                                                       [{"op": "color_matrix", "matrix": kwargs['matrix']}],
+                                                       **options)
+    return dispatch_image_processing_task_pipeline(input_filename, output_filename,
+                                                   kwargs['operations'], **options)
+
+
+def _is_inline_upload(image: UploadFile) -> bool:
+    """
+    Быстрый путь: маленький файл (до INLINE_MAX_BYTES) обрабатывается в памяти через Redis,
+    минуя хранилище файлов и кэш результатов.
+    """
+    return bool(INLINE_MAX_BYTES) and image.size is not None and image.size <= INLINE_MAX_BYTES
+
+
+async def _inline_processing(image: UploadFile, process_type: str, output_filename: str,
+                             encode_options: dict, priority: TaskPriority, source: Optional[dict] = None,
+                             **kwargs) -> JSONResponse:
+    """
+    Кладет маленькое изображение в Redis и ставит задачу быстрого пути в QUEUE_FAST.
+    """
+    with stage_timer("upload", process_type):
+        data = await image.read()
+        input_key = await run_in_threadpool(put_blob, data)
+    count_bytes("in", len(data), process_type)
+
+    routing = task_routing(process_type, len(data), priority, kwargs.get("operations"),
+                           source["pixels"] if source else None)
+    with stage_timer("enqueue", process_type):
+        task = dispatch_image_processing_task_inline(input_key, output_filename, process_type, kwargs,
+                                                     encode_options=encode_options, routing=routing,
+                                                     source=source)
+
+    response_data = {
+        'task_id': task.id,
+        'status_url': f'/task-status/{task.id}',
+        'original_filename': image.filename,
+        'task_name': INLINE_TASK_NAME,
+        'cached': False,
+        'inline': True,
+        'queue': routing["queue"],
+    }
+    response_data.update(_specific_response_data(process_type, **kwargs))
+    response_data["output_format"] = format_for_filename(output_filename)
+    return JSONResponse(response_data)
+
+
+def _process_in_pool(data: bytes, output_filename: str, process_type: str, params: dict,
+                     encode_options: dict) -> memoryview:
+    """
+    Обработка синхронного режима в потоке пула. Ошибки изображения превращаются в ответы 4xx.
+    """
+    from PIL import Image, UnidentifiedImageError
+    from app.services.image_processor import process_image_bytes
+    from app.services.tiling import ImageTooLargeError
+
+    set_operation(process_type)
+    try:
+        return process_image_bytes(data, output_filename, operations_for(process_type, params),
+                                   encode_options or None)
+    except (ImageTooLargeError, Image.DecompressionBombError) as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except (UnidentifiedImageError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Cannot process image: {e}")
+
+
+async def _sync_processing(image: UploadFile, process_type: str, output_filename: str,
+                           encode_options: dict, **kwargs) -> Optional[Response]:
+    """
+    Синхронный режим: обрабатывает изображение в ограниченном пуле потоков процесса API
+    и возвращает готовые байты. Возвращает None, если запрос нужно отдать Celery:
+    файл больше SYNC_MAX_BYTES или пул занят при политике "celery".
+    При политике "reject" занятый пул отвечает 429.
+    """
+    if image.size is None or image.size > SYNC_MAX_BYTES:
+        SYNC_REQUESTS_TOTAL.labels("fallback").inc()
+        return None
+
+    with stage_timer("upload", process_type):
+        data = await image.read()
+    try:
+        with stage_timer("task", process_type):
+            content = await sync_executor.run(_process_in_pool, data, output_filename, process_type, kwargs,
+                                              encode_options)
+    except PoolSaturatedError:
+        if SYNC_SATURATED_POLICY == "reject":
+            SYNC_REQUESTS_TOTAL.labels("rejected").inc()
+            raise HTTPException(status_code=429, detail="Too many synchronous requests, retry later.",
+                                headers={"Retry-After": "1"})
+        SYNC_REQUESTS_TOTAL.labels("fallback").inc()
+        await image.seek(0)
+        return None
+
+    count_bytes("in", len(data), process_type)
+    SYNC_REQUESTS_TOTAL.labels("processed").inc()
+    return Response(content, media_type=media_type_for_filename(output_filename),
+                    headers={"Content-Disposition": f'attachment; filename="{output_filename}"'})
+
+
+async def _common_processing_pipeline(image: UploadFile, process_type: str,
+                                      encode_options: Optional[dict] = None, priority: TaskPriority = "normal",
+                                      mode: ProcessingMode = "async", **kwargs) -> Response:
+    """
+    Общий пайплайн для всех ручек обработки изображений.
+    Выполняет проверку, сохранение, поиск в кэше результатов,
+    диспетчеризацию Celery (очередь по стоимости операции и размеру файла) и форматирует ответ.
+    В синхронном режиме возвращает обработанное изображение, а если запрос ушел
+    в Celery — обычный ответ с task_id и статусом 202.
+    """
+    validate_image_file(image)
+    if process_type not in TASK_NAMES:
         raise HTTPException(status_code=500, detail=f"Internal error: Unknown process type '{process_type}'.")
+    source = await probe_upload(image, process_type, operations_for(process_type, kwargs))
+
+    encode_options = encode_options or {}
+    input_filename, output_filename = generate_filenames(image.filename, process_type,
+                                                         _output_extension(process_type, encode_options))
+    if mode == "sync":
+        response = await _sync_processing(image, process_type, output_filename, encode_options, **kwargs)
+        if response is not None:
+            return response
+        response = await _enqueue_processing(image, process_type, input_filename, output_filename,
+                                             encode_options, priority, source, **kwargs)
+        response.status_code = 202
+        return response
+    return await _enqueue_processing(image, process_type, input_filename, output_filename,
+                                     encode_options, priority, source, **kwargs)
+
+
+async def _enqueue_processing(image: UploadFile, process_type: str, input_filename: str, output_filename: str,
+                              encode_options: dict, priority: TaskPriority, source: Optional[dict] = None,
+                              **kwargs) -> JSONResponse:
+    """
+    Асинхронная обработка: быстрый путь через Redis, кэш результатов или задача Celery.
+    source — метаданные пробы заголовка, передаются в задачу.
+    """
+    await admit_jobs(select_queue(process_type, image.size, kwargs.get("operations"),
+                                  source["pixels"] if source else None))
+    if _is_inline_upload(image):
+        return await _inline_processing(image, process_type, output_filename, encode_options, priority,
+                                        source, **kwargs)
+
+    hasher = hashlib.sha256()
+    with stage_timer("upload", process_type):
+        input_size = await save_uploaded_file(image, input_filename, hasher=hasher)
+    count_bytes("in", input_size, process_type)
+
+    cache_key = build_cache_key(hasher.hexdigest(), process_type, _cache_params(kwargs, encode_options),
+                                Path(output_filename).suffix)
+    specific_data = _specific_response_data(process_type, **kwargs)
+    specific_data["output_format"] = format_for_filename(output_filename)
+
+    cached_task_id = _complete_from_cache(cache_key, input_filename, output_filename, specific_data)
+    if cached_task_id is not None:
+        response_data = {
+            'task_id': cached_task_id,
+            'status_url': f'/task-status/{cached_task_id}',
+            'original_filename': image.filename,
+            'task_name': TASK_NAMES[process_type],
+            'cached': True,
+        }
+        response_data.update(specific_data)
+        return JSONResponse(response_data)
+
+    routing = task_routing(process_type, input_size, priority, kwargs.get("operations"),
+                           source["pixels"] if source else None)
+    with stage_timer("enqueue", process_type):
+        task, coalesced = dispatch_coalesced(
+            cache_key,
+            lambda options: _dispatch_task(process_type, input_filename, output_filename, cache_key,
+                                           encode_options, options, source, **kwargs),
+            routing)
+    if coalesced:
+        # Результат даст уже поставленная задача с тем же входом и параметрами
+        delete_raw_file(input_filename)
 
     response_data = {
         'task_id': task.id,
         'status_url': f'/task-status/{task.id}',
         'original_filename': image.filename,
-        'task_name': task.name,
+        'task_name': TASK_NAMES[process_type],
+        'cached': False,
+        'coalesced': coalesced,
+        'queue': routing["queue"],
     }
 
     response_data.update(specific_data)
     return JSONResponse(response_data)
 
 
-@router.post('/sepia')
-async def process_to_sepia(image: UploadFile = File(...)):
+@router.post('/sepia', dependencies=[Depends(enforce_rate_limit)])
+async def process_to_sepia(image: UploadFile = File(...),
+                           priority: TaskPriority = Form("normal"),
+                           mode: ProcessingMode = Query("async"),
+                           encode_options: dict = Depends(encode_options_form)):
     """
     Принимает изображение, сохраняет его и ставит задачу Celery на асинхронную
     обработку для применения эффекта сепии.
     """
-    return await _common_processing_pipeline(image, "sepia")
+    return await _common_processing_pipeline(image, "sepia", encode_options, priority, mode)
 
 
-@router.post("/grayscale")
-async def process_to_grayscale(image: UploadFile = File(...)):
+@router.post("/grayscale", dependencies=[Depends(enforce_rate_limit)])
+async def process_to_grayscale(image: UploadFile = File(...),
+                               priority: TaskPriority = Form("normal"),
+                               mode: ProcessingMode = Query("async"),
+                               encode_options: dict = Depends(encode_options_form)):
     """
     Принимает изображение, сохраняет его и ставит задачу Celery на асинхронную
     обработку для преобразования в оттенки серого.
     """
-    return await _common_processing_pipeline(image, "grayscale")
+    return await _common_processing_pipeline(image, "grayscale", encode_options, priority, mode)
 
 
-@router.post("/resize")
+@router.post("/resize", dependencies=[Depends(enforce_rate_limit)])
 async def process_to_resize(image: UploadFile = File(...),
                             width: int = Form(..., ge=16, le=4096),
-                            height: int = Form(..., ge=16, le=4096)):
+                            height: int = Form(..., ge=16, le=4096),
+                            priority: TaskPriority = Form("normal"),
+                            mode: ProcessingMode = Query("async"),
+                            encode_options: dict = Depends(encode_options_form)):
     """
     Принимает изображение и параметры размера, сохраняет файл и ставит задачу
     Celery на изменение размера изображения.
@@ -97,14 +579,20 @@ async def process_to_resize(image: UploadFile = File(...),
     return await _common_processing_pipeline(
         image,
         "resize",
+        encode_options,
+        priority,
+        mode,
         width=width,
         height=height
     )
 
-@router.post("/crop")
+@router.post("/crop", dependencies=[Depends(enforce_rate_limit)])
 async def process_to_crop(image: UploadFile = File(...),
                           left: int = Form(..., ge=0), top: int = Form(..., ge=0),
-                          right: int = Form(..., ge=0), bottom: int = Form(..., ge=0)):
+                          right: int = Form(..., ge=0), bottom: int = Form(..., ge=0),
+                          priority: TaskPriority = Form("normal"),
+                          mode: ProcessingMode = Query("async"),
+                          encode_options: dict = Depends(encode_options_form)):
     """
     Принимает изображение и координаты, сохраняет файл и ставит задачу
     Celery на обрезку изображения.
@@ -124,30 +612,667 @@ async def process_to_crop(image: UploadFile = File(...),
     return await _common_processing_pipeline(
         image,
         "crop",
+        encode_options,
+        priority,
+        mode,
         left=left, top=top, right=right, bottom=bottom
     )
 
 
+@router.post("/color-matrix", dependencies=[Depends(enforce_rate_limit)])
+async def process_color_matrix(image: UploadFile = File(...),
+                               matrix: str = Form(...),
+                               priority: TaskPriority = Form("normal"),
+                               mode: ProcessingMode = Query("async"),
+                               encode_options: dict = Depends(encode_options_form)):
+    """
+    Принимает изображение и пользовательскую цветовую матрицу 3x4 в JSON,
+    например [[0.393, 0.769, 0.189, 0], [0.349, 0.686, 0.168, 0], [0.272, 0.534, 0.131, 0]],
+    и ставит задачу Celery на ее применение одним проходом по пикселям.
+    """
+    validate_image_file(image)
+    return await _common_processing_pipeline(
+        image,
+        "color_matrix",
+        encode_options,
+        priority,
+        mode,
+        matrix=_parse_matrix_field(matrix)
+    )
+
+
+@router.post("/pipeline", dependencies=[Depends(enforce_rate_limit)])
+async def process_pipeline(image: UploadFile = File(...),
+                           operations: str = Form(...),
+                           priority: TaskPriority = Form("normal"),
+                           mode: ProcessingMode = Query("async"),
+                           encode_options: dict = Depends(encode_options_form)):
+    """
+    Принимает изображение и упорядоченный JSON-список операций, например
+    [{"op": "crop", "left": 0, "top": 0, "right": 500, "bottom": 500},
+     {"op": "resize", "width": 256, "height": 256}, {"op": "grayscale"}],
+    и ставит одну задачу Celery, которая выполняет всю цепочку за одно
+    декодирование и одно кодирование.
+    """
+    validate_image_file(image)
+    parsed_operations = parse_pipeline_operations(operations)
+    return await _common_processing_pipeline(
+        image,
+        "pipeline",
+        encode_options,
+        priority,
+        mode,
+        operations=parsed_operations
+    )
+
+
+def parse_variant_widths(raw_widths: str) -> list[int]:
+    """
+    Разбирает ширины вариантов: JSON-массив или значения через запятую ("320,640,1280").
+    Возвращает уникальные ширины по возрастанию.
+    """
+    try:
+        values = json.loads(raw_widths) if raw_widths.strip().startswith("[") else raw_widths.split(",")
+        widths = sorted({int(value) for value in values})
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=422, detail="Widths must be a list of integers, e.g. '320,640,1280'.")
+    if not widths:
+        raise HTTPException(status_code=422, detail="At least one width is required.")
+    if len(widths) > VARIANTS_MAX_WIDTHS:
+        raise HTTPException(status_code=422, detail=f"Too many widths: at most {VARIANTS_MAX_WIDTHS} are allowed.")
+    if widths[0] < 16 or widths[-1] > VARIANT_MAX_WIDTH:
+        raise HTTPException(status_code=422, detail=f"Widths must be between 16 and {VARIANT_MAX_WIDTH}.")
+    return widths
+
+
+def parse_variant_formats(raw_formats: str, original_filename: str, encode_options: dict) -> list[str]:
+    """
+    Разбирает форматы вариантов через запятую ("webp,avif,jpeg"). Без списка берется
+    output_format запроса или формат исходника ("original").
+    """
+    names = [name.strip().lower() for name in raw_formats.split(",") if name.strip()]
+    formats = []
+    for name in names or [encode_options.get("format") or "original"]:
+        if name == "original":
+            name = format_for_filename(original_filename) or "jpeg"
+        elif name not in OUTPUT_FORMATS:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Unknown output format: '{name}'. Allowed: original, {', '.join(OUTPUT_FORMATS)}.")
+        elif name not in supported_output_formats():
+            raise HTTPException(status_code=422, detail=f"Output format '{name}' is not supported by this server.")
+        if name not in formats:
+            formats.append(name)
+    if len(formats) > VARIANTS_MAX_FORMATS:
+        raise HTTPException(status_code=422, detail=f"Too many formats: at most {VARIANTS_MAX_FORMATS} are allowed.")
+    return formats
+
+
+@router.post("/variants", dependencies=[Depends(enforce_rate_limit)])
+async def process_variants(image: UploadFile = File(...),
+                           widths: str = Form(...),
+                           formats: str = Form(""),
+                           priority: TaskPriority = Form("normal"),
+                           encode_options: dict = Depends(encode_options_form)):
+    """
+    Принимает изображение, ширины (например "320,640,1280") и форматы (например "webp,avif,jpeg")
+    и ставит одну задачу Celery, которая строит все варианты (srcset) за одно декодирование.
+    Готовые варианты доступны по манифесту /variants/{task_id}: по ссылке на каждый или zip-архивом.
+    """
+    validate_image_file(image)
+    parsed_widths = parse_variant_widths(widths)
+    parsed_formats = parse_variant_formats(formats, image.filename, encode_options)
+    encode_options = {name: value for name, value in encode_options.items() if name != "format"}
+    source = await probe_upload(image, "variants")
+    await admit_jobs(select_queue("variants", image.size, pixels=source["pixels"]))
+
+    input_filename, output_filename = generate_filenames(image.filename, "variants")
+    with stage_timer("upload", "variants"):
+        input_size = await save_uploaded_file(image, input_filename)
+    count_bytes("in", input_size, "variants")
+
+    routing = task_routing("variants", input_size, priority, pixels=source["pixels"])
+    with stage_timer("enqueue", "variants"):
+        task = dispatch_image_variants(input_filename, Path(output_filename).stem, parsed_widths, parsed_formats,
+                                       encode_options or None, routing, source)
+
+    return JSONResponse({
+        'task_id': task.id,
+        'status_url': f'/task-status/{task.id}',
+        'manifest_url': f'/variants/{task.id}',
+        'zip_url': f'/variants/{task.id}/zip',
+        'original_filename': image.filename,
+        'task_name': VARIANTS_TASK_NAME,
+        'queue': routing["queue"],
+        'widths': parsed_widths,
+        'formats': parsed_formats,
+    })
+
+
+async def _finished_variants(task_id: str) -> Optional[list[dict]]:
+    """
+    Манифест вариантов готовой задачи или None, если задача еще выполняется.
+    """
+    data = task_status_data(await get_task_meta_async(task_id))
+    if not data["ready"]:
+        return None
+    if not data["successful"]:
+        raise HTTPException(status_code=500, detail=f"Task failed to generate variants: {data['result']}")
+    result = data["result"]
+    if not isinstance(result, dict) or "variants" not in result:
+        raise HTTPException(status_code=404, detail=f"Task has no image variants: {task_id}")
+    return result["variants"]
+
+
+def _variant_archive_name(variant: dict) -> str:
+    return f"{variant['width']}w{OUTPUT_FORMATS[variant['format']]['extension']}"
+
+
+@router.get("/variants/{task_id}")
+async def get_variants_manifest(task_id: str):
+    """
+    Возвращает манифест вариантов: размеры, формат, размер файла и ссылку на скачивание каждого.
+    """
+    variants = await _finished_variants(task_id)
+    if variants is None:
+        return JSONResponse(status_code=202, content={"message": "Processing is still in progress. Check status later."})
+    return JSONResponse({
+        "task_id": task_id,
+        "zip_url": f"/variants/{task_id}/zip",
+        "variants": [{**variant, "url": f"/variants/{task_id}/{variant['filename']}"} for variant in variants],
+    })
+
+
+@router.get("/variants/{task_id}/zip")
+async def download_variants_zip(task_id: str):
+    """
+    Потоково отдает zip-архив со всеми вариантами (имена вида 640w.webp).
+    Файлы не удаляются: их удаляет сборщик по TTL.
+    """
+    variants = await _finished_variants(task_id)
+    if variants is None:
+        return JSONResponse(status_code=202, content={"message": "Processing is still in progress. Check status later."})
+    entries = [(variant["filename"], _variant_archive_name(variant)) for variant in variants
+               if processed_file_exists(variant["filename"])]
+    if not entries:
+        raise HTTPException(status_code=410, detail=f"Image variants have expired: {task_id}")
+    return StreamingResponse(stream_zip(entries),
+                             media_type="application/zip",
+                             headers={"Content-Disposition": f'attachment; filename="variants_{task_id}.zip"'})
+
+
+@router.get("/variants/{task_id}/{filename}")
+async def download_variant(task_id: str, filename: str):
+    """
+    Отдает один вариант из манифеста задачи. Файлы не удаляются: их удаляет сборщик по TTL.
+    """
+    variants = await _finished_variants(task_id)
+    if variants is None:
+        return JSONResponse(status_code=202, content={"message": "Processing is still in progress. Check status later."})
+    variant = next((variant for variant in variants if variant["filename"] == filename), None)
+    if variant is None:
+        raise HTTPException(status_code=404, detail=f"Variant not found: {filename}")
+    if not processed_file_exists(filename):
+        raise HTTPException(status_code=410, detail=f"Image variant has expired: {filename}")
+
+    file_path = get_processed_file_path(filename)
+    if file_path is None:
+        return StreamingResponse(iter_processed_file(filename),
+                                 media_type=variant["media_type"],
+                                 headers={"Content-Length": str(variant["size_bytes"])})
+    return FileResponse(file_path, media_type=variant["media_type"])
+
+
+def _parse_matrix_field(matrix: Optional[str]) -> list:
+    """
+    Разбирает поле формы с JSON-матрицей 3x4.
+    """
+    if matrix is None:
+        raise HTTPException(status_code=422, detail="Field 'matrix' is required for color_matrix.")
+    try:
+        return normalize_color_matrix(json.loads(matrix))
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=422, detail="Matrix must be a valid JSON 3x4 list.")
+
+
+def _batch_params(operation: str, operations: Optional[str], matrix: Optional[str], **form_params) -> dict:
+    """
+    Проверяет параметры пакетной операции и возвращает их в нормализованном виде.
+    """
+    if operation == "color_matrix":
+        return {"matrix": _parse_matrix_field(matrix)}
+    if operation == "pipeline":
+        if operations is None:
+            raise HTTPException(status_code=422, detail="Field 'operations' is required for pipeline batches.")
+        return {"operations": parse_pipeline_operations(operations)}
+    if operation not in PIPELINE_OPERATION_PARAMS:
+        raise HTTPException(status_code=404, detail=f"Unknown batch operation: '{operation}'.")
+
+    normalized = normalize_operation({"op": operation, **form_params})
+    normalized.pop("op")
+    return normalized
+
+
+def _save_batch_member(name: str, source, process_type: str, params: dict, encode_options: dict) -> dict:
+    """
+    Проверяет заголовок изображения пакета, сохраняет его в хранилище и возвращает
+    описание с ключом кэша и метаданными пробы.
+    """
+    try:
+        with stage_timer("probe", process_type):
+            metadata = probe_image(source)
+        check_probe(metadata, operations_for(process_type, params))
+    except ImageProbeError as e:
+        raise HTTPException(status_code=e.status_code, detail=f"{name}: {e}")
+
+    input_filename, output_filename = generate_filenames(name, process_type,
+                                                         _output_extension(process_type, encode_options))
+    hasher = hashlib.sha256()
+    with stage_timer("upload", process_type):
+        size = save_stream(source, input_filename, hasher=hasher)
+    count_bytes("in", size, process_type)
+    return {
+        "original_filename": name,
+        "input": input_filename,
+        "output": output_filename,
+        "size": size,
+        "source": metadata,
+        "cache_key": build_cache_key(hasher.hexdigest(), process_type, _cache_params(params, encode_options),
+                                     Path(output_filename).suffix),
+    }
+
+
+def _extract_zip_batch(archive, process_type: str, params: dict, encode_options: dict,
+                       limit: int) -> list[dict]:
+    """
+    Распаковывает изображения из zip-архива в хранилище (не более limit штук). Каждое
+    изображение не больше UPLOAD_MAX_BYTES, все вместе — не больше BATCH_MAX_TOTAL_BYTES
+    (по заголовкам архива, до распаковки), иначе 413; файлы, которые не являются
+    изображениями допустимых форматов, отклоняют пакет по пробе заголовка.
+    """
+    items = []
+    try:
+        for name, member in iter_zip_images(archive, UPLOAD_MAX_BYTES, BATCH_MAX_TOTAL_BYTES):
+            if len(items) >= limit:
+                break
+            items.append(_save_batch_member(name, member, process_type, params, encode_options))
+    except zipfile.BadZipFile:
+        _discard_batch_items(items)
+        raise HTTPException(status_code=400, detail="Uploaded archive is not a valid zip file.")
+    except ZipLimitError as e:
+        _discard_batch_items(items)
+        raise HTTPException(status_code=413, detail=str(e))
+    except HTTPException:
+        _discard_batch_items(items)
+        raise
+    return items
+
+
+def _discard_batch_items(items: list[dict]) -> None:
+    """
+    Удаляет исходники уже сохраненных элементов отклоненного пакета.
+    """
+    for item in items:
+        delete_raw_file(item["input"])
+
+
+@router.post("/batch/{operation}", dependencies=[Depends(enforce_rate_limit)])
+async def process_batch(operation: str,
+                        images: list[UploadFile] = File(...),
+                        width: Optional[int] = Form(None), height: Optional[int] = Form(None),
+                        left: Optional[int] = Form(None), top: Optional[int] = Form(None),
+                        right: Optional[int] = Form(None), bottom: Optional[int] = Form(None),
+                        operations: Optional[str] = Form(None),
+                        matrix: Optional[str] = Form(None),
+                        priority: TaskPriority = Form("normal"),
+                        encode_options: dict = Depends(encode_options_form)):
+    """
+    Принимает много изображений (или zip-архив с ними) одним запросом и ставит
+    их одной группой Celery. Параметры операции общие для всего пакета.
+    Прогресс доступен по /batch-status/{batch_id}, архив результатов — по /batch-download/{batch_id}.
+    """
+    params = _batch_params(operation, operations, matrix,
+                           width=width, height=height, left=left, top=top, right=right, bottom=bottom)
+    # Дешевые проверки всех файлов — до сохранения первого из них
+    for upload in images:
+        if not is_zip_upload(upload):
+            validate_image_file(upload)
+
+    items = []
+    try:
+        for upload in images:
+            if is_zip_upload(upload):
+                items.extend(await run_in_threadpool(
+                    _extract_zip_batch, upload.file, operation, params, encode_options,
+                    BATCH_MAX_FILES + 1 - len(items)))
+            else:
+                source = await probe_upload(upload, operation, operations_for(operation, params))
+                input_filename, output_filename = generate_filenames(upload.filename, operation,
+                                                                     _output_extension(operation, encode_options))
+                hasher = hashlib.sha256()
+                with stage_timer("upload", operation):
+                    size = await save_uploaded_file(upload, input_filename, hasher=hasher)
+                count_bytes("in", size, operation)
+                items.append({
+                    "original_filename": upload.filename,
+                    "input": input_filename,
+                    "output": output_filename,
+                    "size": size,
+                    "source": source,
+                    "cache_key": build_cache_key(hasher.hexdigest(), operation,
+                                                 _cache_params(params, encode_options),
+                                                 Path(output_filename).suffix),
+                })
+
+            if len(items) > BATCH_MAX_FILES:
+                raise HTTPException(status_code=413,
+                                    detail=f"Too many images in batch. Maximum is {BATCH_MAX_FILES}.")
+
+        if not items:
+            raise HTTPException(status_code=422, detail="No JPG or PNG images found in batch.")
+
+        # Допуск — по развернутому списку (члены zip-архивов) и очереди каждого элемента
+        jobs = Counter(select_queue(operation, item["size"], params.get("operations"),
+                                    (item.get("source") or {}).get("pixels"))
+                       for item in items)
+        for queue, count in jobs.items():
+            await admit_jobs(queue, count)
+    except HTTPException:
+        _discard_batch_items(items)
+        raise
+
+    specific_data = _specific_response_data(operation, **params)
+    for item in items:
+        item["task_id"] = _complete_from_cache(item["cache_key"], item["input"], item["output"], specific_data)
+
+    with stage_timer("enqueue", operation):
+        batch = dispatch_batch(operation, items, params, encode_options=encode_options or None, priority=priority)
+
+    return JSONResponse({
+        "batch_id": batch.id,
+        "status_url": f"/batch-status/{batch.id}",
+        "download_url": f"/batch-download/{batch.id}",
+        "total": len(items),
+        "cached": sum(1 for item in items if item["task_id"]),
+        "tasks": [
+            {"original_filename": item["original_filename"], "task_id": result.id}
+            for item, result in zip(items, batch.results)
+        ],
+    })
+
+
+@router.get("/batch-status/{batch_id}")
+async def get_batch_status(batch_id: str):
+    """
+    Возвращает сводный прогресс пакета и статусы всех его задач.
+    """
+    metas = await run_in_threadpool(get_batch_task_metas, batch_id)
+    if metas is None:
+        raise HTTPException(status_code=404, detail=f"Batch not found: {batch_id}")
+
+    total = len(metas)
+    successful = sum(1 for meta in metas if meta["status"] == "SUCCESS")
+    failed = sum(1 for meta in metas if meta["status"] in ("FAILURE", "REVOKED"))
+    finished = successful + failed
+
+    return JSONResponse(content={
+        "batch_id": batch_id,
+        "total": total,
+        "successful": successful,
+        "failed": failed,
+        "pending": total - finished,
+        "progress": round(100 * finished / total, 1) if total else 100.0,
+        "ready": finished == total,
+        "tasks": [{"task_id": meta["task_id"], "status": meta["status"]} for meta in metas],
+    })
+
+
+@router.get("/batch-download/{batch_id}")
+async def download_batch(batch_id: str, background_tasks: BackgroundTasks):
+    """
+    Потоково отдает zip-архив со всеми успешно обработанными изображениями пакета.
+    Добавляет задачу по удалению файлов в фон.
+    """
+    metas = await run_in_threadpool(get_batch_task_metas, batch_id)
+    if metas is None:
+        raise HTTPException(status_code=404, detail=f"Batch not found: {batch_id}")
+    if any(meta["status"] not in ("SUCCESS", "FAILURE", "REVOKED") for meta in metas):
+        return JSONResponse(status_code=202, content={"message": "Batch is still in progress. Check status later."})
+
+    entries = []
+    for meta in metas:
+        result = meta["result"] if meta["status"] == "SUCCESS" else None
+        if not isinstance(result, dict) or not result.get("output") or not result.get("input"):
+            continue
+        if processed_file_exists(result["output"]):
+            entries.append((result["output"], result["output"]))
+            background_tasks.add_task(cleanup_files, result["input"], result["output"])
+
+    if not entries:
+        return JSONResponse(status_code=500, content={"message": "No processed files found for this batch."})
+
+    return StreamingResponse(stream_zip(entries),
+                             media_type="application/zip",
+                             headers={"Content-Disposition": f'attachment; filename="batch_{batch_id}.zip"'})
+
+
+@router.get("/cache-stats")
+async def get_cache_stats():
+    """
+    Возвращает счетчики попаданий/промахов и заполненность кэша результатов.
+    """
+    return JSONResponse(content=await run_in_threadpool(result_cache.stats))
+
+
 @router.get("/task-status/{task_id}")
 async def get_task_status(task_id: str):
     """
-    Возвращает текущий статус задачи Celery.
+    Возвращает текущий статус задачи Celery. Чтение не блокирует цикл событий,
+    статусы завершенных задач отдаются из кэша процесса.
     """
-    res = get_task_result(task_id)
-    return JSONResponse(content=get_task_status_data(res))
+    return JSONResponse(content=task_status_data(await get_task_meta_async(task_id)))
+
+
+def _task_event_snapshot(task_id: str):
+    """
+    Возвращает корутину-функцию, читающую текущий статус задачи из бэкенда результатов.
+    Нужна для задач, по которым еще не было событий (например, завершенных из кэша).
+    """
+    async def snapshot() -> dict:
+        data = task_status_data(await get_task_meta_async(task_id))
+        event = {"task_id": task_id, "state": data["status"], "progress": 100 if data["successful"] else None}
+        if data["ready"]:
+            event["result" if data["successful"] else "error"] = data["result"]
+        return event
+
+    return snapshot
+
+
+async def _sse_task_events(task_id: str):
+    """
+    Форматирует события задачи в поток Server-Sent Events.
+    """
+    async for event in iter_task_events(task_id, snapshot=_task_event_snapshot(task_id)):
+        if event is None:
+            yield ": keepalive\n\n"
+        else:
+            yield f"data: {json.dumps(event, default=str)}\n\n"
+
+
+@router.get("/task-events/{task_id}")
+async def stream_task_events(task_id: str):
+    """
+    Отдает изменения статуса и прогресса задачи через Server-Sent Events
+    вместо опроса /task-status. Поток закрывается после финального состояния.
+    """
+    return StreamingResponse(_sse_task_events(task_id),
+                             media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.websocket("/task-events/{task_id}")
+async def task_events_websocket(websocket: WebSocket, task_id: str):
+    """
+    Отдает изменения статуса и прогресса задачи через WebSocket, а в паузах —
+    сообщения {"type": "ping"}. Соединение закрывается сервером после финального состояния.
+    """
+    await websocket.accept()
+    events = iter_task_events(task_id, snapshot=_task_event_snapshot(task_id))
+    try:
+        async with aclosing(events):
+            async for event in events:
+                # В паузах между событиями — пинг, как keepalive у SSE: отправка исчезнувшему
+                # клиенту падает, и подписка Redis освобождается, не дожидаясь TASK_EVENTS_TIMEOUT
+                await websocket.send_text(WEBSOCKET_PING if event is None else json.dumps(event, default=str))
+    except (WebSocketDisconnect, OSError):
+        return
+    await websocket.close()
+
+
+def _result_etag(name: str, download_format: Optional[str], size: int, mtime: float = 0) -> str:
+    """
+    Сильный ETag результата по имени, формату отдачи, размеру и времени модификации.
+    Для перекодированного ответа ETag считается без перекодирования, поэтому 304 дешевый.
+    """
+    digest = hashlib.md5(f"{name}:{download_format or ''}:{size}:{mtime}".encode(), usedforsecurity=False)
+    return f'"{digest.hexdigest()}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Проверка If-None-Match (слабое сравнение).
+    """
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def _download_headers(etag: str) -> dict:
+    """
+    Заголовки ответа с результатом. С периодом хранения результат можно кэшировать
+    прокси или CDN: для задачи он не меняется.
+    """
+    if DOWNLOAD_GRACE_SECONDS:
+        cache_control = f"public, max-age={DOWNLOAD_GRACE_SECONDS}, immutable"
+    else:
+        cache_control = "private, no-cache"
+    return {"ETag": etag, "Vary": "Accept", "Cache-Control": cache_control, "Accept-Ranges": "bytes"}
+
+
+def _requested_range(request: Request, etag: str, size: int) -> Optional[tuple[int, int]]:
+    """
+    Один диапазон байт (start, end включительно) из заголовка Range с учетом If-Range
+    или None — отдать результат целиком. Несколько диапазонов и другие единицы
+    игнорируются. Недостижимый диапазон дает 416.
+    """
+    header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if not header or (if_range is not None and if_range != etag):
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start, end = int(first), int(last) if last else size - 1
+        else:
+            start, end = size - int(last), size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end or end < 0:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable.",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return max(start, 0), min(end, size - 1)
+
+
+def _bytes_download(content: bytes, media_type: str, filename: str, headers: dict, request: Request) -> Response:
+    """
+    Ответ с результатом в памяти (перекодированным или из Redis) с поддержкой Range.
+    """
+    headers = {**headers, "Content-Disposition": f'attachment; filename="{filename}"'}
+    byte_range = _requested_range(request, headers["ETag"], len(content))
+    if byte_range is None:
+        return Response(content, media_type=media_type, headers=headers)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{len(content)}"
+    return Response(content[start:end + 1], status_code=206, media_type=media_type, headers=headers)
+
+
+def _cleanup_downloaded_result(task_id: str, input_filename: str, output_filename: str) -> None:
+    """
+    Удаляет файлы скачанного результата. Результат, общий для объединенных запросов,
+    остается, пока его не скачают все (или до сборщика по TTL).
+    """
+    if result_still_shared(task_id):
+        delete_raw_file(input_filename)
+        return
+    cleanup_files(input_filename, output_filename)
+
+
+def _release_downloaded_result(background_tasks: BackgroundTasks, request: Request, task_id: str,
+                               input_filename: str, output_filename: str) -> None:
+    """
+    Без периода хранения файлы удаляются после первого полного скачивания (запрос с Range
+    не считается полным: клиент может докачать остаток). С DOWNLOAD_GRACE_SECONDS исходник
+    удаляется сразу, а результат — сборщиком после окончания периода.
+    """
+    if DOWNLOAD_GRACE_SECONDS:
+        background_tasks.add_task(delete_raw_file, input_filename)
+        background_tasks.add_task(schedule_result_expiry, output_filename, DOWNLOAD_GRACE_SECONDS)
+    elif "range" not in request.headers:
+        background_tasks.add_task(_cleanup_downloaded_result, task_id, input_filename, output_filename)
+
+
+async def _inline_download(result_data: dict, request: Request, background_tasks: BackgroundTasks):
+    """
+    Отдает результат быстрого пути из Redis. Без периода хранения оба блоба удаляются
+    после полного скачивания, иначе результат живет еще DOWNLOAD_GRACE_SECONDS.
+    """
+    output_filename = result_data["output"]
+    output_key = result_data["output_key"]
+    content = await run_in_threadpool(get_blob, output_key)
+    if content is None:
+        return JSONResponse(status_code=410,
+                            content={"message": f"Processed image has expired: {output_filename}"})
+
+    download_format = negotiate_download_format(output_filename, request.headers.get("accept"))
+    headers = _download_headers(_result_etag(output_key, download_format, len(content)))
+    if _etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    if DOWNLOAD_GRACE_SECONDS:
+        background_tasks.add_task(delete_blobs, result_data.get("input_key"))
+        background_tasks.add_task(expire_blobs, DOWNLOAD_GRACE_SECONDS, output_key)
+    elif "range" not in request.headers:
+        background_tasks.add_task(delete_blobs, result_data.get("input_key"), output_key)
+
+    media_type = media_type_for_filename(output_filename)
+    if download_format is not None:
+        content = await run_in_threadpool(transcode_blob, content, download_format)
+        spec = OUTPUT_FORMATS[download_format]
+        output_filename = Path(output_filename).with_suffix(spec["extension"]).name
+        media_type = spec["media_type"]
+    return _bytes_download(content, media_type, output_filename, headers, request)
 
 
 @router.get("/download-result/{task_id}")
-async def download_result(task_id: str, background_tasks: BackgroundTasks):
+async def download_result(task_id: str, request: Request, background_tasks: BackgroundTasks):
     """
     Проверяет статус задачи и возвращает обработанный файл, если он готов.
-    Добавляет задачу по удалению файлов в фон.
+    Если клиент не принимает формат результата (заголовок Accept), файл перекодируется
+    в первый подходящий из AUTO_OUTPUT_FORMATS. Результат быстрого пути берется из Redis.
+    Поддерживает If-None-Match (ответ 304) и докачку по Range. Удаление файлов
+    (сразу или после периода хранения) добавляется в фон.
     """
-    res = get_task_result(task_id)
+    data = task_status_data(await get_task_meta_async(task_id))
 
-    if res.ready():
-        if res.successful():
-            result_data = res.get()
+    if data["ready"]:
+        if data["successful"]:
+            result_data = data["result"]
+            if result_data.get("inline"):
+                return await _inline_download(result_data, request, background_tasks)
             output_filename = result_data.get('output')
             input_filename = result_data.get('input')
 
@@ -155,18 +1280,50 @@ async def download_result(task_id: str, background_tasks: BackgroundTasks):
                 return JSONResponse(status_code=500,
                                     content={"message": "Task succeeded, but output filename is missing from result."})
 
-            file_path = get_processed_file_path(output_filename)
-
-            if file_path.is_file():
-                background_tasks.add_task(cleanup_files, input_filename, output_filename)
-                return FileResponse(file_path,
-                                    filename=output_filename,
-                                    media_type="application/octet-stream")
-            else:
+            try:
+                size, mtime = await run_in_threadpool(stat_processed_file, output_filename)
+            except FileNotFoundError:
                 return JSONResponse(status_code=500,
                                     content={"message": f"Processed file not found on disk: {output_filename}"})
+
+            download_format = negotiate_download_format(output_filename, request.headers.get("accept"))
+            etag = _result_etag(output_filename, download_format, size, mtime)
+            headers = _download_headers(etag)
+            if _etag_matches(request.headers.get("if-none-match"), etag):
+                return Response(status_code=304, headers=headers)
+            _release_downloaded_result(background_tasks, request, task_id, input_filename, output_filename)
+
+            if download_format is not None:
+                content = await run_in_threadpool(transcode_processed_file, output_filename, download_format)
+                spec = OUTPUT_FORMATS[download_format]
+                filename = Path(output_filename).with_suffix(spec["extension"]).name
+                return _bytes_download(content, spec["media_type"], filename, headers, request)
+
+            media_type = media_type_for_filename(output_filename)
+            file_path = get_processed_file_path(output_filename)
+            if file_path is None:
+                # Нелокальное хранилище (S3): отдаем файл потоком
+                headers["Content-Disposition"] = f'attachment; filename="{output_filename}"'
+                byte_range = _requested_range(request, etag, size)
+                if byte_range is None:
+                    headers["Content-Length"] = str(size)
+                    return StreamingResponse(iter_processed_file(output_filename),
+                                             media_type=media_type,
+                                             headers=headers)
+                start, end = byte_range
+                headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+                headers["Content-Length"] = str(end - start + 1)
+                return StreamingResponse(iter_processed_file(output_filename, start, end - start + 1),
+                                         status_code=206,
+                                         media_type=media_type,
+                                         headers=headers)
+            # FileResponse сам обрабатывает Range и If-Range и сохраняет переданный ETag
+            return FileResponse(file_path,
+                                filename=output_filename,
+                                media_type=media_type,
+                                headers=headers)
         else:
             return JSONResponse(status_code=500,
-                                content={"message": "Task failed to process image.", "error": str(res.result)})
+                                content={"message": "Task failed to process image.", "error": data["result"]})
     else:
             return JSONResponse(status_code=202, content={"message": "Processing is still in progress. Check status later."})
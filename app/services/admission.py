@@ -0,0 +1,194 @@
+from typing import Optional
+import logging
+import math
+import time
+
+from redis.exceptions import RedisError
+
+from app.core.config import (
+    ADMISSION_DISK_LIMIT,
+    ADMISSION_MAX_QUEUE_DEPTH,
+    ADMISSION_MAX_WAIT_SECONDS,
+    ADMISSION_RETRY_AFTER,
+    ADMISSION_THROUGHPUT_WINDOW,
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_PER_MINUTE,
+)
+from app.core.metrics import ADMISSION_REJECTED_TOTAL, queue_depth
+from app.core.redis_client import get_redis
+from app.services.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+# Окно пропускной способности делится на столько интервалов-счетчиков в Redis
+THROUGHPUT_BUCKETS = 6
+
+
+class AdmissionRejected(Exception):
+    """
+    Запрос не допущен к обработке. status_code — код ответа HTTP (429 или 503),
+    retry_after — через сколько секунд клиенту стоит повторить запрос.
+    """
+
+    def __init__(self, message: str, status_code: int, retry_after: int, reason: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = max(1, retry_after)
+        self.reason = reason
+
+
+def _bucket_seconds(window: int) -> int:
+    return max(1, window // THROUGHPUT_BUCKETS)
+
+
+def _completions_key(queue: str, bucket: int) -> str:
+    return f"admission:done:{queue}:{bucket}"
+
+
+def _stalled_key(queue: str) -> str:
+    return f"admission:stalled:{queue}"
+
+
+def record_completion(queue: str, window: int = ADMISSION_THROUGHPUT_WINDOW, now: Optional[float] = None) -> None:
+    """
+    Учитывает завершенную воркером задачу очереди (вызывается из сигнала Celery после задачи).
+    Завершение сбрасывает отметку начала простоя очереди (stalled_for).
+    """
+    bucket_seconds = _bucket_seconds(window)
+    key = _completions_key(queue, int((time.time() if now is None else now) // bucket_seconds))
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.incr(key)
+        pipe.expire(key, window + 2 * bucket_seconds)
+        pipe.delete(_stalled_key(queue))
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Failed to record completion for queue {queue}: {e}")
+
+
+def queue_throughput(queue: str, window: int = ADMISSION_THROUGHPUT_WINDOW,
+                     now: Optional[float] = None) -> Optional[float]:
+    """
+    Задач в секунду, которые воркеры завершили в очереди за последние window секунд
+    (по полностью прошедшим интервалам). None, если Redis недоступен.
+    """
+    bucket_seconds = _bucket_seconds(window)
+    current = int((time.time() if now is None else now) // bucket_seconds)
+    buckets = range(current - max(1, window // bucket_seconds), current)
+    try:
+        counts = get_redis().mget([_completions_key(queue, bucket) for bucket in buckets])
+    except RedisError as e:
+        logger.warning(f"Failed to read throughput of queue {queue}: {e}")
+        return None
+    return sum(int(count) for count in counts if count) / (len(buckets) * bucket_seconds)
+
+
+def stalled_for(queue: str, window: int = ADMISSION_THROUGHPUT_WINDOW, now: Optional[float] = None) -> float:
+    """
+    Сколько секунд очередь остается непустой без завершенных задач: с первой проверки допуска,
+    увидевшей такую очередь, до now. Отметка сбрасывается первым завершением (record_completion)
+    и истекает, если простой не наблюдался дольше двух окон или пределов ожидания.
+    0, если Redis недоступен.
+    """
+    current = time.time() if now is None else now
+    key = _stalled_key(queue)
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.set(key, current, nx=True)
+        pipe.expire(key, 2 * max(window, ADMISSION_MAX_WAIT_SECONDS))
+        pipe.get(key)
+        since = pipe.execute()[-1]
+    except RedisError as e:
+        logger.warning(f"Failed to track stall of queue {queue}: {e}")
+        return 0.0
+    return max(0.0, current - float(since)) if since is not None else 0.0
+
+
+def _reject(message: str, status_code: int, retry_after: float, reason: str) -> AdmissionRejected:
+    ADMISSION_REJECTED_TOTAL.labels(reason).inc()
+    return AdmissionRejected(message, status_code, math.ceil(retry_after), reason)
+
+
+def check_admission(queue: str, jobs: int = 1, now: Optional[float] = None) -> None:
+    """
+    Решает до сохранения загрузки, принимать ли jobs новых задач в очередь. Отклоняет
+    (AdmissionRejected, 503), если том хранилища почти заполнен, очередь длиннее
+    ADMISSION_MAX_QUEUE_DEPTH или оценка ожидания больше ADMISSION_MAX_WAIT_SECONDS.
+    Без завершенных задач в окне (холодный старт, простой) ожидание оценить нельзя:
+    непустая очередь отклоняется, только если простаивает дольше ADMISSION_MAX_WAIT_SECONDS
+    (stalled_for). Retry-After — время, за которое очередь сократится
+    до допустимой. Если состояние узнать не удалось (брокер или Redis недоступны),
+    запрос принимается.
+    """
+    usage = get_storage().disk_usage()
+    if usage is not None and usage[1] and usage[0] / usage[1] >= ADMISSION_DISK_LIMIT:
+        raise _reject("Storage is almost full, retry later.", 503, ADMISSION_RETRY_AFTER, "disk")
+
+    depth = queue_depth(queue)
+    if depth is None:
+        return
+    throughput = queue_throughput(queue, now=now)
+    if ADMISSION_MAX_QUEUE_DEPTH and depth + jobs > ADMISSION_MAX_QUEUE_DEPTH:
+        retry_after = (depth + jobs - ADMISSION_MAX_QUEUE_DEPTH) / throughput if throughput else ADMISSION_RETRY_AFTER
+        raise _reject(f"Queue {queue} is full, retry later.", 503, retry_after, "queue_depth")
+    if ADMISSION_MAX_WAIT_SECONDS and depth and throughput == 0:
+        # Нулевая пропускная способность после простоя ничего не говорит о воркерах: отклоняем,
+        # только если очередь уже дольше предела ожидания не пуста без единого завершения
+        stalled = stalled_for(queue, now=now)
+        if stalled > ADMISSION_MAX_WAIT_SECONDS:
+            raise _reject(f"Queue {queue} has not progressed for {stalled:.0f}s, "
+                          f"above the {ADMISSION_MAX_WAIT_SECONDS}s limit; retry later.",
+                          503, ADMISSION_RETRY_AFTER, "queue_wait")
+    if ADMISSION_MAX_WAIT_SECONDS and throughput:
+        wait = (depth + jobs) / throughput
+        if wait > ADMISSION_MAX_WAIT_SECONDS:
+            raise _reject(f"Estimated wait in queue {queue} is {wait:.0f}s, "
+                          f"above the {ADMISSION_MAX_WAIT_SECONDS}s limit; retry later.",
+                          503, wait - ADMISSION_MAX_WAIT_SECONDS, "queue_wait")
+
+
+def take_token(client: str, per_minute: int, burst: int, now: Optional[float] = None) -> float:
+    """
+    Берет токен из корзины клиента в Redis (token bucket: per_minute токенов в минуту,
+    не больше burst в запасе). Возвращает 0, если токен взят, иначе сколько секунд ждать
+    следующего. Корзина читается и обновляется в транзакции WATCH/MULTI, поэтому
+    процессы API делят один лимит.
+    """
+    key = f"ratelimit:{client}"
+    rate = per_minute / 60
+    capacity = max(1, burst)
+
+    def attempt(pipe) -> float:
+        tokens, updated = pipe.hmget(key, "tokens", "updated")
+        current = time.time() if now is None else now
+        if tokens is None:
+            tokens = capacity
+        else:
+            tokens = min(capacity, float(tokens) + max(0.0, current - float(updated)) * rate)
+        if tokens < 1:
+            return (1 - tokens) / rate
+        pipe.multi()
+        pipe.hset(key, mapping={"tokens": tokens - 1, "updated": current})
+        pipe.expire(key, math.ceil(capacity / rate) + 1)
+        return 0.0
+
+    return get_redis().transaction(attempt, key, value_from_callable=True)
+
+
+def check_rate_limit(client: str, per_minute: Optional[int] = None, burst: Optional[int] = None,
+                     now: Optional[float] = None) -> None:
+    """
+    Лимит запросов на обработку от клиента (по умолчанию RATE_LIMIT_PER_MINUTE и RATE_LIMIT_BURST):
+    AdmissionRejected (429) сверх лимита. При недоступном Redis лимит не применяется.
+    """
+    per_minute = RATE_LIMIT_PER_MINUTE if per_minute is None else per_minute
+    burst = RATE_LIMIT_BURST if burst is None else burst
+    if not per_minute:
+        return
+    try:
+        retry_after = take_token(client, per_minute, burst, now)
+    except RedisError as e:
+        logger.warning(f"Rate limiting unavailable, admitting request: {e}")
+        return
+    if retry_after:
+        raise _reject("Too many requests, retry later.", 429, retry_after, "rate_limit")
@@ -0,0 +1,55 @@
+from typing import Optional, Union
+import io
+import uuid
+
+from app.core.config import INLINE_BLOB_TTL
+from app.core.redis_client import get_redis
+
+# Маленькие изображения быстрого пути хранятся в Redis, а не в хранилище файлов
+BLOB_KEY_PREFIX = "image-blob:"
+
+
+def put_blob(data: Union[bytes, memoryview], ttl: int = INLINE_BLOB_TTL) -> str:
+    """
+    Кладет байты изображения в Redis с TTL и возвращает ключ.
+    memoryview передается клиенту Redis без копирования.
+    """
+    key = f"{BLOB_KEY_PREFIX}{uuid.uuid4()}"
+    get_redis().set(key, data, ex=ttl)
+    return key
+
+
+def get_blob(key: str) -> Optional[bytes]:
+    """
+    Возвращает байты изображения или None, если ключ истек или удален.
+    """
+    return get_redis().get(key)
+
+
+def delete_blobs(*keys: str) -> int:
+    """
+    Удаляет изображения из Redis. Возвращает число удаленных ключей.
+    """
+    keys = [key for key in keys if key]
+    return get_redis().delete(*keys) if keys else 0
+
+
+def transcode_blob(data: bytes, output_format: str) -> bytes:
+    """
+    Перекодирует изображение из Redis в другой формат для отдачи клиенту.
+    Кодировщик импортируется лениво, как в file_manager.transcode_processed_file.
+    """
+    from app.services.image_processor import transcode
+
+    return transcode(io.BytesIO(data), output_format)
+
+
+def expire_blobs(ttl: int, *keys: str) -> None:
+    """
+    Задает новый TTL изображениям в Redis (период хранения после скачивания).
+    """
+    pipe = get_redis().pipeline(transaction=False)
+    for key in keys:
+        if key:
+            pipe.expire(key, ttl)
+    pipe.execute()
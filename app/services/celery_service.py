@@ -1,65 +1,373 @@
-from app.core.celery_app import celery_app
-from app.tasks.tasks import (
-    process_image_to_grayscale,
-    process_image_to_resize,
-    process_image_to_sepia,
-    process_image_to_crop,
-)
-from celery.result import AsyncResult
-from typing import Optional, Dict, Any
+from app.core.celery_app import celery_app, task_routing
+from app.core.config import COALESCE_ENABLED, TASK_STATUS_CACHE_TTL, TASK_STATUS_CACHE_SIZE
+from app.core.redis_client import get_async_backend_redis
+from app.services.coalescing import claim_inflight, release_inflight
+from celery import group, states, Signature
+from celery.backends.redis import RedisBackend
+from celery.result import AsyncResult, GroupResult
+from collections import OrderedDict
+from typing import Callable, Optional, Dict, Any, List, Sequence
+import asyncio
+import threading
+import time
+import uuid
 
+# Задачи ставятся по имени (send_task): процессу API не нужно импортировать
+# модуль задач, а с ним Pillow и весь код обработки
+GRAYSCALE_TASK_NAME = "app.tasks.tasks.process_image_to_grayscale"
+RESIZE_TASK_NAME = "app.tasks.tasks.process_image_to_resize"
+SEPIA_TASK_NAME = "app.tasks.tasks.process_image_to_sepia"
+CROP_TASK_NAME = "app.tasks.tasks.process_image_to_crop"
+PIPELINE_TASK_NAME = "app.tasks.tasks.process_image_pipeline"
+INLINE_TASK_NAME = "app.tasks.tasks.process_image_inline"
+VARIANTS_TASK_NAME = "app.tasks.tasks.process_image_variants"
 
+# Имена задач Celery по типу обработки
+TASK_NAMES = {
+    "grayscale": GRAYSCALE_TASK_NAME,
+    "resize": RESIZE_TASK_NAME,
+    "sepia": SEPIA_TASK_NAME,
+    "crop": CROP_TASK_NAME,
+    "pipeline": PIPELINE_TASK_NAME,
+    "color_matrix": PIPELINE_TASK_NAME,
+}
 
-def dispatch_image_processing_task_grayscale(input_filename: str, output_filename: str):
+
+def _send_task(name: str, args: Sequence[Any], kwargs: Dict[str, Any],
+               routing: Optional[Dict[str, Any]] = None)->AsyncResult:
+    """
+    Ставит задачу по имени; очередь и приоритет берутся из routing или из task_routes.
+    """
+    return celery_app.send_task(name, args=tuple(args), kwargs=kwargs, **(routing or {}))
+
+
+
+def dispatch_image_processing_task_grayscale(input_filename: str, output_filename: str,
+                                             cache_key: Optional[str] = None,
+                                             encode_options: Optional[Dict[str, Any]] = None,
+                                             routing: Optional[Dict[str, Any]] = None,
+                                             source: Optional[Dict[str, Any]] = None):
     """
     Диспетчер для постановки задачи преобразования изображения в оттенки серого.
+    routing — параметры очереди и приоритета (см. task_routing),
+    source — метаданные пробы заголовка исходника (формат, размеры, оценка памяти).
     """
-    task = process_image_to_grayscale.delay(input_filename, output_filename)
+    task = _send_task(GRAYSCALE_TASK_NAME, (input_filename, output_filename),
+                      {"cache_key": cache_key, "encode_options": encode_options, "source": source},
+                      routing)
     return task
 
 
 def dispatch_image_processing_task_resize(input_filename: str, output_filename: str,
-                                          width: Optional[int] = None, height: Optional[int] = None
-                                          )->AsyncResult:
+                                          width: Optional[int] = None, height: Optional[int] = None,
+                                          cache_key: Optional[str] = None,
+                                          encode_options: Optional[Dict[str, Any]] = None,
+                                          routing: Optional[Dict[str, Any]] = None,
+                                          source: Optional[Dict[str, Any]] = None)->AsyncResult:
     """
     Диспетчер для постановки задачи изменения размера изображения.
     """
-    task = process_image_to_resize.delay(input_filename, output_filename, width, height)
+    task = _send_task(RESIZE_TASK_NAME, (input_filename, output_filename, width, height),
+                      {"cache_key": cache_key, "encode_options": encode_options, "source": source},
+                      routing)
     return task
 
 
-def dispatch_image_processing_task_sepia(input_filename: str, output_filename: str):
+def dispatch_image_processing_task_sepia(input_filename: str, output_filename: str,
+                                         cache_key: Optional[str] = None,
+                                         encode_options: Optional[Dict[str, Any]] = None,
+                                         routing: Optional[Dict[str, Any]] = None,
+                                         source: Optional[Dict[str, Any]] = None):
     """
     Диспетчер для постановки задачи применения эффекта сепии.
     """
-    task = process_image_to_sepia.delay(input_filename, output_filename)
+    task = _send_task(SEPIA_TASK_NAME, (input_filename, output_filename),
+                      {"cache_key": cache_key, "encode_options": encode_options, "source": source},
+                      routing)
     return task
 
 def dispatch_image_processing_task_crop(input_filename: str, output_filename: str,
-                                        left: int, top: int, right: int, bottom: int)->AsyncResult:
+                                        left: int, top: int, right: int, bottom: int,
+                                        cache_key: Optional[str] = None,
+                                        encode_options: Optional[Dict[str, Any]] = None,
+                                        routing: Optional[Dict[str, Any]] = None,
+                                        source: Optional[Dict[str, Any]] = None)->AsyncResult:
     """
     Диспетчер для постановки задачи обрезки изображения.
     """
-    task = process_image_to_crop.delay(input_filename, output_filename, left, top, right, bottom)
+    task = _send_task(CROP_TASK_NAME, (input_filename, output_filename, left, top, right, bottom),
+                      {"cache_key": cache_key, "encode_options": encode_options, "source": source},
+                      routing)
     return task
 
 
-def get_task_result(task_id: str)->Optional[AsyncResult]:
+def dispatch_image_processing_task_pipeline(input_filename: str, output_filename: str,
+                                            operations: List[Dict[str, Any]],
+                                            cache_key: Optional[str] = None,
+                                            encode_options: Optional[Dict[str, Any]] = None,
+                                            routing: Optional[Dict[str, Any]] = None,
+                                            source: Optional[Dict[str, Any]] = None)->AsyncResult:
     """
-    Создает объект AsyncResult для проверки статуса задачи.
+    Диспетчер для постановки задачи с цепочкой операций над одним изображением.
     """
-    return celery_app.AsyncResult(task_id)
+    task = _send_task(PIPELINE_TASK_NAME, (input_filename, output_filename, operations),
+                      {"cache_key": cache_key, "encode_options": encode_options, "source": source},
+                      routing)
+    return task
+
+
+def dispatch_image_variants(input_filename: str, base_name: str, widths: List[int], formats: List[str],
+                            encode_options: Optional[Dict[str, Any]] = None,
+                            routing: Optional[Dict[str, Any]] = None,
+                            source: Optional[Dict[str, Any]] = None)->AsyncResult:
+    """
+    Диспетчер задачи генерации вариантов изображения (ширины x форматы).
+    """
+    task = _send_task(VARIANTS_TASK_NAME, (input_filename, base_name, widths, formats),
+                      {"encode_options": encode_options, "source": source},
+                      routing)
+    return task
+
+
+def operations_for(process_type: str, params: Dict[str, Any])->List[Dict[str, Any]]:
+    """
+    Представляет любую операцию как цепочку операций пайплайна.
+    """
+    if process_type == "pipeline":
+        return params["operations"]
+    if process_type == "color_matrix":
+        return [{"op": "color_matrix", "matrix": params["matrix"]}]
+    return [{"op": process_type, **params}]
+
+
+def dispatch_image_processing_task_inline(input_key: str, output_filename: str, process_type: str,
+                                          params: Dict[str, Any],
+                                          encode_options: Optional[Dict[str, Any]] = None,
+                                          routing: Optional[Dict[str, Any]] = None,
+                                          source: Optional[Dict[str, Any]] = None)->AsyncResult:
+    """
+    Диспетчер быстрого пути: маленькое изображение уже лежит в Redis под ключом input_key.
+    """
+    task = _send_task(INLINE_TASK_NAME,
+                      (input_key, output_filename, process_type, operations_for(process_type, params)),
+                      {"encode_options": encode_options, "source": source},
+                      routing)
+    return task
+
+
+def store_completed_task_result(result: Dict[str, Any])->str:
+    """
+    Записывает в бэкенд результатов уже завершенную задачу (например, при
+    попадании в кэш) без постановки в очередь. Возвращает id задачи.
+    """
+    task_id = str(uuid.uuid4())
+    celery_app.backend.store_result(task_id, result, states.SUCCESS)
+    return task_id
+
+
+def build_task_signature(process_type: str, input_filename: str, output_filename: str,
+                         params: Dict[str, Any], cache_key: Optional[str] = None,
+                         encode_options: Optional[Dict[str, Any]] = None,
+                         source: Optional[Dict[str, Any]] = None)->Signature:
+    """
+    Строит сигнатуру задачи Celery для заданного типа обработки и параметров.
+    """
+    options = {"cache_key": cache_key, "encode_options": encode_options, "source": source}
+    if process_type in ("grayscale", "sepia"):
+        args = (input_filename, output_filename)
+    elif process_type == "resize":
+        args = (input_filename, output_filename, params["width"], params["height"])
+    elif process_type == "crop":
+        args = (input_filename, output_filename, params["left"], params["top"], params["right"], params["bottom"])
+    elif process_type in ("pipeline", "color_matrix"):
+        args = (input_filename, output_filename, operations_for(process_type, params))
+    else:
+        raise ValueError(f"Unknown process type '{process_type}'")
+    return celery_app.signature(TASK_NAMES[process_type], args=args, kwargs=options)
+
+
+def dispatch_coalesced(cache_key: Optional[str], dispatch: Callable[[Dict[str, Any]], AsyncResult],
+                       routing: Optional[Dict[str, Any]] = None)->tuple[AsyncResult, bool]:
+    """
+    Ставит задачу с объединением одинаковых запросов: первый запрос с ключом
+    (хэш входа, операция, параметры) захватывает короткую блокировку в Redis и ставит
+    задачу с заранее выбранным id, а повторные, пока она в очереди или выполняется,
+    получают ее AsyncResult без постановки дубликата.
+    dispatch получает параметры apply_async (очередь, приоритет, task_id).
+    Возвращает (задача, присоединен ли запрос к уже поставленной). Если постановка
+    не удалась, блокировка снимается, чтобы повторы не ждали несуществующую задачу.
+    """
+    routing = routing or {}
+    if not COALESCE_ENABLED or not cache_key:
+        return dispatch(routing), False
+
+    task_id = str(uuid.uuid4())
+    leader_id = claim_inflight(cache_key, task_id)
+    if leader_id is not None:
+        return AsyncResult(leader_id, app=celery_app), True
+    try:
+        return dispatch({**routing, "task_id": task_id}), False
+    except Exception:
+        release_inflight(cache_key, task_id)
+        raise
+
 
+def dispatch_batch(process_type: str, items: List[Dict[str, Any]], params: Dict[str, Any],
+                   encode_options: Optional[Dict[str, Any]] = None, priority: str = "normal")->GroupResult:
+    """
+    Ставит пакет задач одной группой Celery и сохраняет GroupResult в бэкенде.
+    items — элементы с ключами input/output/cache_key/size (и source — проба заголовка); элементы с готовым
+    task_id (например, попадания в кэш) в очередь не ставятся.
+    Очередь выбирается для каждого элемента по его размеру.
+    Порядок результатов в группе совпадает с порядком items.
+    """
+    pending = [item for item in items if not item.get("task_id")]
+    dispatched = iter(())
+    if pending:
+        signatures = [
+            build_task_signature(process_type, item["input"], item["output"], params,
+                                 item.get("cache_key"), encode_options, item.get("source")).set(
+                **task_routing(process_type, item.get("size"), priority, params.get("operations"),
+                               (item.get("source") or {}).get("pixels")))
+            for item in pending
+        ]
+        dispatched = iter(group(signatures).apply_async().results)
+
+    results = [
+        AsyncResult(item["task_id"], app=celery_app) if item.get("task_id") else next(dispatched)
+        for item in items
+    ]
+    batch = GroupResult(str(uuid.uuid4()), results, app=celery_app)
+    batch.save()
+    return batch
+
+
+class TaskMetaCache:
+    """
+    Кэш метаданных завершенных задач (SUCCESS/FAILURE/REVOKED) в памяти процесса API:
+    их статус больше не меняется, поэтому повторные опросы не обращаются к Redis.
+    Записи живут ttl секунд (результаты в бэкенде тоже истекают), при переполнении
+    вытесняются самые старые.
+    """
+
+    def __init__(self, ttl: float = TASK_STATUS_CACHE_TTL, max_entries: int = TASK_STATUS_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, Dict[str, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, task_id: str)->Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(task_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[task_id]
+                return None
+            return entry[1]
+
+    def put(self, meta: Dict[str, Any])->None:
+        if not self.ttl or meta["status"] not in states.READY_STATES:
+            return
+        with self._lock:
+            self._entries[meta["task_id"]] = (time.monotonic() + self.ttl, meta)
+            self._entries.move_to_end(meta["task_id"])
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self)->None:
+        with self._lock:
+            self._entries.clear()
+
+
+task_meta_cache = TaskMetaCache()
+
+
+def _decode_task_meta(task_id: str, value: Optional[bytes])->Dict[str, Any]:
+    """
+    Метаданные задачи из сырого значения бэкенда (None — задача неизвестна, PENDING).
+    """
+    if not value:
+        return {"task_id": task_id, "status": states.PENDING, "result": None}
+    meta = celery_app.backend.decode_result(value)
+    return {"task_id": task_id, "status": meta["status"], "result": meta.get("result")}
+
+
+def _read_task_meta(task_id: str)->Dict[str, Any]:
+    result = celery_app.AsyncResult(task_id)
+    return {"task_id": task_id, "status": result.state, "result": result.result}
 
-def get_task_status_data(task: AsyncResult)-> Dict[str, Any]:
+
+async def get_task_meta_async(task_id: str)->Dict[str, Any]:
+    """
+    Статус и результат задачи без блокирующих вызовов в цикле событий: завершенные
+    задачи берутся из кэша процесса, остальные читаются одним GET через асинхронный
+    клиент Redis с пулом соединений (для других бэкендов — в пуле потоков).
+    """
+    meta = task_meta_cache.get(task_id)
+    if meta is not None:
+        return meta
+
+    backend = celery_app.backend
+    if isinstance(backend, RedisBackend):
+        value = await get_async_backend_redis().get(backend.get_key_for_task(task_id))
+        meta = _decode_task_meta(task_id, value)
+    else:
+        meta = await asyncio.to_thread(_read_task_meta, task_id)
+    task_meta_cache.put(meta)
+    return meta
+
+
+def task_status_data(meta: Dict[str, Any])->Dict[str, Any]:
     """
-    Извлекает информацию о статусе из объекта AsyncResult.
+    Ответ о статусе задачи (/task-status) по ее метаданным.
+    Исключение упавшей задачи отдается строкой.
     """
+    ready = meta["status"] in states.READY_STATES
+    result = meta["result"] if ready else None
+    if isinstance(result, BaseException):
+        result = f"{type(result).__name__}: {result}"
     return {
-        "task_id": task.id,
-        "status": task.status,
-        "ready": task.ready(),
-        "successful": task.successful(),
-        "result": task.result if task.ready() else None
+        "task_id": meta["task_id"],
+        "status": meta["status"],
+        "ready": ready,
+        "successful": meta["status"] == states.SUCCESS,
+        "result": result,
     }
 
+
+def get_batch_task_metas(batch_id: str, chunk_size: int = 1000)->Optional[List[Dict[str, Any]]]:
+    """
+    Возвращает статусы и результаты всех задач пакета или None, если пакет не найден.
+    Для бэкендов «ключ-значение» (Redis) метаданные читаются пачками через MGET,
+    а не отдельным запросом на каждую задачу; завершенные задачи берутся из кэша процесса.
+    Вызовы блокирующие: из async-кода — через пул потоков.
+    """
+    batch = GroupResult.restore(batch_id, app=celery_app)
+    if batch is None:
+        return None
+
+    task_ids = [result.id for result in batch.results]
+    backend = celery_app.backend
+    if not hasattr(backend, "mget"):
+        return [{"task_id": result.id, "status": result.state,
+                 "result": result.result if result.ready() else None}
+                for result in batch.results]
+
+    cached = {task_id: task_meta_cache.get(task_id) for task_id in task_ids}
+    missing = [task_id for task_id in task_ids if cached[task_id] is None]
+    for start in range(0, len(missing), chunk_size):
+        chunk = missing[start:start + chunk_size]
+        values = backend.mget([backend.get_key_for_task(task_id) for task_id in chunk])
+        for task_id, value in zip(chunk, values):
+            cached[task_id] = _decode_task_meta(task_id, value)
+            task_meta_cache.put(cached[task_id])
+    return [cached[task_id] for task_id in task_ids]
+
+
+def get_task_result(task_id: str)->Optional[AsyncResult]:
+    """
+    Создает объект AsyncResult для проверки статуса задачи.
+    """
+    return celery_app.AsyncResult(task_id)
+
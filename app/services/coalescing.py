@@ -0,0 +1,76 @@
+from typing import Optional
+import logging
+
+from redis.exceptions import RedisError
+
+from app.core.config import COALESCE_LOCK_TTL
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+def _inflight_key(cache_key: str) -> str:
+    return f"inflight:{cache_key}"
+
+
+def _shared_key(task_id: str) -> str:
+    return f"inflight:shared:{task_id}"
+
+
+def claim_inflight(cache_key: str, task_id: str, ttl: int = COALESCE_LOCK_TTL) -> Optional[str]:
+    """
+    Пытается стать ведущей задачей для ключа (SET NX с TTL). Возвращает None, если ключ
+    захвачен этой задачей, иначе id уже выполняющейся задачи, к которой нужно
+    присоединиться (ее результат теперь общий). При недоступном Redis возвращает None:
+    задача просто ставится без объединения.
+    """
+    redis = get_redis()
+    key = _inflight_key(cache_key)
+    try:
+        if redis.set(key, task_id, nx=True, ex=ttl):
+            return None
+        leader_id = redis.get(key)
+        if leader_id is None:
+            # Ведущая задача успела завершиться между SET и GET
+            return None
+        leader_id = leader_id.decode()
+        pipe = redis.pipeline(transaction=False)
+        pipe.incr(_shared_key(leader_id))
+        pipe.expire(_shared_key(leader_id), ttl * 2)
+        pipe.execute()
+        return leader_id
+    except RedisError as e:
+        logger.warning(f"Request coalescing unavailable, dispatching without it: {e}")
+        return None
+
+
+def release_inflight(cache_key: str, task_id: str) -> None:
+    """
+    Снимает блокировку ключа по завершении ведущей задачи (успешном или нет), если она
+    еще принадлежит этой задаче. Дальше повторы обслуживает кэш результатов.
+    """
+    redis = get_redis()
+    key = _inflight_key(cache_key)
+    try:
+        leader_id = redis.get(key)
+        if leader_id is not None and leader_id.decode() == task_id:
+            redis.delete(key)
+    except RedisError as e:
+        logger.warning(f"Failed to release in-flight lock for task {task_id}: {e}")
+
+
+def result_still_shared(task_id: str) -> bool:
+    """
+    Учитывает скачивание результата задачи. True, если его еще ждут другие
+    присоединенные запросы и файлы удалять рано.
+    """
+    redis = get_redis()
+    try:
+        remaining = redis.decr(_shared_key(task_id))
+        if remaining < 0:
+            redis.delete(_shared_key(task_id))
+            return False
+        return True
+    except RedisError as e:
+        logger.warning(f"Failed to check shared result of task {task_id}: {e}")
+        return False
@@ -1,19 +1,21 @@
 from fastapi import UploadFile
 from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, Optional
 import uuid
-import shutil
 import logging
+import zipfile
 
-DATA_DIR = Path('/app/data')
-RAW_DIR = DATA_DIR / 'raw'
-PROCESSED_DIR = DATA_DIR / 'processed'
+from app.services.storage import get_storage, RAW_AREA, PROCESSED_AREA
 
-RAW_DIR.mkdir(parents=True, exist_ok=True)
-PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+ZIP_CONTENT_TYPES = {"application/zip", "application/x-zip-compressed"}
 
-def generate_filenames(original_filename: str, process_type: str)->tuple[str, str]:
+
+def generate_filenames(original_filename: str, process_type: str,
+                       output_extension: Optional[str] = None)->tuple[str, str]:
     """
     Генерирует уникальные имена для входного и выходного файлов.
+    output_extension задает расширение результата (по умолчанию — как у исходника).
     Возвращает (input_filename, output_filename)
     """
 
@@ -21,54 +23,187 @@ def generate_filenames(original_filename: str, process_type: str)->tuple[str, st
     unique_id = str(uuid.uuid4())
 
     input_filename = f"{unique_id}_raw{file_extension}"
-    output_filename = f"{unique_id}_{process_type}{file_extension}"
+    output_filename = f"{unique_id}_{process_type}{output_extension or file_extension}"
 
     return input_filename, output_filename
 
-async def save_uploaded_file(uploaded_file: UploadFile, input_filename: str)->Path:
+async def save_uploaded_file(uploaded_file: UploadFile, input_filename: str, hasher=None)->int:
+    """
+    Сохраняет UploadFile в хранилище (область RAW) без блокировки цикла событий.
+    Если передан hasher (например, hashlib.sha256()), обновляет его содержимым файла.
+    Возвращает размер сохраненного файла в байтах.
+    """
+    await uploaded_file.seek(0)
+    return await get_storage().save_async(RAW_AREA, input_filename, uploaded_file.file, hasher=hasher)
+
+
+def save_stream(source: BinaryIO, input_filename: str, hasher=None)->int:
+    """
+    Синхронно сохраняет файловый поток в хранилище (например, элемент zip-архива).
+    Возвращает размер сохраненного файла в байтах.
+    """
+    return get_storage().save(RAW_AREA, input_filename, source, hasher=hasher)
+
+
+def is_zip_upload(uploaded_file: UploadFile)->bool:
+    """
+    Определяет, является ли загруженный файл zip-архивом.
+    """
+    return (uploaded_file.content_type in ZIP_CONTENT_TYPES
+            or Path(uploaded_file.filename or "").suffix.lower() == ".zip")
+
+
+class ZipLimitError(ValueError):
+    """
+    Изображение в zip-архиве или архив целиком после распаковки больше допустимого.
+    """
+
+
+def iter_zip_images(archive: BinaryIO, max_member_bytes: Optional[int] = None,
+                    max_total_bytes: Optional[int] = None)->Iterator[tuple[str, BinaryIO]]:
+    """
+    Перебирает изображения (JPG/PNG) внутри zip-архива.
+    Возвращает пары (имя файла без каталогов, поток для чтения).
+    Размеры проверяются по заголовкам архива до распаковки (zipfile не распакует
+    больше заявленного размера): ZipLimitError, если изображение больше max_member_bytes
+    или их сумма больше max_total_bytes.
+    """
+    total = 0
+    with zipfile.ZipFile(archive) as zf:
+        for info in zf.infolist():
+            name = Path(info.filename).name
+            if info.is_dir() or name.startswith(".") or Path(name).suffix.lower() not in IMAGE_EXTENSIONS:
+                continue
+            if max_member_bytes and info.file_size > max_member_bytes:
+                raise ZipLimitError(f"Image {name} in archive exceeds the limit of {max_member_bytes} bytes.")
+            total += info.file_size
+            if max_total_bytes and total > max_total_bytes:
+                raise ZipLimitError(f"Images in archive exceed the total limit of {max_total_bytes} bytes.")
+            with zf.open(info) as member:
+                yield name, member
+
+
+class _ZipStreamBuffer:
+    """
+    Минимальный файловый объект для zipfile: накапливает записанные байты,
+    чтобы их можно было отдавать клиенту по частям.
+    """
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def pop(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_processed_file(output_filename: str, start: int = 0, length: Optional[int] = None,
+                        chunk_size: int = 64 * 1024)->Iterator[bytes]:
+    """
+    Потоково читает обработанный файл из хранилища: length байт начиная со start
+    (по умолчанию — весь файл).
+    """
+    with get_storage().open(PROCESSED_AREA, output_filename) as source:
+        source.seek(start)
+        remaining = length
+        while remaining is None or remaining > 0:
+            chunk = source.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+def transcode_processed_file(output_filename: str, output_format: str)->bytes:
+    """
+    Перекодирует обработанный файл в другой формат (jpeg, png, webp, avif) для отдачи клиенту.
+    Кодировщик импортируется лениво: API не загружает Pillow, пока это не нужно.
+    """
+    from app.services.image_processor import transcode
+
+    with get_storage().open(PROCESSED_AREA, output_filename) as source:
+        return transcode(source, output_format)
+
+
+def stream_zip(entries: Iterable[tuple[str, str]], chunk_size: int = 64 * 1024)->Iterator[bytes]:
+    """
+    Потоково собирает zip-архив из обработанных файлов, не держа его целиком в памяти.
+    entries — пары (имя обработанного файла, имя внутри архива). Изображения уже сжаты,
+    поэтому файлы кладутся в архив без повторного сжатия (ZIP_STORED).
+    """
+    storage = get_storage()
+    buffer = _ZipStreamBuffer()
+    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_STORED) as zf:
+        for output_filename, arcname in entries:
+            with storage.open(PROCESSED_AREA, output_filename) as source, \
+                    zf.open(arcname, mode="w", force_zip64=True) as target:
+                while chunk := source.read(chunk_size):
+                    target.write(chunk)
+                    if data := buffer.pop():
+                        yield data
+            if data := buffer.pop():
+                yield data
+    if data := buffer.pop():
+        yield data
+
+
+def get_raw_file_path(input_filename: str)->Optional[Path]:
     """
-    Сохраняет UploadFile на диск в папку RAW_DIR.
-    Возвращает полный путь к сохраненному файлу.
+    Возвращает полный путь к исходному файлу (только для локального хранилища, иначе None).
     """
-    input_path = RAW_DIR / input_filename
+    return get_storage().local_path(RAW_AREA, input_filename)
 
-    with open(input_path, 'wb') as f:
-        while chunk := await uploaded_file.read(8192):
-            f.write(chunk)
 
-    return input_path
+def get_processed_file_path(output_filename: str)->Optional[Path]:
+    """
+    Возвращает полный путь к обработанному файлу (только для локального хранилища, иначе None).
+    """
+    return get_storage().local_path(PROCESSED_AREA, output_filename)
 
 
-def get_raw_file_path(input_filename: str)->Path:
+def stat_processed_file(output_filename: str)->tuple[int, float]:
     """
-    Возвращает полный путь к исходному файлу.
+    Размер и время модификации обработанного файла. Бросает FileNotFoundError, если файла нет.
     """
-    return RAW_DIR / input_filename
+    return get_storage().stat(PROCESSED_AREA, output_filename)
 
 
-def get_processed_file_path(output_filename: str)->Path:
+def processed_file_exists(output_filename: str)->bool:
     """
-    Возвращает полный путь к обработанному файлу.
+    Проверяет, что обработанный файл есть в хранилище.
     """
-    return PROCESSED_DIR / output_filename
+    return get_storage().exists(PROCESSED_AREA, output_filename)
+
+
+def delete_raw_file(input_filename: str)->None:
+    """
+    Удаляет исходный файл из хранилища, если он есть.
+    """
+    get_storage().delete(RAW_AREA, input_filename)
+
 
 def cleanup_files(input_filename: str, output_filename: str)->None:
     """
-    Удаляет исходный и обработанный файлы с диска.
+    Удаляет исходный и обработанный файлы из хранилища.
     """
-    input_path = RAW_DIR / input_filename
-    output_path = PROCESSED_DIR / output_filename
+    storage = get_storage()
 
-    if input_path.exists():
-        try:
-            input_path.unlink()
+    try:
+        if storage.delete(RAW_AREA, input_filename):
             logging.info(f"Successfully cleaned up RAW file: {input_filename}")
-        except OSError as e:
-            logging.error(f"Failed to cleanup RAW file: {input_filename}: {e}")
-    if output_path.exists():
-        try:
-            output_path.unlink()
+    except OSError as e:
+        logging.error(f"Failed to cleanup RAW file: {input_filename}: {e}")
+    try:
+        if storage.delete(PROCESSED_AREA, output_filename):
             logging.info(f"Successfully cleaned up PROCESSED file: {output_filename}")
-        except OSError as e:
-            logging.error(f"Failed to cleanup PROCESSED file: {output_filename}: {e}")
-
+    except OSError as e:
+        logging.error(f"Failed to cleanup PROCESSED file: {output_filename}: {e}")
@@ -0,0 +1,118 @@
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional
+
+from app.core.config import AUTO_OUTPUT_FORMATS
+
+# Поддерживаемые выходные форматы: имя в API -> формат Pillow, расширение, MIME-тип
+OUTPUT_FORMATS: Dict[str, Dict[str, str]] = {
+    "jpeg": {"pillow": "JPEG", "extension": ".jpg", "media_type": "image/jpeg", "feature": "jpg"},
+    "png": {"pillow": "PNG", "extension": ".png", "media_type": "image/png", "feature": "zlib"},
+    "webp": {"pillow": "WEBP", "extension": ".webp", "media_type": "image/webp", "feature": "webp"},
+    "avif": {"pillow": "AVIF", "extension": ".avif", "media_type": "image/avif", "feature": "avif"},
+}
+
+_MEDIA_TYPES_BY_EXTENSION = {".jpeg": "image/jpeg"}
+_MEDIA_TYPES_BY_EXTENSION.update({spec["extension"]: spec["media_type"] for spec in OUTPUT_FORMATS.values()})
+
+
+@lru_cache(maxsize=1)
+def supported_output_formats() -> tuple[str, ...]:
+    """
+    Форматы, для которых в установленной сборке Pillow есть кодировщик.
+    Pillow импортируется только при первом вызове.
+    """
+    from PIL import features
+
+    supported = []
+    for name, spec in OUTPUT_FORMATS.items():
+        try:
+            if features.check(spec["feature"]):
+                supported.append(name)
+        except ValueError:
+            continue
+    return tuple(supported)
+
+
+def format_for_filename(filename: str) -> Optional[str]:
+    """
+    Имя формата (jpeg, png, ...) по расширению файла или None.
+    """
+    extension = Path(filename).suffix.lower()
+    if extension == ".jpeg":
+        return "jpeg"
+    for name, spec in OUTPUT_FORMATS.items():
+        if spec["extension"] == extension:
+            return name
+    return None
+
+
+def media_type_for_filename(filename: str) -> str:
+    """
+    MIME-тип изображения по расширению файла.
+    """
+    return _MEDIA_TYPES_BY_EXTENSION.get(Path(filename).suffix.lower(), "application/octet-stream")
+
+
+def parse_accept(accept_header: Optional[str]) -> Dict[str, float]:
+    """
+    Разбирает заголовок Accept в словарь {MIME-тип: q}.
+    """
+    accepted: Dict[str, float] = {}
+    for part in (accept_header or "").split(","):
+        media_type, *params = [item.strip() for item in part.split(";")]
+        if not media_type:
+            continue
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        accepted[media_type.lower()] = quality
+    return accepted
+
+
+def is_acceptable(media_type: str, accepted: Dict[str, float]) -> bool:
+    """
+    Проверяет, принимает ли клиент MIME-тип (с учетом image/* и */*).
+    Пустой Accept означает, что подходит любой тип.
+    """
+    if not accepted:
+        return True
+    for candidate in (media_type, media_type.split("/")[0] + "/*", "*/*"):
+        if candidate in accepted:
+            return accepted[candidate] > 0
+    return False
+
+
+def negotiate_output_format(accept_header: Optional[str]) -> Optional[str]:
+    """
+    Выбирает выходной формат по заголовку Accept: первый из AUTO_OUTPUT_FORMATS,
+    который поддерживается сервером и явно указан клиентом. None — явного выбора нет.
+    """
+    accepted = parse_accept(accept_header)
+    supported = supported_output_formats()
+    for name in AUTO_OUTPUT_FORMATS:
+        spec = OUTPUT_FORMATS.get(name)
+        if spec and name in supported and accepted.get(spec["media_type"], 0) > 0:
+            return name
+    return None
+
+
+def negotiate_download_format(filename: str, accept_header: Optional[str]) -> Optional[str]:
+    """
+    Формат, в который нужно перекодировать готовый файл при скачивании:
+    None, если клиент принимает его текущий тип, иначе первый из AUTO_OUTPUT_FORMATS,
+    который поддерживается и принимается клиентом (None, если такого нет).
+    """
+    accepted = parse_accept(accept_header)
+    if is_acceptable(media_type_for_filename(filename), accepted):
+        return None
+    supported = supported_output_formats()
+    for name in AUTO_OUTPUT_FORMATS:
+        spec = OUTPUT_FORMATS.get(name)
+        if spec and name in supported and is_acceptable(spec["media_type"], accepted):
+            return name
+    return None
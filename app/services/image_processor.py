@@ -1,103 +1,485 @@
 from PIL import Image, ImageDraw, ImageFilter, ImageEnhance
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, BinaryIO, Callable, Dict, List, Optional
+import contextvars
+import io
 import logging
 
+from app.core.config import RESIZE_RESAMPLE, RESIZE_REDUCING_GAP, TILED_THRESHOLD_PIXELS, VARIANT_ENCODE_THREADS
+from app.core.metrics import count_bytes, count_megapixels, stage_timer
+from app.services.formats import OUTPUT_FORMATS
+from app.services.storage import get_storage, RAW_AREA, PROCESSED_AREA
+from app.services.parallel import parallel_workers, resize_in_bands, run_pointwise_in_bands
+from app.services.tiling import check_memory_budget, limit_decode_rows
+
 logger = logging.getLogger(__name__)
 
-DATA_DIR = Path("/app/data")
+RESAMPLE_FILTERS = {
+    "nearest": Image.Resampling.NEAREST,
+    "box": Image.Resampling.BOX,
+    "bilinear": Image.Resampling.BILINEAR,
+    "hamming": Image.Resampling.HAMMING,
+    "bicubic": Image.Resampling.BICUBIC,
+    "lanczos": Image.Resampling.LANCZOS,
+}
+RESAMPLE_FILTER = RESAMPLE_FILTERS.get(RESIZE_RESAMPLE.lower(), Image.Resampling.BICUBIC)
 
-DATA_DIR.mkdir(exist_ok=True)
-(DATA_DIR / "processed").mkdir(exist_ok=True)
-(DATA_DIR / "raw").mkdir(exist_ok=True)
 
-def apply_grayscale(input_filename: str, output_filename: str):
+def to_grayscale(img: Image.Image) -> Image.Image:
     """
-    Открывает изображение, применяет фильтр "Градации серого" и сохраняет результат.
+    Преобразует изображение в оттенки серого.
+    """
+    return img.convert("L")
+
+
+def _draft_size(width: int, height: int) -> tuple[int, int]:
+    """
+    Минимальный размер, до которого можно уменьшить изображение при декодировании,
+    не теряя качества при последующем resize.
+    """
+    return int(width * RESIZE_REDUCING_GAP), int(height * RESIZE_REDUCING_GAP)
+
+
+def to_resized(img: Image.Image, width: int, height: int) -> Image.Image:
+    """
+    Изменяет размер изображения до width x height.
+    Для еще не декодированного JPEG включает draft-режим: декодер сразу
+    уменьшает изображение в 2/4/8 раз, если целевой размер намного меньше исходного.
+    Остаток уменьшения выполняется через Image.reduce (reducing_gap) и фильтр RESAMPLE_FILTER.
+    """
+    img.draft(None, _draft_size(width, height))
+    return img.resize((width, height), resample=RESAMPLE_FILTER, reducing_gap=RESIZE_REDUCING_GAP)
+
+
+def _tone_matrix(tint: tuple[int, int, int], strength: float) -> tuple[float, ...]:
+    """
+    Строит матрицу 3x4 (в плоском виде), которая тонирует яркость изображения
+    в заданный цвет: out_c = strength * L + (1 - strength) * tint_c,
+    где L = 0.299 R + 0.587 G + 0.114 B.
+    """
+    matrix: list[float] = []
+    for tint_channel in tint:
+        matrix += [strength * 0.299, strength * 0.587, strength * 0.114, (1 - strength) * tint_channel]
+    return tuple(matrix)
+
+
+# Теплый, насыщенный бежевый; 60% яркости исходника и 40% цвета тонирования
+SEPIA_MATRIX = _tone_matrix((255, 200, 150), 0.6)
+
+# Именованные тональные эффекты, выполняемые одним матричным проходом
+COLOR_MATRICES: Dict[str, tuple[float, ...]] = {
+    "sepia": SEPIA_MATRIX,
+}
+
+
+def _flatten_matrix(matrix) -> tuple[float, ...]:
+    """
+    Приводит матрицу 3x4 (список строк или плоский список из 12 чисел) к плоскому кортежу.
+    """
+    flat = tuple(float(value) for row in matrix for value in (row if isinstance(row, (list, tuple)) else [row]))
+    if len(flat) != 12:
+        raise ValueError(f"Color matrix must have 3x4 = 12 values, got {len(flat)}")
+    return flat
+
+
+def apply_color_matrix(img: Image.Image, matrix) -> Image.Image:
+    """
+    Применяет цветовую матрицу 3x4 за один проход без промежуточных полноразмерных кадров:
+    out_c = m[c][0] * R + m[c][1] * G + m[c][2] * B + m[c][3].
+    Для RGB используется Image.convert(matrix=...), для L — три LUT через point().
+    """
+    flat = _flatten_matrix(matrix)
+    rows = [flat[0:4], flat[4:8], flat[8:12]]
+
+    if img.mode == "L":
+        # R = G = B = v, поэтому каждая строка матрицы сводится к таблице на 256 значений
+        luts = [
+            [min(255, max(0, round((r + g + b) * value + offset))) for value in range(256)]
+            for r, g, b, offset in rows
+        ]
+        return Image.merge("RGB", [img.point(lut) for lut in luts])
+
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    return img.convert("RGB", flat)
+
+
+def to_color_matrix(img: Image.Image, matrix) -> Image.Image:
+    """
+    Применяет пользовательскую цветовую матрицу 3x4.
+    """
+    return apply_color_matrix(img, matrix)
+
+
+def to_sepia(img: Image.Image) -> Image.Image:
+    """
+    Тонирует изображение в сепию одним матричным проходом.
+    """
+    return apply_color_matrix(img, SEPIA_MATRIX)
+
+
+def to_cropped(img: Image.Image, left: int, top: int, right: int, bottom: int) -> Image.Image:
+    """
+    Обрезает изображение по координатам (left, top, right, bottom).
+    Для построчных декодеров строки ниже bottom не декодируются,
+    а в RGB конвертируется только вырезанная область, а не весь кадр.
+    """
+    limit_decode_rows(img, bottom)
+    return img.crop((left, top, right, bottom)).convert("RGB")
+
+
+# Реестр операций, доступных в пайплайне: имя -> функция над PIL.Image
+OPERATIONS: Dict[str, Callable[..., Image.Image]] = {
+    "grayscale": to_grayscale,
+    "sepia": to_sepia,
+    "resize": to_resized,
+    "crop": to_cropped,
+    "color_matrix": to_color_matrix,
+}
+
+# Попиксельные операции: для больших изображений выполняются полосами в пуле потоков
+POINTWISE_OPERATIONS = {"grayscale", "sepia", "color_matrix"}
+
+
+def _draft_crop_before_resize(img: Image.Image, operations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Если цепочка начинается с crop и следом идет сильное уменьшение (resize),
+    декодирует JPEG сразу в уменьшенном масштабе (draft) и пересчитывает
+    координаты обрезки под новый масштаб. Возвращает (возможно измененный) список операций.
+    """
+    if len(operations) < 2 or operations[0]["op"] != "crop" or operations[1]["op"] != "resize":
+        return operations
+
+    crop, resize = operations[0], operations[1]
+    crop_width, crop_height = crop["right"] - crop["left"], crop["bottom"] - crop["top"]
+    target_width, target_height = _draft_size(resize["width"], resize["height"])
+    if target_width >= crop_width or target_height >= crop_height:
+        return operations
+
+    original_width, original_height = img.size
+    requested = (original_width * target_width // crop_width + 1,
+                 original_height * target_height // crop_height + 1)
+    if img.draft(None, requested) is None or img.size == (original_width, original_height):
+        return operations
+
+    scale_x, scale_y = img.width / original_width, img.height / original_height
+    scaled_crop = {
+        "op": "crop",
+        "left": int(crop["left"] * scale_x),
+        "top": int(crop["top"] * scale_y),
+        "right": max(int(crop["left"] * scale_x) + 1, round(crop["right"] * scale_x)),
+        "bottom": max(int(crop["top"] * scale_y) + 1, round(crop["bottom"] * scale_y)),
+    }
+    return [scaled_crop] + operations[1:]
+
+
+def apply_operations(img: Image.Image, operations: List[Dict[str, Any]],
+                     on_progress: Optional[Callable[[int], None]] = None) -> Image.Image:
+    """
+    Последовательно применяет цепочку операций к изображению в памяти.
+    Каждая операция — словарь вида {"op": "<имя>", <параметры>...}.
+    on_progress, если передан, вызывается после каждой операции с процентом выполнения
+    (последняя доля оставлена на кодирование результата).
+    Декодирование и сами преобразования замеряются как отдельные этапы. Большие
+    изображения обрабатываются полосами параллельно (см. app.services.parallel).
+    """
+    operations = _draft_crop_before_resize(img, operations)
+    if getattr(img, "tile", None):
+        if operations and operations[0]["op"] == "resize":
+            # draft до проверки бюджета и load(): после декодирования to_resized уже не
+            # сможет уменьшить JPEG при распаковке
+            img.draft(None, _draft_size(operations[0]["width"], operations[0]["height"]))
+        # Изображение еще не декодировано: проверяем бюджет памяти по заголовку
+        # (по строкам обрезки — только если декодер действительно остановится на них)
+        crop_bottom = operations[0]["bottom"] if operations and operations[0]["op"] == "crop" else None
+        limited = crop_bottom is not None and limit_decode_rows(img, crop_bottom)
+        check_memory_budget(img, crop_bottom if limited else None)
+        # Декодируем явно (с учетом draft и ограничения строк), чтобы отделить его от преобразований
+        with stage_timer("decode"):
+            img.load()
+        count_megapixels(img.width, img.height)
+
+    with stage_timer("transform"):
+        for index, operation in enumerate(operations):
+            params = dict(operation)
+            name = params.pop("op")
+            operation_fn = OPERATIONS[name]
+            workers = parallel_workers(img.width * img.height)
+            if name in POINTWISE_OPERATIONS and img.width * img.height >= TILED_THRESHOLD_PIXELS:
+                img = run_pointwise_in_bands(img, operation, lambda strip: operation_fn(strip, **params), workers)
+            elif name == "resize" and workers > 1:
+                img = resize_in_bands(img, params["width"], params["height"], RESAMPLE_FILTER,
+                                      RESIZE_REDUCING_GAP, workers)
+            else:
+                img = operation_fn(img, **params)
+            if on_progress is not None:
+                on_progress(100 * (index + 1) // (len(operations) + 1))
+    return img
+
+
+def _output_format(output_filename: str) -> str:
     """
+    Определяет формат сохранения (JPEG, PNG, ...) по расширению выходного файла.
+    """
+    extension = Path(output_filename).suffix.lower()
+    image_format = Image.registered_extensions().get(extension)
+    if image_format is None:
+        raise ValueError(f"Unknown output file extension: '{extension}'")
+    return image_format
+
+
+def _encoder_params(image_format: str, encode_options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Переводит общие настройки кодирования (quality 1-100, effort 0-9, где 9 — медленнее и меньше,
+    progressive, optimize) в параметры save() конкретного кодировщика Pillow.
+    """
+    options = encode_options or {}
+    quality, effort = options.get("quality"), options.get("effort")
+    params: Dict[str, Any] = {}
+
+    if image_format == "JPEG":
+        params["progressive"] = bool(options.get("progressive"))
+        params["optimize"] = bool(options.get("optimize"))
+        if quality is not None:
+            params["quality"] = quality
+    elif image_format == "PNG":
+        params["optimize"] = bool(options.get("optimize"))
+        if effort is not None:
+            params["compress_level"] = effort
+    elif image_format == "WEBP":
+        if quality is not None:
+            params["quality"] = quality
+        if effort is not None:
+            params["method"] = round(effort * 6 / 9)
+    elif image_format == "AVIF":
+        if quality is not None:
+            params["quality"] = quality
+        if effort is not None:
+            params["speed"] = 10 - round(effort * 10 / 9)
+    return params
 
-    input_path = DATA_DIR / "raw" / input_filename
-    output_path = DATA_DIR / "processed" / output_filename
+
+def encode_image(img: Image.Image, target: BinaryIO, image_format: str,
+                 encode_options: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Кодирует изображение в поток target, приводя режим к поддерживаемому форматом.
+    """
+    if image_format == "JPEG" and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    elif image_format in ("WEBP", "AVIF") and img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+    img.save(target, format=image_format, **_encoder_params(image_format, encode_options))
+
+
+def _resolve_output_format(output_filename: str, image_format: Optional[str],
+                           encode_options: Optional[Dict[str, Any]]) -> str:
+    if encode_options and encode_options.get("format"):
+        return OUTPUT_FORMATS[encode_options["format"]]["pillow"]
+    return image_format or _output_format(output_filename)
+
+
+def save_output(img: Image.Image, output_filename: str, image_format: str | None = None,
+                encode_options: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Кодирует изображение и записывает его в хранилище (область PROCESSED).
+    Формат берется из encode_options, затем из image_format, затем из расширения файла.
+    """
+    image_format = _resolve_output_format(output_filename, image_format, encode_options)
+    with stage_timer("encode"), get_storage().writer(PROCESSED_AREA, output_filename) as output_file:
+        encode_image(img, output_file, image_format, encode_options)
+        count_bytes("out", output_file.tell())
+
+
+def transcode(source: BinaryIO, output_format: str, encode_options: Optional[Dict[str, Any]] = None) -> bytes:
+    """
+    Перекодирует готовое изображение в другой формат (jpeg, png, webp, avif) в памяти.
+    """
+    with Image.open(source) as img:
+        buffer = io.BytesIO()
+        encode_image(img, buffer, OUTPUT_FORMATS[output_format]["pillow"], encode_options)
+        return buffer.getvalue()
+
+
+def apply_grayscale(input_filename: str, output_filename: str,
+                    encode_options: Optional[Dict[str, Any]] = None):
+    """
+    Открывает изображение, применяет фильтр "Градации серого" и сохраняет результат.
+    """
 
     try:
-        img = Image.open(input_path)
+        with get_storage().open(RAW_AREA, input_filename) as input_file:
+            img = Image.open(input_file)
 
-        img_gray = img.convert("L")
+            img_gray = apply_operations(img, [{"op": "grayscale"}])
 
-        img_gray.save(output_path)
+            save_output(img_gray, output_filename, encode_options=encode_options)
 
         return True
     except FileNotFoundError:
-        print(f"File not found: {input_path}")
+        print(f"File not found: {input_filename}")
         return False
     except Exception as e:
         print(f"Error processing image: {e}")
         return False
 
 
-def resize_image(input_filename: str, output_filename: str, size: tuple[int, int]):
+def resize_image(input_filename: str, output_filename: str, size: tuple[int, int],
+                 encode_options: Optional[Dict[str, Any]] = None):
     """
     Изменяет размер изображения до заданных width x height и сохраняет результат.
     """
-    input_path = DATA_DIR / "raw" / input_filename
-    output_path = DATA_DIR / "processed" / output_filename
     try:
-        img = Image.open(input_path)
+        with get_storage().open(RAW_AREA, input_filename) as input_file:
+            img = Image.open(input_file)
 
-        img_resized = img.resize(size)
-        img_resized.save(output_path)
+            img_resized = apply_operations(img, [{"op": "resize", "width": size[0], "height": size[1]}])
+            save_output(img_resized, output_filename, encode_options=encode_options)
         return True
     except FileNotFoundError:
-        print(f"File not found: {input_path}")
+        print(f"File not found: {input_filename}")
         return False
     except Exception as e:
         print(f"Error processing image: {e}")
         return False
 
-def sepia_image(input_filename: str, output_filename: str):
+def sepia_image(input_filename: str, output_filename: str,
+                encode_options: Optional[Dict[str, Any]] = None):
     """
     Применяет эффект Сепии к изображению.
     """
-    input_path = DATA_DIR / "raw" / input_filename
-    output_path = DATA_DIR / "processed" / output_filename
-
     try:
-        # 1. Открываем изображение и конвертируем в RGB (для надежности)
-        img = Image.open(input_path).convert("RGB")
-
-        # 2. Получаем монохромную версию (маска яркости)
-        grayscale_mask = img.convert("L")
-
-        # 3. Конвертируем маску обратно в RGB, чтобы она могла смешиваться
-        grayscale_rgb = grayscale_mask.convert("RGB")
-
-        # 4. Создаем "холст" с цветом сепии
-        sepia_color = (255, 200, 150)  # Теплый, насыщенный бежевый
-        sepia_base = Image.new("RGB", img.size, sepia_color)
-
-        # 5. Смешивание (Image.blend): Смешиваем бежевый фон с черно-белым изображением.
-        #    alpha=0.6 означает 60% Sepia Base и 40% Grayscale (для тонирования)
-        final_img = Image.blend(sepia_base, grayscale_rgb, alpha=0.6)
-
-        # 6. Сохраняем результат
-        final_img.save(output_path, "JPEG")
+        with get_storage().open(RAW_AREA, input_filename) as input_file:
+            img = Image.open(input_file)
+            final_img = apply_operations(img, [{"op": "sepia"}])
+            save_output(final_img, output_filename, "JPEG", encode_options)
         return True
 
     except Exception as e:
         logger.error(f"Error applying sepia to image {input_filename}: {e}")
         return False
 
-def crop_image(input_filename: str, output_filename: str, box: tuple[int, int, int, int])-> bool:
+def crop_image(input_filename: str, output_filename: str, box: tuple[int, int, int, int],
+               encode_options: Optional[Dict[str, Any]] = None)-> bool:
     """
     Обрезает изображение по заданным координатам (left, top, right, bottom).
     """
-    input_path = DATA_DIR / "raw" / input_filename
-    output_path = DATA_DIR / "processed" / output_filename
-
     try:
-        img = Image.open(input_path).convert("RGB")
-        cropped_img = img.crop(box)
-        cropped_img.save(output_path)
+        with get_storage().open(RAW_AREA, input_filename) as input_file:
+            img = Image.open(input_file)
+            left, top, right, bottom = box
+            cropped_img = apply_operations(
+                img, [{"op": "crop", "left": left, "top": top, "right": right, "bottom": bottom}])
+            save_output(cropped_img, output_filename, encode_options=encode_options)
         return True
     except Exception as e:
         logger.error(f"Error cropping image {input_filename} with box {box}: {e}")
         return False
+
+
+def run_pipeline(input_filename: str, output_filename: str, operations: List[Dict[str, Any]],
+                 on_progress: Optional[Callable[[int], None]] = None,
+                 encode_options: Optional[Dict[str, Any]] = None) -> bool:
+    """
+    Выполняет цепочку операций над одним изображением:
+    одно декодирование, все преобразования в памяти, одно кодирование.
+    """
+    try:
+        with get_storage().open(RAW_AREA, input_filename) as input_file:
+            img = Image.open(input_file)
+            result_img = apply_operations(img, operations, on_progress)
+            save_output(result_img, output_filename, encode_options=encode_options)
+        return True
+    except Exception as e:
+        logger.error(f"Error running pipeline {operations} on image {input_filename}: {e}")
+        return False
+
+
+def process_image_bytes(data: bytes, output_filename: str, operations: List[Dict[str, Any]],
+                        encode_options: Optional[Dict[str, Any]] = None) -> memoryview:
+    """
+    Быстрый путь для маленьких изображений: декодирование, цепочка операций и кодирование
+    в памяти, без обращения к хранилищу. Формат результата — как у save_output
+    (output_filename задает его по расширению). Возвращает memoryview над буфером
+    результата без лишнего копирования. Ошибки не перехватываются.
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        result_img = apply_operations(img, operations)
+        buffer = io.BytesIO()
+        with stage_timer("encode"):
+            encode_image(result_img, buffer, _resolve_output_format(output_filename, None, encode_options),
+                         encode_options)
+    count_bytes("out", buffer.tell())
+    return buffer.getbuffer()
+
+
+def variant_filename(base_name: str, width: int, output_format: str) -> str:
+    """
+    Имя файла варианта: <base_name>_<width>w.<расширение формата>.
+    """
+    return f"{base_name}_{width}w{OUTPUT_FORMATS[output_format]['extension']}"
+
+
+def build_variants(input_filename: str, base_name: str, widths: List[int], formats: List[str],
+                   encode_options: Optional[Dict[str, Any]] = None,
+                   on_progress: Optional[Callable[[int], None]] = None,
+                   threads: int = VARIANT_ENCODE_THREADS) -> List[Dict[str, Any]]:
+    """
+    Набор адаптивных вариантов (srcset) из одного исходника: изображение декодируется
+    один раз (JPEG — сразу в draft-режиме под самую большую ширину), каждый следующий
+    уровень уменьшается из предыдущего, а не из оригинала (как mipmap), и все пары
+    (ширина, формат) кодируются параллельно в пуле потоков. Ширины больше исходной
+    не увеличиваются. Возвращает манифест вариантов по возрастанию ширины.
+    Ошибки не перехватываются.
+    """
+    storage = get_storage()
+    with storage.open(RAW_AREA, input_filename) as input_file:
+        img = Image.open(input_file)
+        source_width, source_height = img.size
+        targets = sorted({min(width, source_width) for width in widths}, reverse=True)
+
+        def target_size(width: int) -> tuple[int, int]:
+            return width, max(1, round(source_height * width / source_width))
+
+        img.draft(None, _draft_size(*target_size(targets[0])))
+        check_memory_budget(img)
+        with stage_timer("decode"):
+            img.load()
+        count_megapixels(img.width, img.height)
+
+        levels = []
+        level = img
+        with stage_timer("transform"):
+            for width in targets:
+                size = target_size(width)
+                if level.size != size:
+                    level = level.resize(size, resample=RESAMPLE_FILTER, reducing_gap=RESIZE_REDUCING_GAP)
+                levels.append(level)
+
+    jobs = [(level, output_format) for level in levels for output_format in formats]
+    done = []
+
+    def encode(level: Image.Image, output_format: str) -> Dict[str, Any]:
+        filename = variant_filename(base_name, level.width, output_format)
+        with stage_timer("encode"), storage.writer(PROCESSED_AREA, filename) as output_file:
+            encode_image(level, output_file, OUTPUT_FORMATS[output_format]["pillow"], encode_options)
+            size = output_file.tell()
+        count_bytes("out", size)
+        done.append(filename)
+        if on_progress is not None:
+            on_progress(100 * len(done) // (len(jobs) + 1))
+        return {
+            "width": level.width,
+            "height": level.height,
+            "format": output_format,
+            "media_type": OUTPUT_FORMATS[output_format]["media_type"],
+            "filename": filename,
+            "size_bytes": size,
+        }
+
+    # Кодировщики Pillow отпускают GIL; контекст копируется, чтобы метрики получили имя операции
+    with ThreadPoolExecutor(max_workers=max(1, min(threads, len(jobs)))) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, encode, level, output_format)
+                   for level, output_format in jobs]
+        variants = [future.result() for future in futures]
+    return sorted(variants, key=lambda variant: (variant["width"], variant["format"]))
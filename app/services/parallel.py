@@ -0,0 +1,247 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextvars import ContextVar
+from multiprocessing import current_process, get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Dict, List, Optional
+import math
+import threading
+
+from PIL import Image
+
+from app.core.config import (
+    PARALLEL_ENGINE,
+    PARALLEL_MAX_WORKERS,
+    PARALLEL_QUEUE_THRESHOLD,
+    TILED_THRESHOLD_PIXELS,
+    TILE_STRIP_HEIGHT,
+    TILE_THREADS,
+)
+from app.core.worker_tuning import available_cpus
+from app.services.tiling import process_in_strips
+
+# Наибольший радиус фильтров Pillow (LANCZOS) в пикселях результата: полосе resize нужны
+# исходные строки за ее границами, иначе фильтр обрежется на стыке полос
+_MAX_FILTER_SUPPORT = 3.0
+# Режимы, для которых resize полосами совпадает с обычным resize
+BAND_RESIZE_MODES = {"L", "LA", "RGB", "RGBA", "RGBX", "CMYK", "YCbCr", "I", "F"}
+
+# Очередь Celery выполняемой задачи (None — вне задачи, например синхронный режим API)
+# и вычисленный для задачи параллелизм: длина очереди читается один раз на задачу
+_task_queue: ContextVar[Optional[str]] = ContextVar("task_queue", default=None)
+_task_budget: ContextVar[Optional[int]] = ContextVar("task_budget", default=None)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def set_task_queue(queue: Optional[str]) -> None:
+    """
+    Задает очередь выполняемой задачи (вызывается из сигналов Celery до и после задачи).
+    """
+    _task_queue.set(queue)
+    _task_budget.set(None)
+
+
+def _queue_budget(queue: str) -> int:
+    from app.core.metrics import queue_depth
+
+    depth = queue_depth(queue)
+    if depth is None:
+        return TILE_THREADS
+    if depth > PARALLEL_QUEUE_THRESHOLD:
+        return 1
+    return max(1, PARALLEL_MAX_WORKERS or available_cpus())
+
+
+def parallel_workers(pixels: int) -> int:
+    """
+    Сколько ядер может занять обработка изображения из pixels пикселей. Маленькие
+    изображения обрабатываются в один поток. Если очередь задачи не длиннее
+    PARALLEL_QUEUE_THRESHOLD, остальные слоты воркера простаивают и задача занимает
+    все ядра (до PARALLEL_MAX_WORKERS), а при длинной очереди ядра заняты другими
+    задачами и параллелизм не нужен. Вне задачи Celery и при неизвестной длине очереди — TILE_THREADS.
+    """
+    if pixels < TILED_THRESHOLD_PIXELS:
+        return 1
+    queue = _task_queue.get()
+    if queue is None:
+        return TILE_THREADS
+    budget = _task_budget.get()
+    if budget is None:
+        budget = _queue_budget(queue)
+        _task_budget.set(budget)
+    return budget
+
+
+def parallel_engine() -> str:
+    """
+    Движок параллельной обработки: "processes" или "threads". Дочерние процессы
+    prefork-пула Celery — демоны и не могут создавать свои процессы, поэтому в них
+    (как и вне задачи Celery) используются потоки: Pillow отпускает GIL в операциях над пикселями.
+    """
+    if PARALLEL_ENGINE == "threads" or _task_queue.get() is None or current_process().daemon:
+        return "threads"
+    return "processes"
+
+
+def _process_pool() -> ProcessPoolExecutor:
+    """
+    Общий пул процессов (создается при первом обращении и живет до выхода процесса):
+    запуск процессов и импорт Pillow не повторяются для каждой задачи.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=max(1, PARALLEL_MAX_WORKERS or available_cpus()),
+                                        mp_context=get_context("forkserver"))
+        return _pool
+
+
+def _row_bytes(mode: str, width: int) -> int:
+    return len(Image.new(mode, (width, 1)).tobytes())
+
+
+def _bands(height: int, count: int) -> List[tuple[int, int]]:
+    step = math.ceil(height / max(1, count))
+    return [(top, min(top + step, height)) for top in range(0, height, step)]
+
+
+def _resize_source_rows(top: int, bottom: int, scale: float, height: int) -> tuple[int, int]:
+    """
+    Исходные строки, нужные фильтру для строк результата [top, bottom) при масштабе scale.
+    """
+    support = _MAX_FILTER_SUPPORT * max(scale, 1.0)
+    return max(0, math.floor(top * scale - support) - 1), min(height, math.ceil(bottom * scale + support) + 1)
+
+
+def _copy_to_shared(img: Image.Image) -> SharedMemory:
+    """
+    Копирует пиксели изображения в общую память полосами (без полноразмерной копии в байтах).
+    """
+    width, height = img.size
+    row = _row_bytes(img.mode, width)
+    shared = SharedMemory(create=True, size=max(1, row * height))
+    for top in range(0, height, TILE_STRIP_HEIGHT):
+        bottom = min(top + TILE_STRIP_HEIGHT, height)
+        shared.buf[top * row:bottom * row] = img.crop((0, top, width, bottom)).tobytes()
+    return shared
+
+
+def _image_from_shared(shared: SharedMemory, mode: str, size: tuple[int, int], first_row: int = 0) -> Image.Image:
+    row = _row_bytes(mode, size[0])
+    with shared.buf[first_row * row:(first_row + size[1]) * row] as view:
+        return Image.frombytes(mode, size, view)
+
+
+def _write_rows(shared: SharedMemory, img: Image.Image, top: int) -> None:
+    row = _row_bytes(img.mode, img.width)
+    shared.buf[top * row:(top + img.height) * row] = img.tobytes()
+
+
+def _pointwise_band(job: Dict[str, Any]) -> None:
+    """
+    Выполняется в процессе пула: попиксельная операция над строками [top, bottom)
+    исходника в общей памяти, результат пишется на то же место в выходной буфер.
+    """
+    from app.services.image_processor import OPERATIONS
+
+    source, target = SharedMemory(name=job["source"]), SharedMemory(name=job["target"])
+    try:
+        band = _image_from_shared(source, job["mode"], (job["width"], job["bottom"] - job["top"]), job["top"])
+        params = dict(job["operation"])
+        result = OPERATIONS[params.pop("op")](band, **params)
+        _write_rows(target, result, job["top"])
+    finally:
+        source.close()
+        target.close()
+
+
+def _resize_band(job: Dict[str, Any]) -> None:
+    """
+    Выполняется в процессе пула: строки результата [top, bottom) resize из нужного
+    им участка исходника в общей памяти (с запасом на радиус фильтра).
+    """
+    source, target = SharedMemory(name=job["source"]), SharedMemory(name=job["target"])
+    try:
+        width, height = job["source_size"]
+        scale = height / job["size"][1]
+        first, last = _resize_source_rows(job["top"], job["bottom"], scale, height)
+        region = _image_from_shared(source, job["mode"], (width, last - first), first)
+        band = region.resize((job["size"][0], job["bottom"] - job["top"]), resample=job["resample"],
+                             box=(0, job["top"] * scale - first, width, job["bottom"] * scale - first))
+        _write_rows(target, band, job["top"])
+    finally:
+        source.close()
+        target.close()
+
+
+def _run_shared(img: Image.Image, out_mode: str, out_size: tuple[int, int],
+                band_job: Callable[[Dict[str, Any]], None], jobs: List[Dict[str, Any]]) -> Image.Image:
+    """
+    Раздает полосы процессам пула. Пиксели передаются через общую память: в сообщениях
+    пула только имена буферов и границы полос. Пиковая память — исходник, его копия
+    в общей памяти, выходной буфер и результат.
+    """
+    source = _copy_to_shared(img)
+    target = SharedMemory(create=True, size=max(1, _row_bytes(out_mode, out_size[0]) * out_size[1]))
+    try:
+        for job in jobs:
+            job.update(source=source.name, target=target.name, mode=img.mode)
+        # list() пробрасывает исключения из процессов
+        list(_process_pool().map(band_job, jobs))
+        return _image_from_shared(target, out_mode, out_size)
+    finally:
+        for shared in (source, target):
+            shared.close()
+            shared.unlink()
+
+
+def run_pointwise_in_bands(img: Image.Image, operation: Dict[str, Any],
+                           transform: Callable[[Image.Image], Image.Image], workers: int) -> Image.Image:
+    """
+    Попиксельная операция (словарь пайплайна {"op": ...}) над большим изображением
+    полосами: в пуле процессов над общей памятью или в пуле потоков (process_in_strips).
+    """
+    img.load()
+    if workers > 1 and parallel_engine() == "processes":
+        out_mode = transform(img.crop((0, 0, 1, 1))).mode
+        jobs = [{"operation": operation, "width": img.width, "top": top, "bottom": bottom}
+                for top, bottom in _bands(img.height, workers)]
+        return _run_shared(img, out_mode, img.size, _pointwise_band, jobs)
+    return process_in_strips(img, transform, workers=workers)
+
+
+def resize_in_bands(img: Image.Image, width: int, height: int, resample: int,
+                    reducing_gap: Optional[float], workers: int) -> Image.Image:
+    """
+    resize большого изображения горизонтальными полосами результата, по полосе на ядро.
+    Каждая полоса — resize с box по своему участку исходника, поэтому швов нет:
+    фильтр видит исходные строки за границами полосы. Как и reducing_gap в Image.resize,
+    сначала выполняется быстрое целочисленное уменьшение (reduce).
+    """
+    img.load()
+    if img.mode not in BAND_RESIZE_MODES:
+        # Палитра и 1-битные изображения масштабируются Pillow особым образом (NEAREST)
+        return img.resize((width, height), resample=resample, reducing_gap=reducing_gap)
+    if reducing_gap:
+        factor = (max(1, int(img.width / width / reducing_gap)), max(1, int(img.height / height / reducing_gap)))
+        if factor != (1, 1):
+            img = img.reduce(factor)
+
+    bands = _bands(height, workers)
+    if parallel_engine() == "processes":
+        jobs = [{"source_size": img.size, "size": (width, height), "resample": resample, "top": top, "bottom": bottom}
+                for top, bottom in bands]
+        return _run_shared(img, img.mode, (width, height), _resize_band, jobs)
+
+    output = Image.new(img.mode, (width, height))
+    scale = img.height / height
+
+    def resize_band(band: tuple[int, int]) -> None:
+        top, bottom = band
+        output.paste(img.resize((width, bottom - top), resample=resample,
+                                box=(0, top * scale, img.width, bottom * scale)), (0, top))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(resize_band, bands))
+    return output
@@ -0,0 +1,119 @@
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional
+
+from app.core.config import (
+    IMAGE_MAX_PIXELS,
+    RESIZE_REDUCING_GAP,
+    UPLOAD_ALLOWED_FORMATS,
+    UPLOAD_MAX_DIMENSION,
+    WORKER_MEMORY_LIMIT_BYTES,
+)
+
+
+class ImageProbeError(ValueError):
+    """
+    Загрузка не прошла проверку заголовка. status_code — код ответа HTTP (4xx).
+    """
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def probe_image(source: BinaryIO) -> Dict[str, Any]:
+    """
+    Читает только заголовок изображения (Image.open без load): реальный формат,
+    размеры, режим и оценку памяти на полное декодирование. Пиксели не распаковываются.
+    Позиция потока восстанавливается. Pillow импортируется при первой пробе, а не при
+    старте процесса API.
+    """
+    from PIL import Image, UnidentifiedImageError
+    from app.services.tiling import estimate_decode_bytes
+
+    position = source.tell()
+    try:
+        with Image.open(source) as img:
+            width, height = img.size
+            return {
+                "format": img.format,
+                "width": width,
+                "height": height,
+                "mode": img.mode,
+                "pixels": width * height,
+                "decode_bytes": estimate_decode_bytes(width, height, img.mode),
+                "interlace": bool(img.info.get("interlace")),
+            }
+    except Image.DecompressionBombError as e:
+        raise ImageProbeError(str(e), status_code=413)
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+        raise ImageProbeError("Cannot identify image: the file is corrupt or not a supported image.")
+    finally:
+        source.seek(position)
+
+
+def _draft_target(resize: Dict[str, Any]) -> tuple[int, int]:
+    return max(1, int(resize["width"] * RESIZE_REDUCING_GAP)), max(1, int(resize["height"] * RESIZE_REDUCING_GAP))
+
+
+def _jpeg_draft_size(width: int, height: int, requested: tuple[int, int]) -> tuple[int, int]:
+    """
+    Размер, до которого JPEG уменьшается при декодировании в draft-режиме (как JpegImageFile.draft).
+    """
+    scale = min(width // requested[0], height // requested[1])
+    factor = next(factor for factor in (8, 4, 2, 1) if scale >= factor)
+    return (width + factor - 1) // factor, (height + factor - 1) // factor
+
+
+def decoded_frame(metadata: Dict[str, Any], operations: List[Dict[str, Any]]) -> tuple[int, int]:
+    """
+    Размер кадра, который воркер распакует для цепочки operations (как apply_operations):
+    JPEG перед сильным уменьшением декодируется в draft-режиме в 2/4/8 раз меньше, PNG без
+    interlace перед crop — только до нижней границы обрезки. Остальное декодируется целиком.
+    """
+    width, height = metadata["width"], metadata["height"]
+    first = operations[0] if operations else {"op": None}
+    if metadata["format"] == "JPEG":
+        if first["op"] == "resize":
+            return _jpeg_draft_size(width, height, _draft_target(first))
+        if first["op"] == "crop" and len(operations) > 1 and operations[1]["op"] == "resize":
+            crop_width, crop_height = first["right"] - first["left"], first["bottom"] - first["top"]
+            target_width, target_height = _draft_target(operations[1])
+            if target_width < crop_width and target_height < crop_height:
+                return _jpeg_draft_size(width, height, (width * target_width // crop_width + 1,
+                                                        height * target_height // crop_height + 1))
+    elif metadata["format"] == "PNG" and first["op"] == "crop" and not metadata.get("interlace"):
+        return width, min(height, first["bottom"])
+    return width, height
+
+
+def check_probe(metadata: Dict[str, Any], operations: Optional[Iterable[Dict[str, Any]]] = None,
+                allowed_formats: List[str] = UPLOAD_ALLOWED_FORMATS,
+                max_pixels: int = IMAGE_MAX_PIXELS,
+                max_dimension: int = UPLOAD_MAX_DIMENSION,
+                memory_limit: int = WORKER_MEMORY_LIMIT_BYTES) -> None:
+    """
+    Проверяет метаданные пробы и бросает ImageProbeError: 415 — формат по содержимому
+    не из allowed_formats, 413 — сторона больше max_dimension, пикселей больше max_pixels
+    или оценка памяти на кадр, который воркер распакует для цепочки operations (decoded_frame),
+    выше бюджета воркера: такая задача иначе провалилась бы, уже заняв воркер.
+    """
+    image_format, width, height = metadata["format"], metadata["width"], metadata["height"]
+    if image_format not in allowed_formats:
+        raise ImageProbeError(
+            f"Unsupported image format: {image_format}. Allowed: {', '.join(allowed_formats)}.", status_code=415)
+    if max_dimension and max(width, height) > max_dimension:
+        raise ImageProbeError(
+            f"Image {width}x{height} exceeds the maximum side of {max_dimension} pixels.", status_code=413)
+    if max_pixels and width * height > max_pixels:
+        raise ImageProbeError(
+            f"Image {width}x{height} exceeds the limit of {max_pixels} pixels.", status_code=413)
+
+    operations = list(operations or [])
+    if not memory_limit or not operations:
+        return
+    from app.services.tiling import estimate_decode_bytes
+
+    decode_bytes = estimate_decode_bytes(*decoded_frame(metadata, operations), metadata["mode"])
+    if decode_bytes > memory_limit:
+        raise ImageProbeError(
+            f"Image {width}x{height} needs ~{decode_bytes // (1024 * 1024)} MiB to decode, "
+            f"worker limit is {memory_limit // (1024 * 1024)} MiB.", status_code=413)
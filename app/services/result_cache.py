@@ -0,0 +1,153 @@
+from typing import Any, Dict, Optional
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from app.core.config import RESULT_CACHE_ENABLED, RESULT_CACHE_MAX_BYTES
+from app.core.metrics import CACHE_REQUESTS_TOTAL
+from app.services.storage import get_storage, CACHE_AREA, PROCESSED_AREA
+
+logger = logging.getLogger(__name__)
+
+
+def build_cache_key(input_hash: str, process_type: str, params: Dict[str, Any], output_suffix: str) -> str:
+    """
+    Строит ключ кэша из SHA-256 входных байтов, имени операции,
+    нормализованных параметров и расширения результата.
+    """
+    normalized = json.dumps(
+        {"op": process_type, "params": params, "suffix": output_suffix.lower()},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(f"{input_hash}:{normalized}".encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Кэш обработанных изображений в хранилище (область CACHE) с LRU-вытеснением
+    по суммарному размеру. Порядок LRU определяется временем модификации записей:
+    при каждом попадании оно обновляется.
+
+    Размер кэша процесс отслеживает счетчиком: область перечисляется целиком только
+    при вытеснении и для сверки не чаще раза в RESYNC_SECONDS (записи добавляют и
+    другие процессы). Вытеснение освобождает место до доли LOW_WATER от лимита,
+    чтобы следующие записи не запускали его снова.
+    """
+
+    RESYNC_SECONDS = 60.0
+    LOW_WATER = 0.9
+
+    def __init__(self, max_bytes: int, enabled: bool = True, area: str = CACHE_AREA):
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.area = area
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Оценка суммарного размера записей и время последнего перечисления области
+        self._size: Optional[int] = None
+        self._synced_at = 0.0
+
+    def lookup(self, cache_key: str) -> bool:
+        """
+        Проверяет наличие результата в кэше и обновляет его позицию в LRU. Учитывает hit/miss.
+        """
+        if not self.enabled:
+            return False
+
+        try:
+            get_storage().touch(self.area, cache_key)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            CACHE_REQUESTS_TOTAL.labels("miss").inc()
+            return False
+
+        with self._lock:
+            self.hits += 1
+        CACHE_REQUESTS_TOTAL.labels("hit").inc()
+        return True
+
+    def materialize(self, cache_key: str, output_filename: str) -> bool:
+        """
+        Копирует закэшированный результат в область PROCESSED под именем output_filename.
+        Возвращает False, если запись успели вытеснить.
+        """
+        try:
+            get_storage().copy(self.area, cache_key, PROCESSED_AREA, output_filename)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def store(self, cache_key: str, output_filename: str) -> None:
+        """
+        Помещает готовый результат из области PROCESSED в кэш и вытесняет самые
+        старые записи, если суммарный размер превысил лимит.
+        """
+        if not self.enabled:
+            return
+
+        storage = get_storage()
+        try:
+            storage.copy(PROCESSED_AREA, output_filename, self.area, cache_key)
+            size, _ = storage.stat(self.area, cache_key)
+        except OSError as e:
+            logger.error(f"Failed to store result {output_filename} in cache: {e}")
+            return
+
+        with self._lock:
+            stale = self._size is None or time.monotonic() - self._synced_at > self.RESYNC_SECONDS
+            if not stale:
+                self._size += size
+            over_limit = stale or self._size > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def _entries(self) -> list[tuple[str, int, float]]:
+        return list(get_storage().list(self.area))
+
+    def evict(self) -> int:
+        """
+        Сверяет размер кэша с хранилищем и, если он больше max_bytes, удаляет наименее
+        недавно использованные записи до LOW_WATER от лимита. Возвращает число удаленных записей.
+        """
+        entries = self._entries()
+        total_size = sum(size for _, size, _ in entries)
+        removed = 0
+        if total_size > self.max_bytes:
+            storage = get_storage()
+            target = int(self.max_bytes * self.LOW_WATER)
+            for name, size, _ in sorted(entries, key=lambda entry: entry[2]):
+                if total_size <= target:
+                    break
+                if storage.delete(self.area, name):
+                    total_size -= size
+                    removed += 1
+            logger.info(f"Evicted {removed} entries from result cache")
+        with self._lock:
+            self._size = total_size
+            self._synced_at = time.monotonic()
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Возвращает счетчики попаданий/промахов и текущий размер кэша.
+        Перечисляет всю область кэша: из асинхронного кода вызывать в пуле потоков.
+        """
+        entries = self._entries() if self.enabled else []
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": hits,
+            "misses": misses,
+            "entries": len(entries),
+            "size_bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
+
+
+result_cache = ResultCache(RESULT_CACHE_MAX_BYTES, RESULT_CACHE_ENABLED)
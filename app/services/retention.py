@@ -0,0 +1,139 @@
+from typing import Any, Dict, Iterable, Optional
+import heapq
+import logging
+import time
+
+from app.core.config import (
+    FILE_TTL_SECONDS,
+    SWEEP_BATCH_SIZE,
+    DISK_HIGH_WATER,
+    DISK_LOW_WATER,
+    DOWNLOAD_GRACE_SECONDS,
+)
+from app.core.metrics import SWEPT_FILES_TOTAL
+from app.core.redis_client import get_redis
+from app.services.storage import get_storage, RAW_AREA, PROCESSED_AREA, CACHE_AREA
+
+logger = logging.getLogger(__name__)
+
+# Области с файлами задач, которые удаляются по возрасту. Кэш результатов
+# ограничен своим LRU и чистится только при нехватке места на томе.
+EXPIRING_AREAS = (RAW_AREA, PROCESSED_AREA)
+ALL_AREAS = (RAW_AREA, PROCESSED_AREA, CACHE_AREA)
+# Сортированное множество Redis: скачанные результаты со временем удаления в качестве веса
+DOWNLOADED_RESULTS_KEY = "retention:downloaded"
+
+
+def sweep_expired(ttl: float = FILE_TTL_SECONDS, batch_size: int = SWEEP_BATCH_SIZE,
+                  areas: Iterable[str] = EXPIRING_AREAS, now: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Удаляет файлы старше ttl секунд (по времени модификации), не больше batch_size за вызов.
+    Возвращает число удаленных файлов и освобожденных байт; more=True, если лимит
+    исчерпан и устаревшие файлы могли остаться.
+    """
+    storage = get_storage()
+    cutoff = (time.time() if now is None else now) - ttl
+    removed = freed = 0
+    for area in areas:
+        for name, size, mtime in storage.list(area):
+            if mtime >= cutoff:
+                continue
+            if removed >= batch_size:
+                return {"removed": removed, "freed_bytes": freed, "more": True}
+            if storage.delete(area, name):
+                removed += 1
+                freed += size
+                SWEPT_FILES_TOTAL.labels(area, "ttl").inc()
+    return {"removed": removed, "freed_bytes": freed, "more": False}
+
+
+def sweep_temporary_files(ttl: float = FILE_TTL_SECONDS, areas: Iterable[str] = ALL_AREAS,
+                          now: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Удаляет временные файлы записей старше ttl секунд во всех областях: после падения
+    процесса посреди записи они не попадают в перечисление областей и иначе копились бы.
+    """
+    storage = get_storage()
+    cutoff = (time.time() if now is None else now) - ttl
+    removed = freed = 0
+    for area in areas:
+        area_removed, area_freed = storage.sweep_temporary(area, cutoff)
+        if area_removed:
+            SWEPT_FILES_TOTAL.labels(area, "tmp").inc(area_removed)
+        removed += area_removed
+        freed += area_freed
+    return {"removed": removed, "freed_bytes": freed}
+
+
+def enforce_disk_high_water(high_water: float = DISK_HIGH_WATER, low_water: float = DISK_LOW_WATER,
+                            batch_size: int = SWEEP_BATCH_SIZE,
+                            areas: Iterable[str] = ALL_AREAS) -> Dict[str, Any]:
+    """
+    Если том хранилища заполнен больше чем на high_water, удаляет самые старые файлы
+    всех областей, пока заполнение не опустится до low_water. За вызов удаляется не больше
+    batch_size файлов: из перечисления берутся только batch_size самых старых, поэтому
+    память не зависит от числа файлов. Для хранилищ без предела объема (S3) ничего не делает.
+    """
+    storage = get_storage()
+    usage = storage.disk_usage()
+    if usage is None:
+        return {"removed": 0, "freed_bytes": 0, "more": False}
+    used, total = usage
+    if not total or used / total <= high_water:
+        return {"removed": 0, "freed_bytes": 0, "more": False}
+
+    to_free = used - int(low_water * total)
+    entries = ((mtime, area, name, size) for area in areas for name, size, mtime in storage.list(area))
+    removed = freed = 0
+    for _, area, name, size in heapq.nsmallest(batch_size, entries):
+        if freed >= to_free:
+            break
+        if storage.delete(area, name):
+            removed += 1
+            freed += size
+            SWEPT_FILES_TOTAL.labels(area, "disk").inc()
+    logger.warning(f"Storage volume above {high_water:.0%}: evicted {removed} oldest files, freed {freed} bytes")
+    return {"removed": removed, "freed_bytes": freed, "more": freed < to_free and removed == batch_size}
+
+
+def schedule_result_expiry(output_filename: str, grace: float = DOWNLOAD_GRACE_SECONDS,
+                           now: Optional[float] = None) -> None:
+    """
+    Откладывает удаление скачанного результата на grace секунд после последнего скачивания.
+    """
+    expires_at = (time.time() if now is None else now) + grace
+    get_redis().zadd(DOWNLOADED_RESULTS_KEY, {output_filename: expires_at})
+
+
+def expire_downloaded_results(batch_size: int = SWEEP_BATCH_SIZE, now: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Удаляет скачанные результаты, у которых истек период хранения после скачивания.
+    """
+    redis = get_redis()
+    due = redis.zrangebyscore(DOWNLOADED_RESULTS_KEY, "-inf", time.time() if now is None else now,
+                              start=0, num=batch_size)
+    if not due:
+        return {"removed": 0, "more": False}
+
+    storage = get_storage()
+    removed = 0
+    for member in due:
+        output_filename = member.decode() if isinstance(member, bytes) else member
+        if storage.delete(PROCESSED_AREA, output_filename):
+            removed += 1
+            SWEPT_FILES_TOTAL.labels(PROCESSED_AREA, "downloaded").inc()
+    redis.zrem(DOWNLOADED_RESULTS_KEY, *due)
+    return {"removed": removed, "more": len(due) == batch_size}
+
+
+def sweep_storage(batch_size: int = SWEEP_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Один проход сборщика: результаты с истекшим периодом хранения после скачивания,
+    удаление по TTL (и брошенных временных файлов записи), затем проверка заполнения тома.
+    """
+    downloaded = expire_downloaded_results(batch_size=batch_size)
+    expired = sweep_expired(batch_size=batch_size)
+    temporary = sweep_temporary_files()
+    disk = enforce_disk_high_water(batch_size=batch_size)
+    return {"downloaded": downloaded, "expired": expired, "temporary": temporary, "disk": disk,
+            "more": downloaded["more"] or expired["more"] or disk["more"]}
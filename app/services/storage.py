@@ -0,0 +1,423 @@
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+
+from app.core.config import (
+    DATA_DIR,
+    STORAGE_BACKEND,
+    STORAGE_BUFFER_SIZE,
+    STORAGE_SHARD_CHARS,
+    S3_BUCKET,
+    S3_PREFIX,
+    S3_ENDPOINT_URL,
+    S3_REGION,
+)
+
+logger = logging.getLogger(__name__)
+
+# Области хранения файлов
+RAW_AREA = "raw"
+PROCESSED_AREA = "processed"
+CACHE_AREA = "cache"
+
+
+class StorageBackend(ABC):
+    """
+    Базовый класс хранилища файлов, общего для API и воркеров.
+    Файлы адресуются парой (area, name), где area — одна из областей RAW/PROCESSED/CACHE.
+    Бэкенд, не реализовавший абстрактные методы, нельзя создать.
+    """
+
+    def __init__(self, buffer_size: int = STORAGE_BUFFER_SIZE):
+        self.buffer_size = buffer_size
+
+    @abstractmethod
+    def open(self, area: str, name: str) -> BinaryIO:
+        """
+        Открывает файл на чтение. Возвращаемый поток поддерживает seek.
+        Бросает FileNotFoundError, если файла нет.
+        """
+
+    @abstractmethod
+    def writer(self, area: str, name: str):
+        """
+        Контекстный менеджер, возвращающий поток для записи файла.
+        Файл становится видимым только после успешного выхода из контекста.
+        """
+
+    @abstractmethod
+    def exists(self, area: str, name: str) -> bool:
+        """
+        Есть ли файл в хранилище.
+        """
+
+    @abstractmethod
+    def stat(self, area: str, name: str) -> tuple[int, float]:
+        """
+        (размер в байтах, время модификации) файла. Бросает FileNotFoundError, если файла нет.
+        """
+
+    @abstractmethod
+    def delete(self, area: str, name: str) -> bool:
+        """
+        Удаляет файл. Возвращает True, если файл существовал.
+        """
+
+    @abstractmethod
+    def copy(self, src_area: str, src_name: str, dst_area: str, dst_name: str) -> None:
+        """
+        Копирует файл внутри хранилища. Бросает FileNotFoundError, если исходника нет.
+        """
+
+    @abstractmethod
+    def touch(self, area: str, name: str) -> None:
+        """
+        Обновляет время модификации файла (для LRU). Бросает FileNotFoundError, если файла нет.
+        """
+
+    @abstractmethod
+    def list(self, area: str) -> Iterator[tuple[str, int, float]]:
+        """
+        Перебирает файлы области: (имя, размер в байтах, время модификации).
+        """
+
+    def sweep_temporary(self, area: str, cutoff: float) -> tuple[int, int]:
+        """
+        Удаляет временные файлы записей области, не менявшиеся с cutoff: их оставляет процесс,
+        упавший посреди записи. Возвращает (число файлов, байт). Хранилища без временных
+        файлов (S3) ничего не делают.
+        """
+        return 0, 0
+
+    def local_path(self, area: str, name: str) -> Optional[Path]:
+        """
+        Путь к файлу в локальной файловой системе, если хранилище локальное, иначе None.
+        """
+        return None
+
+    def disk_usage(self) -> Optional[tuple[int, int]]:
+        """
+        (занято байт, всего байт) на томе хранилища или None, если объем не ограничен (S3).
+        """
+        return None
+
+    def prepare(self) -> None:
+        """
+        Подготавливает хранилище при старте процесса (каталоги областей). Без этого
+        каталоги все равно создаются при первой записи.
+        """
+
+    def save(self, area: str, name: str, source: BinaryIO, hasher=None) -> int:
+        """
+        Сохраняет поток в хранилище блоками по buffer_size.
+        Если передан hasher (например, hashlib.sha256()), обновляет его содержимым.
+        Возвращает число записанных байт.
+        """
+        written = 0
+        with self.writer(area, name) as target:
+            while chunk := source.read(self.buffer_size):
+                if hasher is not None:
+                    hasher.update(chunk)
+                target.write(chunk)
+                written += len(chunk)
+        return written
+
+    async def save_async(self, area: str, name: str, source: BinaryIO, hasher=None) -> int:
+        """
+        Асинхронная обертка над save: блокирующий ввод-вывод выполняется
+        в пуле потоков и не блокирует цикл событий.
+        """
+        return await asyncio.to_thread(self.save, area, name, source, hasher)
+
+
+class LocalStorage(StorageBackend):
+    """
+    Хранилище на локальной (или общей, смонтированной) файловой системе:
+    <root>/<area>/<первые shard_chars символов имени>/<name>.
+    Файлы, записанные до включения шардирования (<root>/<area>/<name>), по-прежнему читаются.
+    """
+
+    def __init__(self, root: Path, buffer_size: int = STORAGE_BUFFER_SIZE,
+                 shard_chars: int = STORAGE_SHARD_CHARS):
+        super().__init__(buffer_size)
+        self.root = Path(root)
+        self.shard_chars = shard_chars
+        self._prepared_dirs: set[Path] = set()
+
+    def _prepare(self, directory: Path) -> Path:
+        if directory not in self._prepared_dirs:
+            directory.mkdir(parents=True, exist_ok=True)
+            self._prepared_dirs.add(directory)
+        return directory
+
+    def _area_dir(self, area: str) -> Path:
+        return self._prepare(self.root / area)
+
+    def prepare(self) -> None:
+        for area in (RAW_AREA, PROCESSED_AREA, CACHE_AREA):
+            self._area_dir(area)
+
+    def _path(self, area: str, name: str) -> Path:
+        if self.shard_chars and len(name) > self.shard_chars:
+            return self._prepare(self.root / area / name[:self.shard_chars].lower()) / name
+        return self._area_dir(area) / name
+
+    def _existing_path(self, area: str, name: str) -> Path:
+        """
+        Путь существующего файла: шардированный или, если его нет, в плоском каталоге области.
+        """
+        path = self._path(area, name)
+        if self.shard_chars and not path.exists():
+            legacy_path = self.root / area / name
+            if legacy_path.exists():
+                return legacy_path
+        return path
+
+    def open(self, area: str, name: str) -> BinaryIO:
+        return open(self._existing_path(area, name), "rb", buffering=self.buffer_size)
+
+    @contextmanager
+    def writer(self, area: str, name: str):
+        path = self._path(area, name)
+        tmp_path = path.with_name(f".{name}.{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp_path, "wb", buffering=self.buffer_size) as f:
+                yield f
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    def exists(self, area: str, name: str) -> bool:
+        return self._existing_path(area, name).is_file()
+
+    def stat(self, area: str, name: str) -> tuple[int, float]:
+        stat = os.stat(self._existing_path(area, name))
+        return stat.st_size, stat.st_mtime
+
+    def delete(self, area: str, name: str) -> bool:
+        try:
+            self._existing_path(area, name).unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+    def copy(self, src_area: str, src_name: str, dst_area: str, dst_name: str) -> None:
+        source = self._existing_path(src_area, src_name)
+        destination = self._path(dst_area, dst_name)
+        tmp_path = destination.with_name(f".{dst_name}.{uuid.uuid4().hex}.tmp")
+        try:
+            # Жесткая ссылка не копирует данные; если она невозможна — обычное копирование
+            try:
+                os.link(source, tmp_path)
+            except OSError:
+                shutil.copyfile(source, tmp_path)
+            os.replace(tmp_path, destination)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    def touch(self, area: str, name: str) -> None:
+        os.utime(self._existing_path(area, name))
+
+    @staticmethod
+    def _scan(directory, temporary: bool = False) -> Iterator[tuple[os.DirEntry, os.stat_result]]:
+        """
+        Перебирает файлы области: и в каталогах шардов, и оставшиеся в плоском каталоге.
+        Временные файлы записи (.<имя>.<uuid>.tmp) перебираются только с temporary=True.
+        """
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not entry.name.startswith("."):
+                            yield from LocalStorage._scan(entry.path, temporary)
+                        continue
+                    is_temporary = entry.name.startswith(".") and entry.name.endswith(".tmp")
+                    if is_temporary != temporary or (not temporary and entry.name.startswith(".")):
+                        continue
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield entry, stat
+
+    def list(self, area: str) -> Iterator[tuple[str, int, float]]:
+        for entry, stat in self._scan(self._area_dir(area)):
+            yield entry.name, stat.st_size, stat.st_mtime
+
+    def sweep_temporary(self, area: str, cutoff: float) -> tuple[int, int]:
+        removed = freed = 0
+        for entry, stat in list(self._scan(self._area_dir(area), temporary=True)):
+            # copy() создает временный файл жесткой ссылкой со старым mtime источника,
+            # поэтому свежесть определяет и ctime (меняется при создании ссылки)
+            if max(stat.st_mtime, stat.st_ctime) >= cutoff:
+                continue
+            try:
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                continue
+            removed += 1
+            freed += stat.st_size
+        return removed, freed
+
+    def local_path(self, area: str, name: str) -> Optional[Path]:
+        return self._existing_path(area, name)
+
+    def disk_usage(self) -> Optional[tuple[int, int]]:
+        usage = shutil.disk_usage(self._prepare(self.root))
+        return usage.used, usage.total
+
+
+class S3Storage(StorageBackend):
+    """
+    Хранилище в S3-совместимом объектном хранилище (AWS S3, MinIO и т.п.):
+    s3://<bucket>/<prefix><area>/<name>. Позволяет масштабировать воркеры
+    по разным узлам без общего тома.
+    """
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None,
+                 region: Optional[str] = None, buffer_size: int = STORAGE_BUFFER_SIZE, client=None):
+        super().__init__(buffer_size)
+        if client is None:
+            try:
+                import boto3
+            except ImportError as e:
+                raise RuntimeError("STORAGE_BACKEND=s3 requires the 'boto3' package") from e
+            client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+
+        from boto3.s3.transfer import TransferConfig
+
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self._transfer_config = TransferConfig(multipart_chunksize=max(buffer_size, 5 * 1024 * 1024),
+                                               io_chunksize=buffer_size)
+
+    def _key(self, area: str, name: str) -> str:
+        return f"{self.prefix}{area}/{name}"
+
+    @staticmethod
+    def _is_not_found(error) -> bool:
+        code = error.response.get("Error", {}).get("Code")
+        return code in ("404", "NoSuchKey", "NotFound")
+
+    def open(self, area: str, name: str) -> BinaryIO:
+        from botocore.exceptions import ClientError
+
+        buffer = tempfile.SpooledTemporaryFile(max_size=self.buffer_size * 8)
+        try:
+            self.client.download_fileobj(self.bucket, self._key(area, name), buffer,
+                                         Config=self._transfer_config)
+        except ClientError as e:
+            buffer.close()
+            if self._is_not_found(e):
+                raise FileNotFoundError(f"{area}/{name}") from e
+            raise
+        buffer.seek(0)
+        return buffer
+
+    @contextmanager
+    def writer(self, area: str, name: str):
+        with tempfile.SpooledTemporaryFile(max_size=self.buffer_size * 8) as buffer:
+            yield buffer
+            buffer.seek(0)
+            self.client.upload_fileobj(buffer, self.bucket, self._key(area, name),
+                                       Config=self._transfer_config)
+
+    def exists(self, area: str, name: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(area, name))
+            return True
+        except ClientError as e:
+            if self._is_not_found(e):
+                return False
+            raise
+
+    def stat(self, area: str, name: str) -> tuple[int, float]:
+        from botocore.exceptions import ClientError
+
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._key(area, name))
+        except ClientError as e:
+            if self._is_not_found(e):
+                raise FileNotFoundError(f"{area}/{name}") from e
+            raise
+        return head["ContentLength"], head["LastModified"].timestamp()
+
+    def delete(self, area: str, name: str) -> bool:
+        existed = self.exists(area, name)
+        if existed:
+            self.client.delete_object(Bucket=self.bucket, Key=self._key(area, name))
+        return existed
+
+    def copy(self, src_area: str, src_name: str, dst_area: str, dst_name: str) -> None:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.copy_object(Bucket=self.bucket, Key=self._key(dst_area, dst_name),
+                                    CopySource={"Bucket": self.bucket, "Key": self._key(src_area, src_name)})
+        except ClientError as e:
+            if self._is_not_found(e):
+                raise FileNotFoundError(f"{src_area}/{src_name}") from e
+            raise
+
+    def touch(self, area: str, name: str) -> None:
+        from botocore.exceptions import ClientError
+
+        key = self._key(area, name)
+        try:
+            # Копирование объекта в самого себя с заменой метаданных обновляет LastModified
+            self.client.copy_object(Bucket=self.bucket, Key=key, CopySource={"Bucket": self.bucket, "Key": key},
+                                    MetadataDirective="REPLACE")
+        except ClientError as e:
+            if self._is_not_found(e):
+                raise FileNotFoundError(f"{area}/{name}") from e
+            raise
+
+    def list(self, area: str) -> Iterator[tuple[str, int, float]]:
+        area_prefix = self._key(area, "")
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=area_prefix):
+            for obj in page.get("Contents", []):
+                yield obj["Key"][len(area_prefix):], obj["Size"], obj["LastModified"].timestamp()
+
+
+_storage: Optional[StorageBackend] = None
+
+
+def create_storage() -> StorageBackend:
+    """
+    Создает хранилище по настройке STORAGE_BACKEND.
+    """
+    if STORAGE_BACKEND == "local":
+        return LocalStorage(DATA_DIR)
+    if STORAGE_BACKEND == "s3":
+        return S3Storage(S3_BUCKET, S3_PREFIX, S3_ENDPOINT_URL, S3_REGION)
+    raise ValueError(f"Unknown storage backend: '{STORAGE_BACKEND}'")
+
+
+def get_storage() -> StorageBackend:
+    """
+    Возвращает хранилище процесса (создается при первом обращении).
+    """
+    global _storage
+    if _storage is None:
+        _storage = create_storage()
+    return _storage
+
+
+def set_storage(storage: Optional[StorageBackend]) -> None:
+    """
+    Подменяет хранилище процесса (None — пересоздать по настройкам при следующем обращении).
+    """
+    global _storage
+    _storage = storage
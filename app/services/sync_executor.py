@@ -0,0 +1,70 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+import asyncio
+import threading
+
+from app.core.config import SYNC_POOL_WORKERS, SYNC_POOL_QUEUE
+
+
+class PoolSaturatedError(RuntimeError):
+    """Все потоки синхронного режима заняты и очередь ожидания заполнена."""
+
+
+class BoundedExecutor:
+    """
+    Пул потоков синхронного режима с ограниченной очередью: одновременно принимается
+    не больше max_workers + max_pending задач, остальные сразу отклоняются
+    (PoolSaturatedError), а не копятся в неограниченной очереди ThreadPoolExecutor.
+    Pillow отпускает GIL при декодировании, операциях и кодировании, поэтому потоки
+    обрабатывают изображения параллельно без процессов и копирования байт между ними.
+    """
+
+    def __init__(self, max_workers: int = SYNC_POOL_WORKERS, max_pending: int = SYNC_POOL_QUEUE):
+        self.max_workers = max_workers
+        self.capacity = max_workers + max_pending
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="image-sync")
+            return self._executor
+
+    def _release(self, _future=None) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Выполняет fn(*args) в пуле. Слот освобождается по завершении функции, а не
+        ожидающей корутины: отключение клиента не позволяет превысить емкость пула.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise PoolSaturatedError(f"Sync pool is saturated ({self.capacity} requests in flight)")
+        with self._lock:
+            self._in_flight += 1
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+sync_executor = BoundedExecutor()
@@ -0,0 +1,81 @@
+from typing import Any, AsyncIterator, Dict, Optional
+import json
+import logging
+import time
+
+from redis.exceptions import RedisError
+
+from app.core.config import TASK_EVENTS_HEARTBEAT, TASK_EVENTS_TIMEOUT, TASK_EVENTS_TTL
+from app.core.redis_client import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATES = {"SUCCESS", "FAILURE", "REVOKED"}
+
+
+def _channel(task_id: str) -> str:
+    return f"task-events:{task_id}"
+
+
+def _last_event_key(task_id: str) -> str:
+    return f"task-events:last:{task_id}"
+
+
+def publish_task_event(task_id: str, state: str, progress: Optional[int] = None, **extra: Any) -> None:
+    """
+    Публикует событие задачи в канал Redis pub/sub и сохраняет его как последнее
+    известное состояние (для клиентов, подписавшихся позже).
+    Ошибки Redis не прерывают обработку: события носят информационный характер.
+    """
+    event = {"task_id": task_id, "state": state, "progress": progress, **extra}
+    payload = json.dumps(event, default=str)
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.set(_last_event_key(task_id), payload, ex=TASK_EVENTS_TTL)
+        pipe.publish(_channel(task_id), payload)
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Failed to publish event {state} for task {task_id}: {e}")
+
+
+async def get_last_task_event(task_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Возвращает последнее опубликованное событие задачи или None.
+    """
+    payload = await get_async_redis().get(_last_event_key(task_id))
+    return json.loads(payload) if payload else None
+
+
+async def iter_task_events(task_id: str, snapshot=None,
+                           timeout: float = TASK_EVENTS_TIMEOUT,
+                           heartbeat: float = TASK_EVENTS_HEARTBEAT) -> AsyncIterator[Optional[Dict[str, Any]]]:
+    """
+    Асинхронно перебирает события задачи до финального состояния или таймаута.
+    Сначала выдается текущее состояние: последнее опубликованное событие, а если
+    его нет — результат вызова snapshot() (например, статус из бэкенда результатов).
+    None означает, что за интервал heartbeat событий не было.
+    """
+    async with get_async_redis().pubsub() as pubsub:
+        # Подписываемся до чтения снимка, чтобы не потерять событие между ними
+        await pubsub.subscribe(_channel(task_id))
+
+        current = await get_last_task_event(task_id)
+        if current is None and snapshot is not None:
+            current = await snapshot()
+        if current is not None:
+            yield current
+            if current.get("state") in TERMINAL_STATES:
+                return
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            message = await pubsub.get_message(ignore_subscribe_messages=True,
+                                               timeout=min(heartbeat, max(deadline - time.monotonic(), 0)))
+            if message is None:
+                yield None
+                continue
+
+            event = json.loads(message["data"])
+            yield event
+            if event.get("state") in TERMINAL_STATES:
+                return
@@ -0,0 +1,95 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from PIL import Image
+
+from app.core.config import IMAGE_MAX_PIXELS, WORKER_MEMORY_LIMIT_BYTES, TILE_STRIP_HEIGHT, TILE_THREADS
+
+# Защита Pillow от decompression bomb срабатывает уже на ~179 Мп; вместо этого
+# допускаем изображения до IMAGE_MAX_PIXELS, а реальный предел задает бюджет памяти
+Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS or None
+
+# Pillow хранит многоканальные режимы (RGB, RGBA, CMYK, ...) по 4 байта на пиксель
+_BYTES_PER_PIXEL = {"1": 1, "L": 1, "P": 1, "I;16": 2, "I;16B": 2, "I;16L": 2}
+
+
+class ImageTooLargeError(ValueError):
+    """
+    Изображение не помещается в потолок памяти воркера.
+    """
+
+
+def bytes_per_pixel(mode: str) -> int:
+    """
+    Размер пикселя в памяти Pillow для заданного режима.
+    """
+    return _BYTES_PER_PIXEL.get(mode, 4)
+
+
+def estimate_decode_bytes(width: int, height: int, mode: str) -> int:
+    """
+    Пиковая память на декодирование width x height пикселей и один выходной кадр.
+    """
+    return width * height * (bytes_per_pixel(mode) + 4)
+
+
+def check_memory_budget(img: Image.Image, rows: Optional[int] = None,
+                        limit: int = WORKER_MEMORY_LIMIT_BYTES) -> None:
+    """
+    Оценивает по заголовку пиковую память на декодирование rows строк изображения
+    и один выходной кадр и бросает ImageTooLargeError, если оценка выше limit.
+    """
+    rows = img.height if rows is None else min(rows, img.height)
+    estimate = estimate_decode_bytes(img.width, rows, img.mode)
+    if limit and estimate > limit:
+        raise ImageTooLargeError(
+            f"Image {img.width}x{img.height} needs ~{estimate // (1024 * 1024)} MiB, "
+            f"worker limit is {limit // (1024 * 1024)} MiB")
+
+
+def limit_decode_rows(img: Image.Image, rows: int) -> bool:
+    """
+    Ограничивает декодирование первыми rows строками для еще не загруженных
+    изображений с построчными декодерами (PNG без interlace, несжатые raw-форматы).
+    Строки ниже rows не распаковываются и не занимают память.
+    Возвращает True, если ограничение применено.
+    """
+    tile = img.tile[0] if len(getattr(img, "tile", None) or []) == 1 else None
+    if tile is None or rows >= img.height or tile.extents != (0, 0) + img.size:
+        return False
+    if tile.codec_name == "zip":
+        if img.info.get("interlace"):
+            return False
+    elif tile.codec_name == "raw":
+        # Изображения, хранящиеся снизу вверх (BMP), построчно обрезать нельзя
+        if isinstance(tile.args, tuple) and len(tile.args) > 2 and tile.args[2] < 0:
+            return False
+    else:
+        return False
+
+    img.tile = [tile._replace(extents=(0, 0, img.width, rows))]
+    img._size = (img.width, rows)
+    return True
+
+
+def process_in_strips(img: Image.Image, transform: Callable[[Image.Image], Image.Image],
+                      strip_height: int = TILE_STRIP_HEIGHT, workers: int = TILE_THREADS) -> Image.Image:
+    """
+    Применяет попиксельное преобразование полосами по strip_height строк в пуле потоков
+    и собирает результат в заранее выделенный выходной кадр.
+    Пиковая память — исходный кадр + выходной кадр + по две полосы на поток,
+    без промежуточных полноразмерных копий внутри преобразования.
+    """
+    img.load()
+    width, height = img.size
+    out_mode = transform(img.crop((0, 0, 1, 1))).mode
+    output = Image.new(out_mode, img.size)
+
+    def process_strip(top: int) -> None:
+        box = (0, top, width, min(top + strip_height, height))
+        output.paste(transform(img.crop(box)), box)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        # list() пробрасывает исключения из потоков
+        list(executor.map(process_strip, range(0, height, strip_height)))
+    return output
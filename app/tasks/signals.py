@@ -0,0 +1,141 @@
+import os
+import time
+
+from celery.signals import (
+    task_failure,
+    task_postrun,
+    task_prerun,
+    task_revoked,
+    task_success,
+    worker_init,
+    worker_process_shutdown,
+)
+
+from app.core import metrics
+from app.core.worker_tuning import preload_pillow
+from app.services.admission import record_completion
+from app.services.coalescing import release_inflight
+from app.services.parallel import set_task_queue
+from app.services.task_events import publish_task_event
+
+# Время начала выполняемых задач процесса: task_id -> perf_counter()
+_task_started: dict[str, float] = {}
+
+
+@task_prerun.connect
+def publish_task_started(sender=None, task_id=None, **kwargs):
+    """
+    Публикует событие начала выполнения задачи.
+    """
+    publish_task_event(task_id, "STARTED", progress=0, task_name=sender.name)
+
+
+@task_success.connect
+def publish_task_succeeded(sender=None, result=None, **kwargs):
+    """
+    Публикует событие успешного завершения задачи вместе с ее результатом.
+    Сигнал отправляется после записи результата в бэкенд, поэтому клиент может сразу скачивать файл.
+    """
+    publish_task_event(sender.request.id, "SUCCESS", progress=100, result=result)
+
+
+@task_failure.connect
+def publish_task_failed(sender=None, task_id=None, exception=None, **kwargs):
+    """
+    Публикует событие ошибки задачи.
+    """
+    publish_task_event(task_id, "FAILURE", error=str(exception))
+
+
+@task_revoked.connect
+def publish_task_revoked(sender=None, request=None, **kwargs):
+    """
+    Публикует событие отмены задачи.
+    """
+    publish_task_event(request.id, "REVOKED")
+
+
+@task_prerun.connect
+def start_task_metrics(sender=None, task_id=None, task=None, **kwargs):
+    """
+    Задает операцию для метрик задачи и замеряет ожидание в очереди.
+    """
+    metrics.set_operation(metrics.operation_for_task(sender.name))
+    enqueued_at = getattr(task.request, "enqueued_at", None) if task is not None else None
+    if enqueued_at:
+        metrics.observe_stage("queue_wait", max(0.0, time.time() - enqueued_at))
+    _task_started[task_id] = time.perf_counter()
+
+
+@task_prerun.connect
+def remember_task_queue(sender=None, task=None, **kwargs):
+    """
+    Запоминает очередь задачи: по ее длине выбирается параллелизм обработки больших изображений.
+    """
+    delivery_info = getattr(task.request, "delivery_info", None) if task is not None else None
+    set_task_queue((delivery_info or {}).get("routing_key"))
+
+
+@task_postrun.connect
+def finish_task_metrics(sender=None, task_id=None, state=None, **kwargs):
+    """
+    Замеряет полное время выполнения задачи и считает задачи по итоговому состоянию.
+    """
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        metrics.observe_stage("task", time.perf_counter() - started)
+    metrics.TASKS_TOTAL.labels(metrics.current_operation(), (state or "unknown").lower()).inc()
+    metrics.set_operation(None)
+    set_task_queue(None)
+
+
+@task_postrun.connect
+def count_queue_throughput(sender=None, task=None, **kwargs):
+    """
+    Учитывает завершение задачи в ее очереди: по недавней пропускной способности API
+    оценивает ожидание в очереди для контроля допуска.
+    """
+    delivery_info = getattr(task.request, "delivery_info", None) if task is not None else None
+    queue = (delivery_info or {}).get("routing_key")
+    if queue:
+        record_completion(queue)
+
+
+@task_postrun.connect
+def release_coalescing_lock(task_id=None, kwargs=None, **extra):
+    """
+    Снимает блокировку объединения запросов, взятую при постановке задачи с ключом кэша.
+    """
+    cache_key = (kwargs or {}).get("cache_key")
+    if cache_key:
+        release_inflight(cache_key, task_id)
+
+
+@task_revoked.connect
+def count_revoked_task(sender=None, request=None, **kwargs):
+    operation = metrics.operation_for_task(sender.name) if sender is not None else "unknown"
+    metrics.TASKS_TOTAL.labels(operation, "revoked").inc()
+
+
+@worker_init.connect
+def start_metrics_exporter(**kwargs):
+    """
+    Запускает экспортер метрик в главном процессе воркера до старта пула.
+    """
+    metrics.start_worker_metrics_server()
+
+
+@worker_init.connect
+def preload_image_codecs(**kwargs):
+    """
+    Загружает и прогревает кодеки Pillow в главном процессе воркера до fork дочерних процессов.
+    """
+    preload_pillow()
+
+
+@worker_process_shutdown.connect
+def release_process_metrics(pid=None, **kwargs):
+    """
+    Помечает завершившийся дочерний процесс, чтобы его gauge-метрики не попадали в выдачу.
+    """
+    metrics.mark_process_dead(pid or os.getpid())
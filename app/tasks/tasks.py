@@ -1,17 +1,64 @@
-from ..core.celery_app import celery_app
-from app.services.image_processor import apply_grayscale,resize_image,sepia_image,crop_image
+from ..core.celery_app import celery_app, TASK_PRIORITIES
+from typing import Optional
+import logging
+
+from app.core.metrics import set_operation
+from app.services.blob_store import get_blob, put_blob
+from app.services.image_processor import apply_grayscale,resize_image,sepia_image,crop_image,run_pipeline
+from app.services.image_processor import process_image_bytes, build_variants
+from app.services.probe import check_probe
+from app.services.result_cache import result_cache
+from app.services.retention import sweep_storage
+from app.services.storage import get_storage, RAW_AREA
+from app.services.task_events import publish_task_event
+from app.tasks import signals  # noqa: F401  регистрирует обработчики сигналов Celery
+
+logger = logging.getLogger(__name__)
+
+
+def _store_in_cache(cache_key: Optional[str], output_filename: str) -> None:
+    """
+    Кладет успешный результат в кэш результатов, если задача была поставлена с ключом кэша.
+    """
+    if cache_key:
+        result_cache.store(cache_key, output_filename)
+
+
+def _check_source(source: Optional[dict], operations: Optional[list] = None) -> None:
+    """
+    Проверяет метаданные пробы заголовка, переданные API, по лимитам этого воркера
+    до чтения исходника (из S3 — до скачивания). Бросает ImageProbeError.
+    """
+    if source:
+        check_probe(source, operations)
+
+
+def _report_progress(task, progress: int) -> None:
+    """
+    Сообщает процент выполнения задачи: пишет состояние PROGRESS в бэкенд
+    результатов и публикует событие для подписчиков /task-events.
+    """
+    try:
+        task.update_state(state="PROGRESS", meta={"progress": progress})
+    except Exception as e:
+        # Прогресс носит информационный характер и не должен ронять обработку
+        logger.warning(f"Failed to store progress for task {task.request.id}: {e}")
+    publish_task_event(task.request.id, "PROGRESS", progress=progress)
 
 
 @celery_app.task(acks_late=True)
-def process_image_to_sepia(input_filename, output_filename):
+def process_image_to_sepia(input_filename, output_filename, cache_key: Optional[str] = None,
+                           encode_options: Optional[dict] = None, source: Optional[dict] = None):
     """
     Асинхронная задача Celery для применения эффекта сепии.
     """
-    success = sepia_image(input_filename, output_filename)
+    _check_source(source, [{"op": "sepia"}])
+    success = sepia_image(input_filename, output_filename, encode_options)
 
     if not success:
         # Если функция image_processor вернула False, принудительно вызываем FAILURE
         raise Exception(f"Failed to apply sepia to image file: {input_filename}")
+    _store_in_cache(cache_key, output_filename)
 
     return {
         "status": "COMPLETED",
@@ -21,27 +68,36 @@ def process_image_to_sepia(input_filename, output_filename):
     }
 
 @celery_app.task(acks_late=True)
-def process_image_to_grayscale(input_filename: str, output_filename: str) ->dict:
+def process_image_to_grayscale(input_filename: str, output_filename: str,
+                               cache_key: Optional[str] = None, encode_options: Optional[dict] = None,
+                               source: Optional[dict] = None) ->dict:
     """
     Асинхронная задача Celery для применения фильтра градаций серого.
     """
+    _check_source(source, [{"op": "grayscale"}])
 
-    success = apply_grayscale(input_filename, output_filename)
+    success = apply_grayscale(input_filename, output_filename, encode_options)
+    if success:
+        _store_in_cache(cache_key, output_filename)
 
     return {"status": "COMPLETED" if success else "FAILED",
             "input": input_filename,
             "output": output_filename}
 
 @celery_app.task(acks_late=True)
-def process_image_to_resize(input_filename: str, output_filename: str, width: int, height: int) ->dict:
+def process_image_to_resize(input_filename: str, output_filename: str, width: int, height: int,
+                            cache_key: Optional[str] = None, encode_options: Optional[dict] = None,
+                          source: Optional[dict] = None) ->dict:
     """
     Асинхронная задача Celery для изменения размера изображения.
     """
+    _check_source(source, [{"op": "resize", "width": width, "height": height}])
 
     size = (width, height)
-    success = resize_image(input_filename, output_filename, size)
+    success = resize_image(input_filename, output_filename, size, encode_options)
     if not success:
         raise Exception(f"Failed to process image file: {input_filename}")
+    _store_in_cache(cache_key, output_filename)
 
     return {"status": "COMPLETED" if success else "FAILED",
             "input": input_filename,
@@ -50,19 +106,108 @@ def process_image_to_resize(input_filename: str, output_filename: str, width: in
 
 @celery_app.task(acks_late=True)
 def process_image_to_crop(input_filename: str, output_filename: str,
-                          left: int, top: int, right: int, bottom: int) ->dict:
+                          left: int, top: int, right: int, bottom: int,
+                          cache_key: Optional[str] = None, encode_options: Optional[dict] = None,
+                          source: Optional[dict] = None) ->dict:
     """
     Асинхронная задача Celery для обрезки изображения.
     """
+    _check_source(source, [{"op": "crop", "left": left, "top": top, "right": right, "bottom": bottom}])
 
     box = (left, top, right, bottom)
-    success = crop_image(input_filename, output_filename, box)
+    success = crop_image(input_filename, output_filename, box, encode_options)
     if not success:
         raise Exception(f"Failed to process image file: {input_filename}")
+    _store_in_cache(cache_key, output_filename)
 
     return {
         "status": "COMPLETED",
         "input": input_filename,
         "output": output_filename,
         "crop_box": box
-    }
\ No newline at end of file
+    }
+
+@celery_app.task(bind=True, acks_late=True)
+def process_image_pipeline(self, input_filename: str, output_filename: str, operations: list,
+                           cache_key: Optional[str] = None, encode_options: Optional[dict] = None,
+                          source: Optional[dict] = None) ->dict:
+    """
+    Асинхронная задача Celery для выполнения цепочки операций над одним изображением.
+    После каждой операции сообщает процент выполнения.
+    """
+    _check_source(source, operations)
+
+    success = run_pipeline(input_filename, output_filename, operations,
+                           on_progress=lambda progress: _report_progress(self, progress),
+                           encode_options=encode_options)
+    if not success:
+        raise Exception(f"Failed to run pipeline on image file: {input_filename}")
+    _store_in_cache(cache_key, output_filename)
+
+    return {
+        "status": "COMPLETED",
+        "input": input_filename,
+        "output": output_filename,
+        "operations": [operation["op"] for operation in operations]
+    }
+
+
+@celery_app.task(acks_late=True)
+def process_image_inline(input_key: str, output_filename: str, process_type: str, operations: list,
+                         encode_options: Optional[dict] = None, source: Optional[dict] = None) ->dict:
+    """
+    Асинхронная задача Celery быстрого пути: исходник читается из Redis, обрабатывается
+    в памяти, результат кладется обратно в Redis. Хранилище файлов не используется.
+    Исходник удаляется вместе с результатом при скачивании (или по TTL), чтобы
+    повторная доставка задачи после сбоя воркера могла его прочитать.
+    """
+    set_operation(process_type)
+    _check_source(source, operations)
+    data = get_blob(input_key)
+    if data is None:
+        raise Exception(f"Input blob expired or missing: {input_key}")
+
+    output_key = put_blob(process_image_bytes(data, output_filename, operations, encode_options))
+
+    return {
+        "status": "COMPLETED",
+        "inline": True,
+        "input_key": input_key,
+        "output_key": output_key,
+        "output": output_filename,
+        "operations": [operation["op"] for operation in operations]
+    }
+
+
+@celery_app.task(bind=True, acks_late=True)
+def process_image_variants(self, input_filename: str, base_name: str, widths: list, formats: list,
+                           encode_options: Optional[dict] = None, source: Optional[dict] = None) ->dict:
+    """
+    Асинхронная задача Celery: набор вариантов изображения (ширины x форматы) за одно
+    декодирование. Исходник удаляется после успешной генерации: других потребителей у него нет,
+    а варианты скачиваются по одному или архивом многократно.
+    """
+    _check_source(source)
+    variants = build_variants(input_filename, base_name, widths, formats, encode_options,
+                              on_progress=lambda progress: _report_progress(self, progress))
+    get_storage().delete(RAW_AREA, input_filename)
+
+    return {
+        "status": "COMPLETED",
+        "input": input_filename,
+        "variants": variants
+    }
+
+
+@celery_app.task(bind=True, ignore_result=True)
+def sweep_expired_files(self) ->dict:
+    """
+    Периодическая задача (celery beat): удаляет устаревшие исходники и результаты
+    и освобождает место на томе хранилища. Если за проход удалось обработать не все
+    файлы, сразу ставит следующий проход, не дожидаясь расписания.
+    """
+    result = sweep_storage()
+    logger.info(f"Storage sweep: {result}")
+    if result["more"]:
+        self.apply_async(priority=TASK_PRIORITIES["low"])
+    return result
@@ -0,0 +1,4 @@
+"""
+Бенчмарки обработки изображений: функции image_processor (ops), задачи Celery (tasks)
+и HTTP-ручки FastAPI (api). Запуск: python -m benchmarks --help
+"""
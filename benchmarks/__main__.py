@@ -0,0 +1,107 @@
+"""
+Запуск бенчмарков:
+
+    python -m benchmarks ops --sizes 640x480,1920x1080,4000x3000 --output ops.json
+    python -m benchmarks all --output current.json --baseline baseline.json
+
+Код возврата 1 означает регрессию пропускной способности относительно базовой линии.
+"""
+from pathlib import Path
+import argparse
+import logging
+import sys
+import tempfile
+
+from .common import compare_with_baseline, load_results, parse_size, write_results
+
+LAYERS = ("ops", "tasks", "api")
+
+
+def _csv(value: str) -> list[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("layer", choices=(*LAYERS, "all"), help="какой уровень замерять")
+    parser.add_argument("--output", type=Path, default=Path("benchmark-results.json"))
+    parser.add_argument("--baseline", type=Path, help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="допустимое падение ops/sec относительно базовой линии (доля)")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--sizes", type=_csv, default=["640x480", "1920x1080"],
+                        help="размеры для ops через запятую; первый используется для tasks и api")
+    parser.add_argument("--modes", type=_csv, default=["RGB", "L"])
+    parser.add_argument("--formats", type=_csv, default=["jpeg", "png"])
+    parser.add_argument("--operations", type=_csv, default=None)
+    parser.add_argument("--celery", choices=("eager", "worker"), default="eager",
+                        help="eager — задачи в процессе; worker — через брокер запущенными воркерами")
+    parser.add_argument("--burst", type=int, default=0, help="tasks: поставить столько задач разом")
+    parser.add_argument("--requests", type=int, default=50, help="api: число запросов на ручку")
+    parser.add_argument("--concurrency", type=int, default=8, help="api: число одновременных клиентов")
+    parser.add_argument("--base-url", help="api: адрес запущенного API вместо вызова в процессе")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    logging.getLogger("benchmarks").setLevel(logging.INFO)
+    layers = LAYERS if args.layer == "all" else (args.layer,)
+    sizes = [parse_size(size) for size in args.sizes]
+
+    from app.services.result_cache import result_cache
+    from app.services.storage import LocalStorage, set_storage
+    from . import bench_api, bench_ops, bench_tasks
+
+    # Повторные запросы с тем же файлом иначе отдавались бы из кэша результатов
+    cache_enabled, result_cache.enabled = result_cache.enabled, False
+
+    in_process = args.celery == "eager" and not args.base_url
+    workdir = tempfile.TemporaryDirectory(prefix="benchmarks-") if in_process else None
+    if workdir is not None:
+        set_storage(LocalStorage(Path(workdir.name)))
+        if "tasks" in layers or "api" in layers:
+            bench_tasks.configure_eager()
+            bench_tasks.use_fake_redis()
+
+    results = []
+    try:
+        if "ops" in layers:
+            operations = args.operations or bench_ops.OPERATIONS
+            results += bench_ops.run(sizes, args.modes, args.formats, operations, args.iterations, args.warmup)
+        if "tasks" in layers:
+            operations = args.operations or bench_ops.OPERATIONS
+            results += bench_tasks.run(sizes[0], args.formats[0], operations, args.iterations, args.warmup,
+                                       burst=args.burst, mode=args.celery)
+        if "api" in layers:
+            routes = [route for route in (args.operations or bench_api.ROUTES) if route in bench_api.ROUTES]
+            results += bench_api.run(sizes[0], routes, args.requests, args.concurrency, args.base_url)
+    finally:
+        result_cache.enabled = cache_enabled
+        if workdir is not None:
+            set_storage(None)
+            workdir.cleanup()
+
+    write_results(args.output, results, {key: str(value) for key, value in vars(args).items()})
+    for entry in results:
+        stats = entry["stats"]
+        print(f"{entry['id']:<60} {stats['ops_per_sec']:>10.2f} ops/s  p50 {stats['p50_ms']:>9.2f} ms  "
+              f"p99 {stats['p99_ms']:>9.2f} ms")
+
+    if args.baseline:
+        comparisons = compare_with_baseline(results, load_results(args.baseline), args.tolerance)
+        regressions = [item for item in comparisons if item["regression"]]
+        for item in comparisons:
+            marker = "REGRESSION" if item["regression"] else ""
+            print(f"{item['id']:<60} {item['change']:>+8.1%} {marker}")
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+from typing import Any, Dict, Iterable, List, Optional
+import asyncio
+import io
+import logging
+import time
+
+import httpx
+
+from .common import make_image, result_entry, summarize
+
+logger = logging.getLogger(__name__)
+
+ROUTES = ("grayscale", "resize", "sepia", "crop")
+
+
+def route_form(route: str, size: tuple[int, int]) -> Dict[str, Any]:
+    """
+    Поля формы для ручки обработки.
+    """
+    width, height = size
+    if route == "resize":
+        return {"width": max(16, width // 4), "height": max(16, height // 4)}
+    if route == "crop":
+        return {"left": width // 4, "top": height // 4, "right": width * 3 // 4, "bottom": height * 3 // 4}
+    return {}
+
+
+async def _process_one(client: httpx.AsyncClient, route: str, payload: bytes, form: Dict[str, Any],
+                       poll_interval: float, timeout: float) -> tuple[float, float]:
+    """
+    Полный путь одного запроса: загрузка, ожидание готовности и скачивание результата.
+    Возвращает (задержка постановки, полная задержка) в секундах.
+    """
+    started = time.perf_counter()
+    response = await client.post(f"/{route}", data=form,
+                                 files={"image": ("bench.jpg", payload, "image/jpeg")})
+    response.raise_for_status()
+    submitted = time.perf_counter() - started
+    task_id = response.json()["task_id"]
+
+    deadline = started + timeout
+    while True:
+        response = await client.get(f"/download-result/{task_id}")
+        if response.status_code == 200:
+            break
+        if response.status_code != 202:
+            raise RuntimeError(f"{route}: download failed with {response.status_code}: {response.text}")
+        if time.perf_counter() > deadline:
+            raise TimeoutError(f"{route}: task {task_id} not ready after {timeout}s")
+        await asyncio.sleep(poll_interval)
+    return submitted, time.perf_counter() - started
+
+
+async def _load(client: httpx.AsyncClient, route: str, payload: bytes, form: Dict[str, Any],
+                requests: int, concurrency: int, poll_interval: float, timeout: float):
+    """
+    Выполняет requests запросов к ручке с concurrency одновременными клиентами.
+    """
+    remaining = iter(range(requests))
+    submit_latencies: List[float] = []
+    total_latencies: List[float] = []
+
+    async def client_loop():
+        for _ in remaining:
+            submitted, total = await _process_one(client, route, payload, form, poll_interval, timeout)
+            submit_latencies.append(submitted)
+            total_latencies.append(total)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return submit_latencies, total_latencies, time.perf_counter() - started
+
+
+async def _run(size: tuple[int, int], routes: Iterable[str], requests: int, concurrency: int,
+               base_url: Optional[str], poll_interval: float, timeout: float) -> List[Dict[str, Any]]:
+    buffer = io.BytesIO()
+    make_image(size, "RGB").save(buffer, format="JPEG", quality=90)
+    payload = buffer.getvalue()
+
+    if base_url:
+        transport, target = None, "remote"
+        client = httpx.AsyncClient(base_url=base_url, timeout=timeout)
+    else:
+        from app.main import app
+
+        transport, target = httpx.ASGITransport(app=app), "in-process"
+        client = httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=timeout)
+
+    results = []
+    async with client:
+        for route in routes:
+            form = route_form(route, size)
+            # Прогрев: первый запрос инициализирует соединения и ленивые импорты
+            await _process_one(client, route, payload, form, poll_interval, timeout)
+
+            logger.info("api %s x%d, concurrency %d", route, requests, concurrency)
+            submit_latencies, total_latencies, elapsed = await _load(
+                client, route, payload, form, requests, concurrency, poll_interval, timeout)
+            params = {"size": f"{size[0]}x{size[1]}", "concurrency": concurrency, "target": target}
+            results.append(result_entry("api", f"{route}_submit", params, summarize(submit_latencies, elapsed)))
+            results.append(result_entry("api", f"{route}_end_to_end", params, summarize(total_latencies, elapsed)))
+    return results
+
+
+def run(size: tuple[int, int], routes: Iterable[str] = ROUTES, requests: int = 50, concurrency: int = 8,
+        base_url: Optional[str] = None, poll_interval: float = 0.05, timeout: float = 300) -> List[Dict[str, Any]]:
+    """
+    Нагрузочный прогон HTTP-ручек конкурентными клиентами httpx: загрузка изображения,
+    ожидание результата через /download-result и скачивание.
+    Без base_url приложение вызывается в процессе (ASGI) с Celery в режиме eager —
+    задача выполняется внутри запроса, поэтому замер показывает накладные расходы API,
+    а не параллелизм воркеров. Для полного стенда укажите base_url запущенного API.
+    """
+    return asyncio.run(_run(size, routes, requests, concurrency, base_url, poll_interval, timeout))
@@ -0,0 +1,78 @@
+from typing import Any, Callable, Dict, Iterable, List
+import logging
+
+from app.services import image_processor
+from app.services.formats import OUTPUT_FORMATS
+from app.services.storage import RAW_AREA, get_storage
+
+from .common import make_image, measure, result_entry
+
+logger = logging.getLogger(__name__)
+
+OPERATIONS = ("grayscale", "resize", "sepia", "crop", "pipeline")
+
+
+def operation_runner(operation: str, size: tuple[int, int]) -> Callable[[str, str], bool]:
+    """
+    Вызов функции image_processor для операции с параметрами, зависящими от размера входа.
+    """
+    width, height = size
+    box = (width // 4, height // 4, width * 3 // 4, height * 3 // 4)
+    thumbnail = (max(16, width // 4), max(16, height // 4))
+
+    if operation == "grayscale":
+        return image_processor.apply_grayscale
+    if operation == "resize":
+        return lambda source, target: image_processor.resize_image(source, target, thumbnail)
+    if operation == "sepia":
+        return image_processor.sepia_image
+    if operation == "crop":
+        return lambda source, target: image_processor.crop_image(source, target, box)
+    if operation == "pipeline":
+        operations = [
+            {"op": "crop", "left": box[0], "top": box[1], "right": box[2], "bottom": box[3]},
+            {"op": "resize", "width": max(16, width // 8), "height": max(16, height // 8)},
+            {"op": "grayscale"},
+        ]
+        return lambda source, target: image_processor.run_pipeline(source, target, operations)
+    raise ValueError(f"Unknown operation '{operation}'")
+
+
+def save_input(size: tuple[int, int], mode: str, image_format: str) -> str:
+    """
+    Генерирует входное изображение и кладет его в область RAW хранилища.
+    """
+    spec = OUTPUT_FORMATS[image_format]
+    name = f"bench_{size[0]}x{size[1]}_{mode}{spec['extension']}"
+    with get_storage().writer(RAW_AREA, name) as target:
+        make_image(size, mode).save(target, format=spec["pillow"])
+    return name
+
+
+def run(sizes: Iterable[tuple[int, int]], modes: Iterable[str], formats: Iterable[str],
+        operations: Iterable[str] = OPERATIONS, iterations: int = 5, warmup: int = 1) -> List[Dict[str, Any]]:
+    """
+    Замеряет каждую операцию image_processor на матрице размер x режим x формат.
+    Комбинации, которые формат не поддерживает (RGBA в JPEG), пропускаются.
+    """
+    results = []
+    for size in sizes:
+        for mode in modes:
+            for image_format in formats:
+                if image_format == "jpeg" and mode == "RGBA":
+                    continue
+                input_filename = save_input(size, mode, image_format)
+                for operation in operations:
+                    # Сепия без явного формата всегда кодируется в JPEG
+                    output_format = "jpeg" if operation == "sepia" else image_format
+                    output_filename = f"bench_{operation}{OUTPUT_FORMATS[output_format]['extension']}"
+                    runner = operation_runner(operation, size)
+
+                    def call():
+                        if not runner(input_filename, output_filename):
+                            raise RuntimeError(f"{operation} failed on {input_filename}")
+
+                    params = {"size": f"{size[0]}x{size[1]}", "mode": mode, "format": image_format}
+                    logger.info("ops %s %s", operation, params)
+                    results.append(result_entry("ops", operation, params, measure(call, iterations, warmup)))
+    return results
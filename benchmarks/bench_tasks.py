@@ -0,0 +1,106 @@
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+import logging
+import time
+
+from .bench_ops import OPERATIONS, save_input
+from .common import measure, result_entry, summarize
+
+logger = logging.getLogger(__name__)
+
+
+def configure_eager() -> None:
+    """
+    Переводит Celery в режим eager: задачи выполняются в текущем процессе при постановке,
+    результаты хранятся в памяти. Нужно вызывать до первого обращения к celery_app.backend.
+    """
+    from app.core.celery_app import celery_app
+
+    celery_app.conf.update(
+        task_always_eager=True,
+        task_eager_propagates=True,
+        task_store_eager_result=True,
+        result_backend="cache+memory://",
+    )
+
+
+def use_fake_redis() -> bool:
+    """
+    Подменяет Redis приложения (события задач) на fakeredis, если он установлен,
+    чтобы замеры не включали попытки соединения с отсутствующим сервером.
+    """
+    try:
+        import fakeredis
+    except ImportError:
+        return False
+    from app.core import redis_client
+
+    server = fakeredis.FakeServer()
+    redis_client._redis = fakeredis.FakeRedis(server=server)
+    redis_client._async_redis = fakeredis.FakeAsyncRedis(server=server)
+    return True
+
+
+def task_call(operation: str, input_filename: str, output_filename: str, size: tuple[int, int]):
+    """
+    Задача Celery и ее аргументы для операции (как их ставит API).
+    """
+    from app.tasks import tasks
+
+    width, height = size
+    box = (width // 4, height // 4, width * 3 // 4, height * 3 // 4)
+    if operation == "grayscale":
+        return tasks.process_image_to_grayscale, (input_filename, output_filename)
+    if operation == "resize":
+        return tasks.process_image_to_resize, (input_filename, output_filename,
+                                               max(16, width // 4), max(16, height // 4))
+    if operation == "sepia":
+        return tasks.process_image_to_sepia, (input_filename, output_filename)
+    if operation == "crop":
+        return tasks.process_image_to_crop, (input_filename, output_filename, *box)
+    if operation == "pipeline":
+        operations = [
+            {"op": "crop", "left": box[0], "top": box[1], "right": box[2], "bottom": box[3]},
+            {"op": "resize", "width": max(16, width // 8), "height": max(16, height // 8)},
+            {"op": "grayscale"},
+        ]
+        return tasks.process_image_pipeline, (input_filename, output_filename, operations)
+    raise ValueError(f"Unknown operation '{operation}'")
+
+
+def run(size: tuple[int, int], image_format: str = "jpeg", operations: Iterable[str] = OPERATIONS,
+        iterations: int = 5, warmup: int = 1, burst: int = 0, timeout: float = 300,
+        mode: str = "eager") -> List[Dict[str, Any]]:
+    """
+    Замеряет задачи process_image_* через Celery: постановка, выполнение и чтение результата.
+    В режиме eager задачи выполняются в процессе; в режиме worker — запущенными воркерами
+    (хранилище должно быть общим с ними). burst > 0 дополнительно ставит столько задач
+    разом и замеряет пропускную способность.
+    """
+    from app.core.celery_app import task_routing
+
+    input_filename = save_input(size, "RGB", image_format)
+    results = []
+    for operation in operations:
+        extension = ".jpg" if operation == "sepia" else Path(input_filename).suffix
+        output_filename = f"bench_task_{operation}{extension}"
+        task, args = task_call(operation, input_filename, output_filename, size)
+        routing = task_routing(operation, operations=args[2] if operation == "pipeline" else None)
+
+        def call():
+            task.apply_async(args, **routing).get(timeout=timeout)
+
+        params = {"size": f"{size[0]}x{size[1]}", "format": image_format, "mode": mode}
+        logger.info("tasks %s %s", operation, params)
+        results.append(result_entry("tasks", operation, params, measure(call, iterations, warmup)))
+
+        if burst > 0:
+            started = time.perf_counter()
+            submitted = [(time.perf_counter(), task.apply_async(args, **routing)) for _ in range(burst)]
+            latencies = []
+            for submitted_at, async_result in submitted:
+                async_result.get(timeout=timeout)
+                latencies.append(time.perf_counter() - submitted_at)
+            stats = summarize(latencies, elapsed=time.perf_counter() - started)
+            results.append(result_entry("tasks", f"{operation}_burst", {**params, "burst": burst}, stats))
+    return results
@@ -0,0 +1,181 @@
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import json
+import math
+import os
+import platform
+import resource
+import statistics
+import time
+
+from PIL import Image
+
+# Ключ в результатах, по которому сравниваются прогоны
+THROUGHPUT_KEY = "ops_per_sec"
+
+
+def parse_size(value: str) -> tuple[int, int]:
+    """
+    Разбирает размер вида 1920x1080.
+    """
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def make_image(size: tuple[int, int], mode: str) -> Image.Image:
+    """
+    Синтетическое изображение с шумом и градиентом: сжимается примерно как
+    фотография, а не как однотонная заливка.
+    """
+    noise = Image.effect_noise(size, 48)
+    gradient = Image.linear_gradient("L").resize(size)
+    if mode == "L":
+        return Image.blend(noise, gradient, 0.5)
+    bands = [Image.blend(noise, gradient, 0.5), gradient.transpose(Image.Transpose.ROTATE_180),
+             Image.blend(noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT), 0.3)]
+    if mode == "RGBA":
+        bands.append(gradient.transpose(Image.Transpose.FLIP_TOP_BOTTOM))
+    return Image.merge(mode, bands)
+
+
+def reset_peak_rss() -> bool:
+    """
+    Сбрасывает пиковый RSS процесса (Linux >= 4.0). Возвращает False, если сброс
+    недоступен — тогда пик считается с начала процесса.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_bytes() -> int:
+    """
+    Пиковый RSS процесса в байтах (VmHWM, иначе ru_maxrss).
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS отдает байты, Linux — килобайты
+    return maxrss if platform.system() == "Darwin" else maxrss * 1024
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """
+    Перцентиль методом ближайшего ранга по отсортированному списку.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: Iterable[float], elapsed: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Сводка по задержкам (в секундах): операций в секунду, перцентили и среднее в миллисекундах.
+    elapsed — общее время прогона; для конкурентной нагрузки оно меньше суммы задержек.
+    """
+    values = sorted(latencies)
+    total = elapsed if elapsed is not None else sum(values)
+    return {
+        "iterations": len(values),
+        THROUGHPUT_KEY: round(len(values) / total, 3) if total > 0 else 0.0,
+        "mean_ms": round(statistics.fmean(values) * 1000, 3) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p90_ms": round(percentile(values, 90) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+    }
+
+
+def measure(fn: Callable[[], Any], iterations: int, warmup: int = 1) -> Dict[str, Any]:
+    """
+    Выполняет fn warmup + iterations раз подряд и возвращает сводку по задержкам
+    с пиковым RSS за измеряемые итерации.
+    """
+    for _ in range(warmup):
+        fn()
+
+    peak_reset = reset_peak_rss()
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+
+    stats = summarize(latencies)
+    stats["peak_rss_mb"] = round(peak_rss_bytes() / (1024 * 1024), 1)
+    stats["peak_rss_scope"] = "case" if peak_reset else "process"
+    return stats
+
+
+def result_entry(layer: str, name: str, params: Dict[str, Any], stats: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Запись результата одного случая; id однозначно определяет случай между прогонами.
+    """
+    case_id = "/".join([layer, name, *(str(value) for value in params.values())])
+    return {"id": case_id, "layer": layer, "name": name, "params": params, "stats": stats}
+
+
+def environment_info() -> Dict[str, Any]:
+    """
+    Сведения об окружении прогона: без них сравнение с базовой линией бессмысленно.
+    """
+    import PIL
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_results(path: Path, results: List[Dict[str, Any]], options: Dict[str, Any]) -> None:
+    """
+    Сохраняет результаты прогона в JSON.
+    """
+    document = {"meta": {**environment_info(), "options": options}, "results": results}
+    Path(path).write_text(json.dumps(document, indent=2, ensure_ascii=False))
+
+
+def load_results(path: Path) -> List[Dict[str, Any]]:
+    """
+    Читает результаты прогона (например, сохраненную базовую линию).
+    """
+    return json.loads(Path(path).read_text())["results"]
+
+
+def compare_with_baseline(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]],
+                          tolerance: float = 0.1) -> List[Dict[str, Any]]:
+    """
+    Сравнивает пропускную способность с базовой линией по id случая.
+    Возвращает сравнения для общих случаев; regression=True, если текущий прогон
+    медленнее базовой линии больше чем на tolerance (доля).
+    """
+    baseline_by_id = {entry["id"]: entry for entry in baseline}
+    comparisons = []
+    for entry in results:
+        reference = baseline_by_id.get(entry["id"])
+        if reference is None:
+            continue
+        before = reference["stats"][THROUGHPUT_KEY]
+        after = entry["stats"][THROUGHPUT_KEY]
+        change = (after - before) / before if before else 0.0
+        comparisons.append({
+            "id": entry["id"],
+            "baseline": before,
+            "current": after,
+            "change": round(change, 4),
+            "regression": change < -tolerance,
+        })
+    return comparisons
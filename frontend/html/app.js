@@ -75,8 +75,8 @@ async function uploadFile(endpoint) {
 
         if (response.ok) {
             STATUS_DIV.innerHTML = `<p>✅ Задача "${endpoint}" поставлена в очередь. ID: ${data.task_id}</p>`;
-            // Начинаем опрос статуса каждую секунду
-            pollStatus(data.task_id, 1000);
+            // Подписываемся на события задачи (при недоступности SSE — опрос каждую секунду)
+            subscribeStatus(data.task_id);
         } else {
             STATUS_DIV.innerHTML = `<p style="color: red;">❌ Ошибка API: ${data.detail || 'Неизвестная ошибка'}</p>`;
         }
@@ -86,7 +86,66 @@ async function uploadFile(endpoint) {
 }
 
 /**
- * 2. Рекурсивно опрашивает статус задачи Celery.
+ * Отображает финальный результат или ошибку задачи.
+ * Возвращает true, если статус финальный.
+ */
+function renderStatus(taskId, status, errorDetail, progress) {
+    const progressText = progress !== null && progress !== undefined ? ` (${progress}%)` : '';
+    STATUS_DIV.innerHTML = `<p>🔄 Статус задачи ${taskId}: <b>${status}</b>${progressText}</p>`;
+
+    if (status === 'SUCCESS') {
+        const downloadLink = `${API_URL}/download-result/${taskId}`;
+
+        RESULT_DIV.innerHTML = `
+            <p>✨ Обработка завершена!</p>
+            <a href="${downloadLink}" download>
+                Скачать результат
+            </a>
+        `;
+
+        // Отображаем готовый результат, используя URL для скачивания
+        OUTPUT_PREVIEW.src = downloadLink;
+        return true;
+    }
+    if (status === 'FAILURE' || status === 'REVOKED') {
+        STATUS_DIV.innerHTML = `<p style="color: red;">🔥 Задача завершилась с ошибкой: ${errorDetail || 'См. логи Flower.'}</p>`;
+        return true;
+    }
+    return false;
+}
+
+/**
+ * 2. Подписывается на события задачи через Server-Sent Events (/task-events).
+ * Сервер сам присылает смену статуса и прогресс, опрос не нужен.
+ * Если соединение оборвалось до финального статуса — переходит на опрос.
+ */
+function subscribeStatus(taskId) {
+    if (!window.EventSource) {
+        pollStatus(taskId, 1000);
+        return;
+    }
+
+    const source = new EventSource(`${API_URL}/task-events/${taskId}`);
+    let finished = false;
+
+    source.onmessage = (message) => {
+        const event = JSON.parse(message.data);
+        finished = renderStatus(taskId, event.state, event.error, event.progress);
+        if (finished) {
+            source.close();
+        }
+    };
+
+    source.onerror = () => {
+        source.close();
+        if (!finished) {
+            pollStatus(taskId, 1000);
+        }
+    };
+}
+
+/**
+ * 3. Рекурсивно опрашивает статус задачи Celery (запасной вариант без SSE).
  */
 function pollStatus(taskId, interval) {
     const statusUrl = `${API_URL}/task-status/${taskId}`;
@@ -94,28 +153,9 @@ function pollStatus(taskId, interval) {
     fetch(statusUrl)
         .then(res => res.json())
         .then(data => {
-            const status = data.status;
-
-            STATUS_DIV.innerHTML = `<p>🔄 Статус задачи ${taskId}: <b>${status}</b></p>`;
-
-            if (status === 'SUCCESS') {
-                const downloadLink = `${API_URL}/download-result/${taskId}`;
-
-                RESULT_DIV.innerHTML = `
-                    <p>✨ Обработка завершена!</p>
-                    <a href="${downloadLink}" download>
-                        Скачать результат
-                    </a>
-                `;
-
-                // Отображаем готовый результат, используя URL для скачивания
-                OUTPUT_PREVIEW.src = downloadLink;
+            const errorDetail = data.result && data.result.error ? data.result.error : null;
 
-            } else if (status === 'FAILURE' || status === 'REVOKED') {
-                // Обработка ошибок
-                const errorDetail = data.result && data.result.error ? data.result.error : 'См. логи Flower.';
-                STATUS_DIV.innerHTML = `<p style="color: red;">🔥 Задача завершилась с ошибкой: ${errorDetail}</p>`;
-            } else {
+            if (!renderStatus(taskId, data.status, errorDetail, null)) {
                 // Если статус не финальный (PENDING, STARTED), продолжаем опрос
                 setTimeout(() => pollStatus(taskId, interval), interval);
             }
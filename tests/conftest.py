@@ -34,4 +34,63 @@ def mock_celery_tasks():
     yield mocks[3]
 
     for patcher in mocks:
-        patcher.stop()
\ No newline at end of file
+        patcher.stop()
+
+@pytest.fixture
+def mock_pipeline_task():
+    """Фикстура, которая мокирует диспетчер задачи пайплайна."""
+    mock_async_result = MagicMock()
+    mock_async_result.id = 'fake_pipeline_task_id'
+    mock_async_result.name = 'app.tasks.tasks.process_image_pipeline'
+
+    with patch("app.routers.image_processing.dispatch_image_processing_task_pipeline",
+               new=MagicMock(return_value=mock_async_result)) as mock_dispatch:
+        yield mock_dispatch
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path):
+    """Подменяет хранилище файлов локальным хранилищем во временной папке."""
+    from app.services.storage import LocalStorage, set_storage
+
+    root = tmp_path / "data"
+    set_storage(LocalStorage(root))
+    yield root
+    set_storage(None)
+
+
+@pytest.fixture
+def isolated_result_cache(monkeypatch):
+    """Подменяет кэш результатов роутера кэшем с нулевыми счетчиками."""
+    from app.services.result_cache import ResultCache
+
+    cache = ResultCache(max_bytes=1024 * 1024)
+    monkeypatch.setattr("app.routers.image_processing.result_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def mock_batch_dispatch():
+    """Фикстура, которая мокирует постановку пакета задач группой Celery."""
+    def fake_dispatch(process_type, items, params, encode_options=None, priority="normal"):
+        batch = MagicMock()
+        batch.id = 'fake_batch_id'
+        batch.results = [MagicMock(id=item.get("task_id") or f"task_{index}") for index, item in enumerate(items)]
+        return batch
+
+    with patch("app.routers.image_processing.dispatch_batch",
+               new=MagicMock(side_effect=fake_dispatch)) as mock_dispatch:
+        yield mock_dispatch
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Подменяет клиенты Redis приложения (синхронный и асинхронный) на fakeredis с общим состоянием."""
+    fakeredis = pytest.importorskip("fakeredis")
+    from app.core import redis_client
+
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeRedis(server=server)
+    monkeypatch.setattr(redis_client, "_redis", client)
+    monkeypatch.setattr(redis_client, "_async_redis", fakeredis.FakeAsyncRedis(server=server))
+    return client
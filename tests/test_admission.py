@@ -0,0 +1,130 @@
+import pytest
+
+from app.services import admission
+from app.services.admission import (
+    AdmissionRejected,
+    check_admission,
+    check_rate_limit,
+    queue_throughput,
+    record_completion,
+)
+from app.services.storage import get_storage
+
+
+NOW = 1_000_000.0
+TEST_IMAGE_PATH = "./tests/test_image.jpg"
+
+
+@pytest.fixture
+def queue_depth(monkeypatch):
+    """Подменяет длину очередей брокера."""
+    depths = {}
+    monkeypatch.setattr(admission, "queue_depth", lambda queue: depths.get(queue))
+    return depths
+
+
+def _record(queue: str, count: int, now: float = NOW) -> None:
+    for index in range(count):
+        record_completion(queue, now=now - 1 - index * 50 / count)
+
+
+def test_throughput_counts_completions_in_window(fake_redis):
+    """Проверяет пропускную способность по завершенным задачам за окно (без текущего интервала)."""
+    _record("images.heavy", 60)
+    record_completion("images.heavy", now=NOW)
+    record_completion("images.heavy", now=NOW - 3600)
+
+    assert queue_throughput("images.heavy", now=NOW) == 1.0
+    assert queue_throughput("images.fast", now=NOW) == 0.0
+
+
+def test_long_estimated_wait_is_rejected(fake_redis, queue_depth, monkeypatch):
+    """Проверяет 503 и Retry-After по оценке ожидания: длина очереди / пропускная способность."""
+    monkeypatch.setattr(admission, "ADMISSION_MAX_WAIT_SECONDS", 30)
+    _record("images.heavy", 60)
+
+    queue_depth["images.heavy"] = 10
+    check_admission("images.heavy", now=NOW)
+
+    queue_depth["images.heavy"] = 100
+    with pytest.raises(AdmissionRejected) as exc:
+        check_admission("images.heavy", now=NOW)
+    assert exc.value.status_code == 503
+    assert exc.value.retry_after == 71
+
+    # Очередь неизвестна (брокер недоступен) — запрос принимается
+    check_admission("images.fast", now=NOW)
+
+
+def test_burst_after_idle_is_admitted_until_queue_stalls(fake_redis, queue_depth, monkeypatch):
+    """Проверяет, что после простоя (нет завершений в окне) очередь отклоняется, только если не продвигается дольше предела."""
+    monkeypatch.setattr(admission, "ADMISSION_MAX_QUEUE_DEPTH", 0)
+    monkeypatch.setattr(admission, "ADMISSION_MAX_WAIT_SECONDS", 30)
+    record_completion("images.heavy", now=NOW - 3600)
+    assert queue_throughput("images.heavy", now=NOW) == 0.0
+
+    queue_depth["images.heavy"] = 5
+    check_admission("images.heavy", now=NOW)
+    check_admission("images.heavy", now=NOW + 30)
+
+    with pytest.raises(AdmissionRejected) as exc:
+        check_admission("images.heavy", now=NOW + 31)
+    assert exc.value.status_code == 503
+    assert exc.value.reason == "queue_wait"
+    assert exc.value.retry_after == admission.ADMISSION_RETRY_AFTER
+
+    # Первое завершение сбрасывает отметку простоя
+    record_completion("images.heavy", now=NOW + 32)
+    check_admission("images.heavy", now=NOW + 33)
+
+
+def test_depth_limit_and_disk_limit(fake_redis, queue_depth, monkeypatch):
+    """Проверяет предел длины очереди без данных о пропускной способности и заполнение тома."""
+    monkeypatch.setattr(admission, "ADMISSION_MAX_QUEUE_DEPTH", 50)
+    queue_depth["images.heavy"] = 50
+    with pytest.raises(AdmissionRejected) as exc:
+        check_admission("images.heavy", now=NOW)
+    assert exc.value.retry_after == admission.ADMISSION_RETRY_AFTER
+
+    queue_depth["images.heavy"] = 0
+    monkeypatch.setattr(get_storage(), "disk_usage", lambda: (98, 100))
+    with pytest.raises(AdmissionRejected) as exc:
+        check_admission("images.heavy", now=NOW)
+    assert exc.value.reason == "disk"
+
+
+def test_token_bucket_limits_each_client(fake_redis):
+    """Проверяет всплеск до burst, 429 сверх него и пополнение корзины со временем."""
+    for _ in range(3):
+        check_rate_limit("10.0.0.1", per_minute=60, burst=3, now=NOW)
+    with pytest.raises(AdmissionRejected) as exc:
+        check_rate_limit("10.0.0.1", per_minute=60, burst=3, now=NOW)
+    assert exc.value.status_code == 429
+    assert exc.value.retry_after == 1
+
+    check_rate_limit("10.0.0.2", per_minute=60, burst=3, now=NOW)
+    check_rate_limit("10.0.0.1", per_minute=60, burst=3, now=NOW + 1)
+
+
+def test_submit_endpoint_answers_with_retry_after(sync_client, mock_celery_tasks, fake_redis, queue_depth,
+                                                  data_dir, monkeypatch):
+    """Проверяет, что ручка отвечает 503/429 с Retry-After и не сохраняет загрузку."""
+    files = {"image": ("test.jpg", open(TEST_IMAGE_PATH, "rb"), "image/jpeg")}
+    monkeypatch.setattr(admission, "ADMISSION_MAX_QUEUE_DEPTH", 5)
+    queue_depth.update({"images.fast": 10, "images.heavy": 10})
+
+    response = sync_client.post("/sepia", files=files)
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(admission.ADMISSION_RETRY_AFTER)
+    assert not list(get_storage().list("raw"))
+    assert not mock_celery_tasks.called
+
+    monkeypatch.setattr(admission, "RATE_LIMIT_PER_MINUTE", 1)
+    monkeypatch.setattr(admission, "RATE_LIMIT_BURST", 1)
+    queue_depth.clear()
+    files = {"image": ("test.jpg", open(TEST_IMAGE_PATH, "rb"), "image/jpeg")}
+    assert sync_client.post("/sepia", files=files).status_code == 200
+    files = {"image": ("test.jpg", open(TEST_IMAGE_PATH, "rb"), "image/jpeg")}
+    response = sync_client.post("/sepia", files=files)
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) > 0
@@ -1,3 +1,4 @@
+import json
 import pytest
 from unittest.mock import MagicMock
 
@@ -58,4 +59,68 @@ async def test_crop_validation_right_less_than_left(sync_client, mock_celery_tas
     assert "Crop area is invalid" in response.json()["detail"]
 
     # 2. Проверка, что Celery не был вызван!
-    mock_celery_tasks.assert_not_called()
\ No newline at end of file
+    mock_celery_tasks.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_pipeline_success(sync_client, mock_pipeline_task: MagicMock):
+    """Проверяет, что /pipeline ставит одну задачу с нормализованным списком операций."""
+    operations = [
+        {"op": "crop", "left": 0, "top": 0, "right": 100, "bottom": 100},
+        {"op": "resize", "width": 64, "height": 64},
+        {"op": "grayscale"},
+    ]
+
+    with open(TEST_IMAGE_PATH, "rb") as image_file:
+        files = {"image": ("test_image.jpg", image_file, "image/jpeg")}
+        response = sync_client.post("/pipeline", files=files, data={"operations": json.dumps(operations)})
+
+    assert response.status_code == 200
+    assert response.json()["operations"] == ["crop", "resize", "grayscale"]
+
+    mock_pipeline_task.assert_called_once()
+    args, kwargs = mock_pipeline_task.call_args
+    assert args[2] == operations
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("operations", [
+    "not json",
+    "[]",
+    '[{"op": "blur"}]',
+    '[{"op": "resize", "width": 64}]',
+    '[{"op": "crop", "left": 50, "top": 0, "right": 10, "bottom": 100}]',
+])
+async def test_pipeline_invalid_operations(sync_client, mock_pipeline_task: MagicMock, operations):
+    """Проверяет, что некорректный список операций отклоняется с 422 без постановки задачи."""
+    with open(TEST_IMAGE_PATH, "rb") as image_file:
+        files = {"image": ("test_image.jpg", image_file, "image/jpeg")}
+        response = sync_client.post("/pipeline", files=files, data={"operations": operations})
+
+    assert response.status_code == 422
+    mock_pipeline_task.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_color_matrix_dispatches_pipeline(sync_client, mock_pipeline_task: MagicMock, isolated_result_cache):
+    """Проверяет, что /color-matrix ставит задачу пайплайна с одной матричной операцией."""
+    matrix = [[0.393, 0.769, 0.189, 0], [0.349, 0.686, 0.168, 0], [0.272, 0.534, 0.131, 0]]
+
+    with open(TEST_IMAGE_PATH, "rb") as image_file:
+        files = {"image": ("test_image.jpg", image_file, "image/jpeg")}
+        response = sync_client.post("/color-matrix", files=files, data={"matrix": json.dumps(matrix)})
+
+    assert response.status_code == 200
+    args, kwargs = mock_pipeline_task.call_args
+    assert args[2] == [{"op": "color_matrix", "matrix": matrix}]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("matrix", ["[[1, 0, 0]]", '[[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, "x", 0]]', "oops"])
+async def test_color_matrix_invalid(sync_client, mock_pipeline_task: MagicMock, matrix):
+    """Проверяет, что некорректная матрица отклоняется с 422."""
+    with open(TEST_IMAGE_PATH, "rb") as image_file:
+        files = {"image": ("test_image.jpg", image_file, "image/jpeg")}
+        response = sync_client.post("/color-matrix", files=files, data={"matrix": matrix})
+
+    assert response.status_code == 422
+    mock_pipeline_task.assert_not_called()
@@ -0,0 +1,154 @@
+import io
+import zipfile
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.core.celery_app import QUEUE_FAST
+from app.services.admission import AdmissionRejected
+from app.services.storage import get_storage
+
+
+TEST_IMAGE_PATH = "./tests/test_image.jpg"
+
+
+def _image_bytes() -> bytes:
+    with open(TEST_IMAGE_PATH, "rb") as image_file:
+        return image_file.read()
+
+
+@pytest.mark.asyncio
+async def test_batch_multiple_files_and_zip(sync_client, mock_batch_dispatch: MagicMock, isolated_result_cache):
+    """Проверяет, что файлы и изображения из zip-архива уходят одной группой."""
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("nested/one.jpg", _image_bytes())
+        zf.writestr("notes.txt", b"not an image")
+
+    files = [
+        ("images", ("a.jpg", _image_bytes(), "image/jpeg")),
+        ("images", ("b.jpg", _image_bytes(), "image/jpeg")),
+        ("images", ("more.zip", archive.getvalue(), "application/zip")),
+    ]
+    response = sync_client.post("/batch/resize", files=files, data={"width": 64, "height": 32})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["batch_id"] == "fake_batch_id"
+    assert data["total"] == 3
+    assert [task["original_filename"] for task in data["tasks"]] == ["a.jpg", "b.jpg", "one.jpg"]
+
+    mock_batch_dispatch.assert_called_once()
+    process_type, items, params = mock_batch_dispatch.call_args.args
+    assert process_type == "resize"
+    assert params == {"width": 64, "height": 32}
+    # Одинаковые байты и параметры дают одинаковый ключ кэша
+    assert len({item["cache_key"] for item in items}) == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("member, limits, status", [
+    (b"not an image at all", {}, 400),
+    (_image_bytes(), {"UPLOAD_MAX_BYTES": 1024}, 413),
+    (_image_bytes(), {"BATCH_MAX_TOTAL_BYTES": 400 * 1024}, 413),
+])
+async def test_zip_members_are_checked_before_save(sync_client, mock_batch_dispatch: MagicMock, monkeypatch,
+                                                   member, limits, status):
+    """Проверяет пробу заголовка и пределы размера для изображений из zip-архива (zip bomb)."""
+    for name, value in limits.items():
+        monkeypatch.setattr(f"app.routers.image_processing.{name}", value)
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("one.jpg", _image_bytes())
+        zf.writestr("two.jpg", member)
+
+    files = [("images", ("more.zip", archive.getvalue(), "application/zip"))]
+    response = sync_client.post("/batch/grayscale", files=files)
+
+    assert response.status_code == status
+    mock_batch_dispatch.assert_not_called()
+    assert not list(get_storage().list("raw"))
+
+
+@pytest.mark.asyncio
+async def test_invalid_file_late_in_batch_saves_nothing(sync_client, mock_batch_dispatch: MagicMock):
+    """Проверяет, что неподходящий файл в конце пакета отклоняется до сохранения первых файлов."""
+    files = [
+        ("images", ("a.jpg", _image_bytes(), "image/jpeg")),
+        ("images", ("notes.txt", b"not an image", "text/plain")),
+    ]
+    response = sync_client.post("/batch/grayscale", files=files)
+
+    assert response.status_code == 400
+    mock_batch_dispatch.assert_not_called()
+    assert not list(get_storage().list("raw"))
+
+
+@pytest.mark.asyncio
+async def test_batch_admission_counts_zip_members(sync_client, mock_batch_dispatch: MagicMock):
+    """Проверяет, что допуск пакета считает каждое изображение zip-архива и удаляет сохраненные при отказе."""
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        for index in range(3):
+            zf.writestr(f"{index}.jpg", _image_bytes())
+    files = [("images", ("more.zip", archive.getvalue(), "application/zip"))]
+
+    rejection = AdmissionRejected("Queue is full, retry later.", 503, 5, "queue_depth")
+    with patch("app.routers.image_processing.check_admission", side_effect=rejection) as check:
+        response = sync_client.post("/batch/grayscale", files=files)
+
+    assert response.status_code == 503
+    check.assert_called_once_with(QUEUE_FAST, 3)
+    mock_batch_dispatch.assert_not_called()
+    assert not list(get_storage().list("raw"))
+
+
+@pytest.mark.asyncio
+async def test_batch_invalid_params(sync_client, mock_batch_dispatch: MagicMock):
+    """Проверяет, что пакет с неверными параметрами операции отклоняется до сохранения файлов."""
+    files = [("images", ("a.jpg", _image_bytes(), "image/jpeg"))]
+    response = sync_client.post("/batch/crop", files=files,
+                                data={"left": 50, "top": 0, "right": 10, "bottom": 100})
+
+    assert response.status_code == 422
+    mock_batch_dispatch.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_batch_status_aggregates_progress(sync_client):
+    """Проверяет сводный прогресс пакета."""
+    metas = [
+        {"task_id": "t1", "status": "SUCCESS", "result": {}},
+        {"task_id": "t2", "status": "FAILURE", "result": None},
+        {"task_id": "t3", "status": "PENDING", "result": None},
+        {"task_id": "t4", "status": "STARTED", "result": None},
+    ]
+    with patch("app.routers.image_processing.get_batch_task_metas", return_value=metas):
+        response = sync_client.get("/batch-status/some_batch")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["successful"], data["failed"], data["pending"]) == (1, 1, 2)
+    assert data["progress"] == 50.0
+    assert data["ready"] is False
+
+
+@pytest.mark.asyncio
+async def test_batch_download_streams_zip(sync_client):
+    """Проверяет, что готовый пакет отдается zip-архивом с результатами."""
+    get_storage().save("processed", "out1.jpg", io.BytesIO(b"first"))
+    get_storage().save("processed", "out2.jpg", io.BytesIO(b"second"))
+    metas = [
+        {"task_id": "t1", "status": "SUCCESS", "result": {"input": "in1.jpg", "output": "out1.jpg"}},
+        {"task_id": "t2", "status": "SUCCESS", "result": {"input": "in2.jpg", "output": "out2.jpg"}},
+    ]
+    with patch("app.routers.image_processing.get_batch_task_metas", return_value=metas), \
+            patch("app.routers.image_processing.cleanup_files") as mock_cleanup:
+        response = sync_client.get("/batch-download/some_batch")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(response.content)) as zf:
+        assert zf.read("out1.jpg") == b"first"
+        assert zf.read("out2.jpg") == b"second"
+    assert mock_cleanup.call_count == 2
@@ -0,0 +1,56 @@
+import json
+
+from benchmarks import bench_ops
+from benchmarks.__main__ import main
+from benchmarks.common import compare_with_baseline, result_entry, summarize
+
+
+def test_summarize_percentiles():
+    """Проверяет сводку: ops/sec по общему времени и перцентили ближайшего ранга."""
+    stats = summarize([0.001 * value for value in range(1, 101)])
+    assert stats["iterations"] == 100
+    assert stats["p50_ms"] == 50.0
+    assert stats["p99_ms"] == 99.0
+    assert stats["ops_per_sec"] == round(100 / 5.05, 3)
+    assert summarize([0.1, 0.1], elapsed=0.1)["ops_per_sec"] == 20.0
+
+
+def test_compare_with_baseline_flags_regressions():
+    """Проверяет, что регрессией считается только падение пропускной способности больше допуска."""
+    baseline = [result_entry("ops", "crop", {"size": "1x1"}, {"ops_per_sec": 100.0}),
+                result_entry("ops", "sepia", {"size": "1x1"}, {"ops_per_sec": 100.0})]
+    current = [result_entry("ops", "crop", {"size": "1x1"}, {"ops_per_sec": 95.0}),
+               result_entry("ops", "sepia", {"size": "1x1"}, {"ops_per_sec": 80.0}),
+               result_entry("ops", "resize", {"size": "1x1"}, {"ops_per_sec": 1.0})]
+
+    comparisons = compare_with_baseline(current, baseline, tolerance=0.1)
+    assert [(item["id"], item["regression"]) for item in comparisons] == [
+        ("ops/crop/1x1", False), ("ops/sepia/1x1", True)]
+
+
+def test_ops_layer_runs_matrix():
+    """Проверяет прогон ops на маленькой матрице: RGBA в JPEG пропускается."""
+    results = bench_ops.run([(64, 48)], ["RGB", "RGBA"], ["jpeg", "png"], ["crop", "grayscale"],
+                            iterations=1, warmup=0)
+    assert [entry["id"] for entry in results] == [
+        "ops/crop/64x48/RGB/jpeg", "ops/grayscale/64x48/RGB/jpeg",
+        "ops/crop/64x48/RGB/png", "ops/grayscale/64x48/RGB/png",
+        "ops/crop/64x48/RGBA/png", "ops/grayscale/64x48/RGBA/png",
+    ]
+    assert all(entry["stats"]["ops_per_sec"] > 0 and entry["stats"]["peak_rss_mb"] > 0 for entry in results)
+
+
+def test_cli_writes_json_and_detects_regression(tmp_path):
+    """Проверяет, что CLI пишет JSON и возвращает 1 при регрессии относительно базовой линии."""
+    output = tmp_path / "current.json"
+    assert main(["ops", "--sizes", "32x32", "--modes", "L", "--formats", "png", "--operations", "crop",
+                 "--iterations", "1", "--output", str(output)]) == 0
+    document = json.loads(output.read_text())
+    assert document["meta"]["pillow"]
+    assert document["results"][0]["id"] == "ops/crop/32x32/L/png"
+
+    document["results"][0]["stats"]["ops_per_sec"] *= 1000
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps(document))
+    assert main(["ops", "--sizes", "32x32", "--modes", "L", "--formats", "png", "--operations", "crop",
+                 "--iterations", "1", "--output", str(output), "--baseline", str(baseline)]) == 1
@@ -0,0 +1,75 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.services.celery_service import dispatch_coalesced
+from app.services.coalescing import release_inflight, result_still_shared
+from app.services.storage import get_storage
+
+
+TEST_IMAGE_PATH = "./tests/test_image.jpg"
+
+
+def test_identical_dispatches_share_one_task(fake_redis):
+    """Проверяет, что повторная постановка с тем же ключом присоединяется к первой задаче."""
+    dispatch = MagicMock(side_effect=lambda options: MagicMock(id=options["task_id"]))
+
+    leader, coalesced = dispatch_coalesced("key", dispatch, {"queue": "images.fast"})
+    assert not coalesced
+    assert dispatch.call_args.args[0]["queue"] == "images.fast"
+
+    follower, coalesced = dispatch_coalesced("key", dispatch, {"queue": "images.fast"})
+    assert coalesced
+    assert follower.id == leader.id
+    assert dispatch.call_count == 1
+
+    release_inflight("key", leader.id)
+    _, coalesced = dispatch_coalesced("key", dispatch, {"queue": "images.fast"})
+    assert not coalesced and dispatch.call_count == 2
+
+
+def test_failed_dispatch_releases_inflight_key(fake_redis):
+    """Проверяет, что при ошибке постановки блокировка снимается и повтор ставит свою задачу."""
+    failing = MagicMock(side_effect=ConnectionError("broker is down"))
+    with pytest.raises(ConnectionError):
+        dispatch_coalesced("key", failing, {"queue": "images.fast"})
+    assert not fake_redis.keys("inflight:*")
+
+    dispatch = MagicMock(side_effect=lambda options: MagicMock(id=options["task_id"]))
+    task, coalesced = dispatch_coalesced("key", dispatch, {"queue": "images.fast"})
+    assert not coalesced
+    assert task.id == dispatch.call_args.args[0]["task_id"]
+
+
+def test_shared_result_is_kept_until_last_download(fake_redis):
+    """Проверяет счетчик скачиваний общего результата."""
+    dispatch = MagicMock(side_effect=lambda options: MagicMock(id=options["task_id"]))
+    leader, _ = dispatch_coalesced("key", dispatch)
+    dispatch_coalesced("key", dispatch)
+
+    assert result_still_shared(leader.id)
+    assert not result_still_shared(leader.id)
+
+
+def test_concurrent_uploads_enqueue_single_task(sync_client, fake_redis, monkeypatch):
+    """Проверяет, что одинаковые загрузки во время обработки дают один task_id и не оставляют исходников."""
+    monkeypatch.setattr("app.routers.image_processing.result_cache.enabled", False)
+    task = MagicMock()
+    task.name = "app.tasks.tasks.process_image_to_grayscale"
+
+    def fake_dispatch(input_filename, output_filename, **options):
+        task.id = options["routing"]["task_id"]
+        return task
+
+    with patch("app.routers.image_processing.dispatch_image_processing_task_grayscale",
+               side_effect=fake_dispatch) as dispatch:
+        responses = []
+        for _ in range(3):
+            with open(TEST_IMAGE_PATH, "rb") as image_file:
+                files = {"image": ("test_image.jpg", image_file, "image/jpeg")}
+                responses.append(sync_client.post("/grayscale", files=files).json())
+
+    assert dispatch.call_count == 1
+    assert len({response["task_id"] for response in responses}) == 1
+    assert [response["coalesced"] for response in responses] == [False, True, True]
+    assert len(list(get_storage().list("raw"))) == 1
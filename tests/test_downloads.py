@@ -0,0 +1,98 @@
+import io
+import time
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.services.retention import DOWNLOADED_RESULTS_KEY, expire_downloaded_results
+from app.services.storage import get_storage
+
+
+RESULT_BYTES = Path("./tests/test_image.jpg").read_bytes()
+
+
+@pytest.fixture
+def finished_task():
+    """Готовая задача с результатом result.jpg в хранилище."""
+    get_storage().save("raw", "input.jpg", io.BytesIO(RESULT_BYTES))
+    get_storage().save("processed", "result.jpg", io.BytesIO(RESULT_BYTES))
+    task_meta = {"task_id": "some_task", "status": "SUCCESS",
+                 "result": {"input": "input.jpg", "output": "result.jpg"}}
+    with patch("app.routers.image_processing.get_task_meta_async", AsyncMock(return_value=task_meta)):
+        yield task_meta
+
+
+def test_download_sets_etag_and_answers_not_modified(sync_client, finished_task):
+    """Проверяет Content-Type, ETag и ответ 304 на If-None-Match без удаления файлов."""
+    with patch("app.routers.image_processing.cleanup_files") as cleanup:
+        response = sync_client.get("/download-result/some_task")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/jpeg"
+        assert response.headers["accept-ranges"] == "bytes"
+        etag = response.headers["etag"]
+        assert cleanup.call_count == 1
+
+        response = sync_client.get("/download-result/some_task", headers={"If-None-Match": f'W/{etag}'})
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+        assert response.content == b""
+        assert cleanup.call_count == 1
+
+
+def test_download_range_keeps_files_for_resume(sync_client, finished_task):
+    """Проверяет ответ 206 на Range и то, что частичное скачивание не удаляет результат."""
+    with patch("app.routers.image_processing.cleanup_files") as cleanup:
+        response = sync_client.get("/download-result/some_task", headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 10-19/{len(RESULT_BYTES)}"
+    assert response.content == RESULT_BYTES[10:20]
+    assert not cleanup.called
+
+
+def test_transcoded_download_supports_suffix_range(sync_client, finished_task):
+    """Проверяет Range для перекодированного ответа и 416 для недостижимого диапазона."""
+    headers = {"Accept": "image/webp", "Range": "bytes=-5"}
+    with patch("app.routers.image_processing.cleanup_files"):
+        full = sync_client.get("/download-result/some_task", headers={"Accept": "image/webp"})
+    response = sync_client.get("/download-result/some_task", headers=headers)
+    assert response.status_code == 206
+    assert response.headers["content-type"] == "image/webp"
+    assert response.content == full.content[-5:]
+
+    response = sync_client.get("/download-result/some_task", headers={"Range": f"bytes={len(RESULT_BYTES)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(RESULT_BYTES)}"
+
+
+def test_grace_period_defers_result_deletion(sync_client, finished_task, fake_redis, monkeypatch):
+    """Проверяет, что с периодом хранения результат остается после скачивания и удаляется сборщиком."""
+    monkeypatch.setattr("app.routers.image_processing.DOWNLOAD_GRACE_SECONDS", 60)
+    response = sync_client.get("/download-result/some_task")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "public, max-age=60, immutable"
+
+    storage = get_storage()
+    assert not storage.exists("raw", "input.jpg")
+    assert storage.exists("processed", "result.jpg")
+    assert fake_redis.zscore(DOWNLOADED_RESULTS_KEY, "result.jpg") is not None
+
+    assert expire_downloaded_results(now=time.time())["removed"] == 0
+    assert expire_downloaded_results(now=time.time() + 120) == {"removed": 1, "more": False}
+    assert not storage.exists("processed", "result.jpg")
+
+
+@pytest.mark.parametrize("status, result, expected", [
+    ("PENDING", None, 202),
+    ("FAILURE", ValueError("broken image"), 500),
+])
+def test_download_reads_task_meta_without_async_result(sync_client, status, result, expected):
+    """Проверяет ответы для незавершенной и упавшей задачи без синхронного AsyncResult в цикле событий."""
+    task_meta = {"task_id": "some_task", "status": status, "result": result}
+    with patch("app.routers.image_processing.get_task_meta_async", AsyncMock(return_value=task_meta)), \
+            patch("app.core.celery_app.celery_app.AsyncResult", side_effect=AssertionError("blocking lookup")):
+        response = sync_client.get("/download-result/some_task")
+
+    assert response.status_code == expected
+    if status == "FAILURE":
+        assert response.json()["error"] == "ValueError: broken image"
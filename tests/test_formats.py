@@ -0,0 +1,105 @@
+import io
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from PIL import Image
+
+from app.services import image_processor
+from app.services.formats import negotiate_download_format, negotiate_output_format
+from app.services.storage import get_storage
+
+
+TEST_IMAGE_PATH = "./tests/test_image.jpg"
+
+
+def test_negotiate_output_format_prefers_configured_order():
+    """Проверяет выбор формата по Accept: только явно указанные типы, в порядке AUTO_OUTPUT_FORMATS."""
+    assert negotiate_output_format("image/avif,image/webp,image/*;q=0.8") == "webp"
+    assert negotiate_output_format("image/png") == "png"
+    assert negotiate_output_format("*/*") is None
+    assert negotiate_output_format(None) is None
+
+
+def test_negotiate_download_format():
+    """Проверяет, что файл перекодируется только если клиент не принимает его текущий тип."""
+    assert negotiate_download_format("out.jpg", "image/*") is None
+    assert negotiate_download_format("out.jpg", None) is None
+    assert negotiate_download_format("out.jpg", "image/webp") == "webp"
+    assert negotiate_download_format("out.webp", "image/jpeg, image/webp;q=0") == "jpeg"
+
+
+def test_run_pipeline_encodes_requested_format():
+    """Проверяет, что формат и настройки кодировщика берутся из encode_options."""
+    with open(TEST_IMAGE_PATH, "rb") as image_file:
+        get_storage().save("raw", "input.jpg", image_file)
+
+    encode_options = {"format": "webp", "quality": 40, "effort": 0}
+    assert image_processor.run_pipeline("input.jpg", "output.webp", [{"op": "grayscale"}],
+                                        encode_options=encode_options)
+
+    with get_storage().open("processed", "output.webp") as output_file, Image.open(output_file) as result:
+        assert result.format == "WEBP"
+
+
+def test_quality_reduces_jpeg_size():
+    """Проверяет, что quality действительно передается кодировщику JPEG."""
+    with Image.open(TEST_IMAGE_PATH) as img:
+        img.load()
+        sizes = []
+        for quality in (95, 30):
+            buffer = io.BytesIO()
+            image_processor.encode_image(img, buffer, "JPEG", {"quality": quality})
+            sizes.append(buffer.tell())
+    assert sizes[1] < sizes[0]
+
+
+@pytest.mark.asyncio
+async def test_output_format_sets_extension_and_options(sync_client, mock_celery_tasks: MagicMock):
+    """Проверяет, что ручка передает настройки кодирования и меняет расширение результата."""
+    with patch("app.routers.image_processing.dispatch_image_processing_task_grayscale") as mock_dispatch:
+        mock_dispatch.return_value.id = "fake_task_id"
+        mock_dispatch.return_value.name = "task.image_processing.grayscale"
+        with open(TEST_IMAGE_PATH, "rb") as image_file:
+            files = {"image": ("test_image.jpg", image_file, "image/jpeg")}
+            data = {"output_format": "auto", "quality": 70, "effort": 9}
+            response = sync_client.post("/grayscale", data=data, files=files,
+                                        headers={"Accept": "image/webp,*/*"})
+
+    assert response.status_code == 200
+    assert response.json()["output_format"] == "webp"
+    args, kwargs = mock_dispatch.call_args
+    assert args[1].endswith(".webp")
+    assert kwargs["encode_options"] == {"format": "webp", "quality": 70, "effort": 9}
+
+
+@pytest.mark.asyncio
+async def test_unknown_output_format_rejected(sync_client, mock_celery_tasks: MagicMock):
+    """Проверяет, что неизвестный формат отклоняется с 422."""
+    mock_celery_tasks.reset_mock()
+    with open(TEST_IMAGE_PATH, "rb") as image_file:
+        files = {"image": ("test_image.jpg", image_file, "image/jpeg")}
+        response = sync_client.post("/sepia", data={"output_format": "gif"}, files=files)
+
+    assert response.status_code == 422
+    assert "Unknown output format" in response.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_download_transcodes_to_accepted_format(sync_client):
+    """Проверяет, что /download-result перекодирует результат, если клиент не принимает его тип."""
+    with open(TEST_IMAGE_PATH, "rb") as image_file:
+        get_storage().save("processed", "result.jpg", image_file)
+
+    task_meta = {"task_id": "some_task", "status": "SUCCESS",
+                 "result": {"input": "input.jpg", "output": "result.jpg"}}
+
+    with patch("app.routers.image_processing.get_task_meta_async", AsyncMock(return_value=task_meta)), \
+            patch("app.routers.image_processing.cleanup_files"):
+        response = sync_client.get("/download-result/some_task", headers={"Accept": "image/webp"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert "Accept" in response.headers["vary"]
+    assert 'filename="result.webp"' in response.headers["content-disposition"]
+    with Image.open(io.BytesIO(response.content)) as result:
+        assert result.format == "WEBP"
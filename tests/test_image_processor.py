@@ -0,0 +1,86 @@
+from PIL import Image
+
+from app.services import image_processor
+from app.services.storage import get_storage
+
+
+TEST_IMAGE_PATH = "./tests/test_image.jpg"
+
+
+def test_run_pipeline_chains_operations():
+    """Проверяет, что пайплайн применяет операции по порядку и сохраняет один результат."""
+    with open(TEST_IMAGE_PATH, "rb") as image_file:
+        get_storage().save("raw", "input.jpg", image_file)
+    operations = [
+        {"op": "crop", "left": 0, "top": 0, "right": 100, "bottom": 80},
+        {"op": "resize", "width": 50, "height": 40},
+        {"op": "grayscale"},
+    ]
+
+    assert image_processor.run_pipeline("input.jpg", "output.jpg", operations)
+
+    with get_storage().open("processed", "output.jpg") as output_file, Image.open(output_file) as result:
+        assert result.size == (50, 40)
+        assert result.mode == "L"
+
+
+def test_run_pipeline_missing_file():
+    """Проверяет, что отсутствующий входной файл приводит к False, а не к исключению."""
+    assert not image_processor.run_pipeline("missing.jpg", "output.jpg", [{"op": "grayscale"}])
+
+
+def test_resize_uses_jpeg_draft(monkeypatch):
+    """Проверяет, что сильное уменьшение JPEG в задаче (resize_image -> apply_operations) декодирует уменьшенный кадр."""
+    decoded = []
+    monkeypatch.setattr(image_processor, "count_megapixels", lambda width, height: decoded.append((width, height)))
+    with open(TEST_IMAGE_PATH, "rb") as image_file:
+        get_storage().save("raw", "input.jpg", image_file)
+
+    assert image_processor.resize_image("input.jpg", "output.jpg", (64, 64))
+
+    with get_storage().open("processed", "output.jpg") as output_file, Image.open(output_file) as result:
+        assert result.size == (64, 64)
+    # Декодер уменьшил 1280x1280 как минимум вдвое, но не ниже 64 * reducing_gap
+    (width, height), = decoded
+    assert 64 * image_processor.RESIZE_REDUCING_GAP <= width < 1280
+
+    with Image.open(TEST_IMAGE_PATH) as img:
+        image_processor.apply_operations(img, [{"op": "resize", "width": 64, "height": 64}, {"op": "grayscale"}])
+        assert img.width < 1280
+
+
+def test_crop_before_resize_is_rescaled_for_draft():
+    """Проверяет, что crop перед сильным resize выполняется на уменьшенном при декодировании кадре."""
+    operations = [
+        {"op": "crop", "left": 0, "top": 0, "right": 1280, "bottom": 640},
+        {"op": "resize", "width": 32, "height": 16},
+    ]
+    with Image.open(TEST_IMAGE_PATH) as img:
+        result = image_processor.apply_operations(img, operations)
+
+        assert result.size == (32, 16)
+        assert img.width < 1280
+
+
+def test_sepia_matches_blend_reference():
+    """Проверяет, что матричная сепия совпадает со старой схемой grayscale + blend (с точностью до округления)."""
+    from PIL import ImageChops
+
+    with Image.open(TEST_IMAGE_PATH) as img:
+        img = img.convert("RGB")
+        reference = Image.blend(Image.new("RGB", img.size, (255, 200, 150)),
+                                img.convert("L").convert("RGB"), alpha=0.6)
+
+        for source in (img, img.convert("L")):
+            difference = ImageChops.difference(reference, image_processor.to_sepia(source))
+            assert all(high <= 1 for _, high in difference.getextrema())
+
+
+def test_custom_color_matrix_in_pipeline():
+    """Проверяет применение пользовательской матрицы 3x4 (перестановка каналов R и B)."""
+    swap_red_blue = [[0, 0, 1, 0], [0, 1, 0, 0], [1, 0, 0, 0]]
+    img = Image.new("RGB", (4, 4), (10, 20, 30))
+
+    result = image_processor.apply_operations(img, [{"op": "color_matrix", "matrix": swap_red_blue}])
+
+    assert result.getpixel((0, 0)) == (30, 20, 10)
@@ -0,0 +1,79 @@
+import io
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from PIL import Image
+
+from app.core.celery_app import QUEUE_FAST
+from app.services.blob_store import get_blob, put_blob
+
+
+def _small_jpeg() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), "blue").save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def test_inline_request_stores_blob_and_skips_storage(sync_client, fake_redis, data_dir):
+    """Проверяет, что маленький файл кладется в Redis и ставится задача быстрого пути без записи на диск."""
+    task = MagicMock()
+    task.id = "inline_task_id"
+    task.name = "app.tasks.tasks.process_image_inline"
+    data = _small_jpeg()
+
+    with patch("app.routers.image_processing.dispatch_image_processing_task_inline",
+               return_value=task) as dispatch:
+        files = {"image": ("small.jpg", io.BytesIO(data), "image/jpeg")}
+        response = sync_client.post("/sepia", data={"priority": "high"}, files=files)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["inline"] is True
+    assert body["queue"] == QUEUE_FAST
+    assert body["task_id"] == "inline_task_id"
+
+    input_key, output_filename, process_type, params = dispatch.call_args.args
+    assert process_type == "sepia"
+    assert output_filename.endswith(".jpg")
+    assert get_blob(input_key) == data
+    assert dispatch.call_args.kwargs["routing"] == {"queue": QUEUE_FAST, "priority": 0}
+    assert not list(data_dir.rglob("*.*"))
+
+
+def test_inline_task_processes_in_memory(fake_redis, data_dir):
+    """Проверяет задачу быстрого пути: результат кладется в Redis, исходник остается до скачивания."""
+    from app.tasks.tasks import process_image_inline
+
+    input_key = put_blob(_small_jpeg())
+    result = process_image_inline.apply(
+        args=(input_key, "result.png", "pipeline",
+              [{"op": "crop", "left": 0, "top": 0, "right": 32, "bottom": 16}, {"op": "grayscale"}])).get()
+
+    assert result["inline"] is True
+    assert result["operations"] == ["crop", "grayscale"]
+    assert get_blob(input_key) is not None
+    with Image.open(io.BytesIO(get_blob(result["output_key"]))) as output:
+        assert output.format == "PNG"
+        assert output.size == (32, 16)
+        assert output.mode == "L"
+    assert not list(data_dir.rglob("*.*"))
+
+
+def test_inline_download_serves_blob_and_transcodes(sync_client, fake_redis):
+    """Проверяет скачивание результата быстрого пути из Redis с перекодированием по Accept и удалением блобов."""
+    input_key = put_blob(_small_jpeg())
+    output_key = put_blob(_small_jpeg())
+    task_meta = {"task_id": "some_task", "status": "SUCCESS",
+                 "result": {"status": "COMPLETED", "inline": True, "input_key": input_key,
+                            "output_key": output_key, "output": "result.jpg"}}
+
+    with patch("app.routers.image_processing.get_task_meta_async", AsyncMock(return_value=task_meta)):
+        response = sync_client.get("/download-result/some_task", headers={"Accept": "image/webp"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert 'filename="result.webp"' in response.headers["content-disposition"]
+    assert get_blob(input_key) is None and get_blob(output_key) is None
+
+    with patch("app.routers.image_processing.get_task_meta_async", AsyncMock(return_value=task_meta)):
+        response = sync_client.get("/download-result/some_task")
+    assert response.status_code == 410
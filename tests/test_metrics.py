@@ -0,0 +1,77 @@
+from unittest.mock import MagicMock
+
+import pytest
+from PIL import Image
+from prometheus_client import REGISTRY
+
+from app.core.metrics import operation_for_task, set_operation
+from app.services import image_processor
+from app.services.storage import get_storage
+
+
+TEST_IMAGE_PATH = "./tests/test_image.jpg"
+
+
+def _sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_operation_for_task():
+    """Проверяет имя операции для меток по имени задачи Celery."""
+    assert operation_for_task("app.tasks.tasks.process_image_to_crop") == "crop"
+    assert operation_for_task("app.tasks.tasks.process_image_pipeline") == "pipeline"
+
+
+def test_pipeline_records_stages_and_megapixels():
+    """Проверяет замеры decode/transform/encode, мегапикселей и выходных байт; crop PNG декодирует только нужные строки."""
+    with get_storage().writer("raw", "input.png") as target:
+        Image.new("RGB", (1000, 1000), "red").save(target, format="PNG")
+    set_operation("metrics_test")
+    before = {stage: _sample("image_stage_duration_seconds_count", operation="metrics_test", stage=stage)
+              for stage in ("decode", "transform", "encode")}
+    megapixels = _sample("image_megapixels_total", operation="metrics_test")
+    bytes_out = _sample("image_bytes_total", operation="metrics_test", direction="out")
+
+    try:
+        assert image_processor.run_pipeline("input.png", "output.png",
+                                            [{"op": "crop", "left": 0, "top": 0, "right": 100, "bottom": 100}])
+    finally:
+        set_operation(None)
+
+    for stage, count in before.items():
+        assert _sample("image_stage_duration_seconds_count", operation="metrics_test", stage=stage) == count + 1
+    assert _sample("image_megapixels_total", operation="metrics_test") - megapixels == pytest.approx(0.1)
+    assert _sample("image_bytes_total", operation="metrics_test", direction="out") > bytes_out
+
+
+def test_task_signals_count_state_and_duration(fake_redis):
+    """Проверяет, что выполнение задачи учитывается в счетчике состояний и гистограмме этапа task."""
+    from app.tasks.tasks import process_image_to_grayscale
+
+    with open(TEST_IMAGE_PATH, "rb") as image_file:
+        get_storage().save("raw", "input.jpg", image_file)
+    succeeded = _sample("image_tasks_total", operation="grayscale", state="success")
+    durations = _sample("image_stage_duration_seconds_count", operation="grayscale", stage="task")
+
+    process_image_to_grayscale.apply(args=("input.jpg", "output.jpg"))
+
+    assert _sample("image_tasks_total", operation="grayscale", state="success") == succeeded + 1
+    assert _sample("image_stage_duration_seconds_count", operation="grayscale", stage="task") == durations + 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_exposes_handler_and_upload_metrics(sync_client, mock_celery_tasks: MagicMock):
+    """Проверяет /metrics: длительность обработчика по шаблону маршрута и этап загрузки."""
+    with open(TEST_IMAGE_PATH, "rb") as image_file:
+        files = {"image": ("test_image.jpg", image_file, "image/jpeg")}
+        response = sync_client.post("/crop", data={"left": 0, "top": 0, "right": 10, "bottom": 10}, files=files)
+    assert response.status_code == 200
+
+    response = sync_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'api_request_duration_seconds_count{handler="/crop",method="POST",status="200"}' in body
+    assert 'image_stage_duration_seconds_count{operation="crop",stage="upload"}' in body
+    assert 'image_bytes_total{direction="in",operation="crop"}' in body
+    assert "celery_queue_depth" in body
@@ -0,0 +1,89 @@
+import pytest
+from PIL import Image, ImageChops
+
+from app.services import image_processor, parallel
+from app.services.parallel import (
+    parallel_engine,
+    parallel_workers,
+    resize_in_bands,
+    run_pointwise_in_bands,
+    set_task_queue,
+)
+
+
+TEST_IMAGE_PATH = "./tests/test_image.jpg"
+
+
+def _reference_image() -> Image.Image:
+    with Image.open(TEST_IMAGE_PATH) as img:
+        return img.convert("RGB")
+
+
+def _max_difference(a: Image.Image, b: Image.Image) -> int:
+    return max(high for _, high in ImageChops.difference(a, b).getextrema())
+
+
+@pytest.fixture
+def task_queue():
+    """Выполнение внутри задачи очереди images.heavy; пул процессов закрывается после теста."""
+    set_task_queue("images.heavy")
+    yield
+    set_task_queue(None)
+    if parallel._pool is not None:
+        parallel._pool.shutdown()
+        parallel._pool = None
+
+
+def test_parallel_workers_follow_queue_depth(monkeypatch, task_queue):
+    """Проверяет выбор параллелизма: мелкие изображения, короткая, длинная и неизвестная очередь."""
+    monkeypatch.setattr(parallel, "TILED_THRESHOLD_PIXELS", 100)
+    monkeypatch.setattr(parallel, "PARALLEL_MAX_WORKERS", 6)
+    depth = {"images.heavy": 0}
+    monkeypatch.setattr("app.core.metrics.queue_depth", lambda queue: depth.get(queue))
+
+    assert parallel_workers(99) == 1
+    assert parallel_workers(1000) == 6
+
+    depth["images.heavy"] = 50
+    # Длина очереди читается один раз на задачу
+    assert parallel_workers(1000) == 6
+    set_task_queue("images.heavy")
+    assert parallel_workers(1000) == 1
+
+    set_task_queue("images.unknown")
+    assert parallel_workers(1000) == parallel.TILE_THREADS
+    set_task_queue(None)
+    assert parallel_workers(1000) == parallel.TILE_THREADS
+
+
+def test_thread_resize_bands_match_full_resize():
+    """Проверяет, что resize полосами в потоках совпадает с обычным resize (без швов на стыках)."""
+    img = _reference_image()
+
+    banded = resize_in_bands(img, 500, 333, Image.Resampling.LANCZOS, None, workers=4)
+
+    assert parallel_engine() == "threads"
+    assert banded.size == (500, 333)
+    assert _max_difference(banded, img.resize((500, 333), Image.Resampling.LANCZOS)) <= 1
+
+
+def test_process_engine_matches_direct_operations(task_queue):
+    """Проверяет попиксельную операцию и resize в пуле процессов над общей памятью."""
+    img = _reference_image()
+    assert parallel_engine() == "processes"
+
+    sepia = run_pointwise_in_bands(img, {"op": "sepia"}, image_processor.to_sepia, workers=3)
+    assert ImageChops.difference(sepia, image_processor.to_sepia(img)).getbbox() is None
+
+    gray = run_pointwise_in_bands(img, {"op": "grayscale"}, image_processor.to_grayscale, workers=3)
+    assert gray.mode == "L"
+    assert ImageChops.difference(gray, img.convert("L")).getbbox() is None
+
+    resized = resize_in_bands(img, 640, 427, Image.Resampling.BICUBIC, None, workers=3)
+    assert _max_difference(resized, img.resize((640, 427), Image.Resampling.BICUBIC)) <= 1
+
+
+def test_daemon_process_falls_back_to_threads(monkeypatch, task_queue):
+    """Проверяет, что в дочернем процессе prefork-пула (демоне) используются потоки."""
+    monkeypatch.setattr(parallel.current_process(), "daemon", True, raising=False)
+    assert parallel_engine() == "threads"
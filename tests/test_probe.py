@@ -0,0 +1,91 @@
+import io
+
+import pytest
+from PIL import Image
+
+from app.core.celery_app import QUEUE_HUGE, select_queue
+from app.services.probe import ImageProbeError, check_probe, decoded_frame, probe_image
+from app.services.storage import get_storage
+from app.tasks.tasks import process_image_to_crop, process_image_to_resize
+
+
+def _encoded(image: Image.Image, image_format: str) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("content, status", [
+    (b"\xff\xd8\xff\xe0 definitely not a jpeg", 400),
+    (_encoded(Image.new("RGB", (32, 32)), "GIF"), 415),
+    (_encoded(Image.new("1", (70000, 1)), "PNG"), 413),
+])
+def test_bad_uploads_are_rejected_before_save(sync_client, mock_celery_tasks, data_dir, content, status):
+    """Проверяет, что битые, подмененные и слишком большие файлы отклоняются до сохранения и постановки задачи."""
+    files = {"image": ("photo.jpg", io.BytesIO(content), "image/jpeg")}
+    response = sync_client.post("/crop", data={"left": 0, "top": 0, "right": 10, "bottom": 10}, files=files)
+
+    assert response.status_code == status
+    assert not mock_celery_tasks.called
+    assert not list(data_dir.rglob("*.*"))
+
+
+def test_probe_metadata_is_passed_to_task(sync_client, mock_celery_tasks):
+    """Проверяет, что метаданные пробы уходят в задачу вместе с параметрами."""
+    with open("./tests/test_image.jpg", "rb") as image_file:
+        files = {"image": ("test_image.jpg", image_file, "image/png")}
+        response = sync_client.post("/crop", data={"left": 0, "top": 0, "right": 10, "bottom": 10},
+                                    files=files)
+
+    assert response.status_code == 200
+    source = mock_celery_tasks.call_args.kwargs["source"]
+    with Image.open("./tests/test_image.jpg") as image:
+        assert (source["format"], source["width"], source["height"]) == ("JPEG", *image.size)
+    assert source["pixels"] == source["width"] * source["height"]
+
+
+def test_probe_reads_header_only():
+    """Проверяет, что проба не декодирует пиксели и восстанавливает позицию потока."""
+    stream = io.BytesIO(_encoded(Image.new("RGB", (640, 480)), "PNG"))
+    stream.seek(0)
+    metadata = probe_image(stream)
+    assert metadata["format"] == "PNG" and metadata["pixels"] == 640 * 480
+    assert stream.tell() == 0
+
+
+def test_memory_budget_follows_what_the_worker_decodes():
+    """Проверяет 413 по бюджету памяти: draft освобождает от проверки только JPEG, crop — только PNG без interlace."""
+    jpeg = {"format": "JPEG", "width": 20000, "height": 20000, "mode": "RGB", "pixels": 400_000_000,
+            "decode_bytes": 3_200_000_000}
+    png = dict(jpeg, format="PNG")
+    resize = {"op": "resize", "width": 100, "height": 100}
+    crop = {"op": "crop", "left": 0, "top": 0, "right": 20000, "bottom": 1000}
+
+    for metadata, operations in ((jpeg, [{"op": "grayscale"}]), (png, [resize]), (jpeg, [crop]),
+                                 (dict(png, interlace=True), [crop])):
+        with pytest.raises(ImageProbeError) as error:
+            check_probe(metadata, operations, memory_limit=1024 ** 3)
+        assert error.value.status_code == 413
+
+    # JPEG в draft-режиме распаковывается в 8 раз меньше по каждой стороне
+    assert decoded_frame(jpeg, [resize]) == (2500, 2500)
+    check_probe(jpeg, [resize], memory_limit=1024 ** 3)
+    check_probe(jpeg, [crop, dict(resize, width=10, height=10)], memory_limit=1024 ** 3)
+    check_probe(png, [crop], memory_limit=1024 ** 3)
+
+
+def test_resize_and_crop_tasks_check_source_with_their_params():
+    """Проверяет, что задачи resize и crop с метаданными пробы проверяют кадр по своим параметрам и выполняются."""
+    jpeg, png = _encoded(Image.new("RGB", (640, 480)), "JPEG"), _encoded(Image.new("RGB", (640, 480)), "PNG")
+    get_storage().save("raw", "input.jpg", io.BytesIO(jpeg))
+    get_storage().save("raw", "input.png", io.BytesIO(png))
+
+    result = process_image_to_resize.run("input.jpg", "resized.jpg", 64, 48, source=probe_image(io.BytesIO(jpeg)))
+    assert result["size"] == "64x48"
+    result = process_image_to_crop.run("input.png", "cropped.png", 0, 0, 100, 50, source=probe_image(io.BytesIO(png)))
+    assert result["crop_box"] == (0, 0, 100, 50)
+
+
+def test_huge_pixel_count_routes_to_huge_queue():
+    """Проверяет, что маленький файл с огромным числом пикселей идет в очередь огромных изображений."""
+    assert select_queue("crop", 100 * 1024, pixels=60_000_000) == QUEUE_HUGE
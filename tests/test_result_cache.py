@@ -0,0 +1,85 @@
+import hashlib
+import io
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.services.result_cache import ResultCache, build_cache_key
+from app.services.storage import get_storage
+
+
+TEST_IMAGE_PATH = "./tests/test_image.jpg"
+
+
+def test_cache_key_depends_on_params():
+    """Проверяет, что ключ зависит от параметров, но не от их порядка."""
+    key = build_cache_key("abc", "resize", {"width": 10, "height": 20}, ".jpg")
+
+    assert key == build_cache_key("abc", "resize", {"height": 20, "width": 10}, ".JPG")
+    assert key != build_cache_key("abc", "resize", {"width": 20, "height": 10}, ".jpg")
+    assert key != build_cache_key("abd", "resize", {"width": 10, "height": 20}, ".jpg")
+
+
+def test_lru_eviction(data_dir):
+    """Проверяет, что при превышении лимита вытесняется наименее недавно использованная запись."""
+    cache = ResultCache(max_bytes=300)
+    for name in ("a", "b", "c"):
+        get_storage().save("processed", name, io.BytesIO(b"x" * 100))
+        cache.store(name, name)
+        os.utime(data_dir / "cache" / name, (0, {"a": 1, "b": 2, "c": 3}[name]))
+
+    # Обращение к "a" делает ее самой свежей, вытесняться должна "b"
+    assert cache.lookup("a")
+    cache.max_bytes = 250
+    assert cache.evict() == 1
+
+    assert not cache.lookup("b")
+    assert cache.lookup("c")
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_store_lists_cache_only_to_resync_or_evict(data_dir):
+    """Проверяет, что запись в кэш не перечисляет область каждый раз, а вытеснение идет до LOW_WATER."""
+    cache = ResultCache(max_bytes=1000)
+    listings = []
+    entries = cache._entries
+    cache._entries = lambda: listings.append(1) or entries()
+    for index in range(9):
+        get_storage().save("processed", f"result_{index:02d}", io.BytesIO(b"x" * 100))
+        cache.store(f"key_{index:02d}", f"result_{index:02d}")
+    assert len(listings) == 1
+
+    for index in range(9, 11):
+        get_storage().save("processed", f"result_{index:02d}", io.BytesIO(b"x" * 100))
+        cache.store(f"key_{index:02d}", f"result_{index:02d}")
+    assert len(listings) == 2
+    assert cache.stats()["size_bytes"] == 900
+
+
+@pytest.mark.asyncio
+async def test_cache_hit_skips_dispatch(sync_client, mock_celery_tasks: MagicMock, isolated_result_cache):
+    """Проверяет, что при попадании в кэш задача не ставится в очередь, а результат готов сразу."""
+    with open(TEST_IMAGE_PATH, "rb") as image_file:
+        input_hash = hashlib.sha256(image_file.read()).hexdigest()
+    params = {"left": 10, "top": 10, "right": 100, "bottom": 100}
+    get_storage().save("processed", "cached.jpg", io.BytesIO(b"cached result"))
+    isolated_result_cache.store(build_cache_key(input_hash, "crop", params, ".jpg"), "cached.jpg")
+
+    mock_celery_tasks.reset_mock()
+    with patch("app.routers.image_processing.store_completed_task_result",
+               return_value="cached_task_id") as mock_store:
+        with open(TEST_IMAGE_PATH, "rb") as image_file:
+            files = {"image": ("test_image.jpg", image_file, "image/jpeg")}
+            response = sync_client.post("/crop", data=params, files=files)
+
+    assert response.status_code == 200
+    assert response.json()["task_id"] == "cached_task_id"
+    assert response.json()["cached"] is True
+    mock_celery_tasks.assert_not_called()
+
+    result = mock_store.call_args.args[0]
+    with get_storage().open("processed", result["output"]) as output_file:
+        assert output_file.read() == b"cached result"
+    assert not get_storage().exists("raw", result["input"])
@@ -0,0 +1,72 @@
+import io
+import os
+import time
+from unittest.mock import patch
+
+from app.services.retention import enforce_disk_high_water, sweep_expired, sweep_temporary_files
+from app.services.storage import get_storage
+
+
+def _put(area: str, name: str, size: int, mtime: float) -> None:
+    storage = get_storage()
+    storage.save(area, name, io.BytesIO(b"x" * size))
+    os.utime(storage.local_path(area, name), (mtime, mtime))
+
+
+def test_sweep_expired_in_bounded_batches():
+    """Проверяет удаление файлов старше TTL порциями, сохранность свежих файлов и кэша."""
+    _put("raw", "old1_raw.jpg", 10, 100)
+    _put("processed", "old2_grayscale.jpg", 10, 100)
+    _put("processed", "new_grayscale.jpg", 10, 1000)
+    _put("cache", "oldcachekey", 10, 100)
+
+    first = sweep_expired(ttl=500, batch_size=1, now=1000)
+    assert first == {"removed": 1, "freed_bytes": 10, "more": True}
+    second = sweep_expired(ttl=500, batch_size=10, now=1000)
+    assert second == {"removed": 1, "freed_bytes": 10, "more": False}
+
+    storage = get_storage()
+    assert [name for name, _, _ in storage.list("processed")] == ["new_grayscale.jpg"]
+    assert not list(storage.list("raw"))
+    assert storage.exists("cache", "oldcachekey")
+
+
+def test_orphaned_temporary_files_are_swept_after_ttl():
+    """Проверяет, что временный файл прерванной записи не виден в области и удаляется сборщиком после TTL."""
+    storage = get_storage()
+    _put("processed", "kept_grayscale.jpg", 10, time.time())
+    orphan = storage.local_path("processed", "kept_grayscale.jpg").with_name(".crashed_grayscale.jpg.0f.tmp")
+    orphan.write_bytes(b"x" * 20)
+
+    assert [name for name, _, _ in storage.list("processed")] == ["kept_grayscale.jpg"]
+    assert sweep_temporary_files(ttl=500)["removed"] == 0
+    assert sweep_temporary_files(ttl=500, now=time.time() + 1000) == {"removed": 1, "freed_bytes": 20}
+    assert not orphan.exists()
+    assert storage.exists("processed", "kept_grayscale.jpg")
+
+
+def test_disk_high_water_evicts_oldest_first():
+    """Проверяет, что при заполнении тома выше порога удаляются самые старые файлы до нижнего порога."""
+    _put("cache", "cachekey", 10, 1)
+    _put("raw", "b_raw.jpg", 10, 2)
+    _put("processed", "c_sepia.jpg", 10, 3)
+
+    storage = get_storage()
+    with patch.object(storage, "disk_usage", return_value=(95, 100)):
+        result = enforce_disk_high_water(high_water=0.9, low_water=0.8)
+    assert result == {"removed": 2, "freed_bytes": 20, "more": False}
+    assert not storage.exists("cache", "cachekey") and not storage.exists("raw", "b_raw.jpg")
+    assert storage.exists("processed", "c_sepia.jpg")
+
+    with patch.object(storage, "disk_usage", return_value=(50, 100)):
+        assert enforce_disk_high_water(high_water=0.9, low_water=0.8)["removed"] == 0
+
+
+def test_sweep_task_requeues_while_backlog_remains():
+    """Проверяет, что задача сборщика сразу ставит следующий проход, если файлы остались."""
+    from app.tasks.tasks import sweep_expired_files
+
+    with patch("app.tasks.tasks.sweep_storage", return_value={"more": True}), \
+            patch.object(sweep_expired_files, "apply_async") as requeue:
+        sweep_expired_files.apply()
+    assert requeue.call_args.kwargs == {"priority": 9}
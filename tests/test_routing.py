@@ -0,0 +1,92 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.core import celery_app as celery_app_module
+from app.core.celery_app import (
+    QUEUE_FAST,
+    QUEUE_HEAVY,
+    QUEUE_HUGE,
+    TASK_PRIORITIES,
+    celery_app,
+    select_queue,
+    task_routing,
+)
+
+
+TEST_IMAGE_PATH = "./tests/test_image.jpg"
+
+
+def test_select_queue_by_cost_class():
+    """Проверяет, что дешевые операции идут в быструю очередь, тяжелые — в отдельную."""
+    assert select_queue("crop") == QUEUE_FAST
+    assert select_queue("grayscale") == QUEUE_FAST
+    assert select_queue("sepia") == QUEUE_HEAVY
+    assert select_queue("pipeline", operations=[{"op": "crop"}, {"op": "grayscale"}]) == QUEUE_FAST
+    assert select_queue("pipeline", operations=[{"op": "crop"}, {"op": "sepia"}]) == QUEUE_HEAVY
+
+
+def test_select_queue_huge_input(monkeypatch):
+    """Проверяет, что огромные входные файлы уходят в отдельную очередь независимо от операции."""
+    monkeypatch.setattr(celery_app_module, "HUGE_INPUT_BYTES", 1000)
+    assert select_queue("crop", input_size=999) == QUEUE_FAST
+    assert select_queue("crop", input_size=1000) == QUEUE_HUGE
+
+
+def test_static_routes_match_cost_classes():
+    """Проверяет, что задачи, поставленные без явной очереди, тоже попадают в свою очередь."""
+    route = celery_app.amqp.router.route({}, "app.tasks.tasks.process_image_to_crop")
+    assert route["queue"].name == QUEUE_FAST
+    route = celery_app.amqp.router.route({}, "app.tasks.tasks.process_image_to_sepia")
+    assert route["queue"].name == QUEUE_HEAVY
+
+
+def test_task_routing_priority():
+    """Проверяет перевод приоритета запроса в приоритет брокера (в Redis меньше — раньше)."""
+    assert task_routing("sepia", priority="high") == {"queue": QUEUE_HEAVY, "priority": 0}
+    assert TASK_PRIORITIES["high"] < TASK_PRIORITIES["normal"] < TASK_PRIORITIES["low"]
+
+
+@pytest.mark.asyncio
+async def test_endpoint_passes_routing(sync_client, mock_celery_tasks: MagicMock):
+    """Проверяет, что ручка передает диспетчеру очередь и приоритет из запроса."""
+    mock_celery_tasks.reset_mock()
+    with open(TEST_IMAGE_PATH, "rb") as image_file:
+        files = {"image": ("test_image.jpg", image_file, "image/jpeg")}
+        data = {"left": 0, "top": 0, "right": 10, "bottom": 10, "priority": "high"}
+        response = sync_client.post("/crop", data=data, files=files)
+
+    assert response.status_code == 200
+    assert response.json()["queue"] == QUEUE_FAST
+    args, kwargs = mock_celery_tasks.call_args
+    assert kwargs["routing"]["queue"] == QUEUE_FAST
+    assert kwargs["routing"]["priority"] == TASK_PRIORITIES["high"]
+
+
+@pytest.mark.asyncio
+async def test_endpoint_rejects_unknown_priority(sync_client, mock_celery_tasks: MagicMock):
+    """Проверяет, что неизвестный приоритет отклоняется с 422."""
+    with open(TEST_IMAGE_PATH, "rb") as image_file:
+        files = {"image": ("test_image.jpg", image_file, "image/jpeg")}
+        response = sync_client.post("/grayscale", data={"priority": "urgent"}, files=files)
+
+    assert response.status_code == 422
+
+
+def test_batch_routes_each_item_by_size(monkeypatch):
+    """Проверяет, что в пакете очередь выбирается для каждого элемента по его размеру."""
+    from app.services import celery_service
+
+    monkeypatch.setattr(celery_app_module, "HUGE_INPUT_BYTES", 1000)
+    items = [
+        {"input": "a_raw.jpg", "output": "a_grayscale.jpg", "size": 10},
+        {"input": "b_raw.jpg", "output": "b_grayscale.jpg", "size": 5000},
+    ]
+    with patch.object(celery_service, "group") as mock_group, \
+            patch.object(celery_service.GroupResult, "save"):
+        mock_group.return_value.apply_async.return_value.results = [MagicMock(id="t1"), MagicMock(id="t2")]
+        celery_service.dispatch_batch("grayscale", items, {}, priority="low")
+
+    signatures = mock_group.call_args.args[0]
+    assert [signature.options["queue"] for signature in signatures] == [QUEUE_FAST, QUEUE_HUGE]
+    assert all(signature.options["priority"] == TASK_PRIORITIES["low"] for signature in signatures)
@@ -0,0 +1,65 @@
+import json
+import subprocess
+import sys
+from unittest.mock import patch
+
+from app.core.celery_app import celery_app, QUEUE_FAST
+from app.services import celery_service
+
+# Цель по времени импорта приложения API (холодный старт uvicorn и каждой новой реплики).
+# Сейчас около 1 с, почти все — FastAPI/pydantic; запас на медленные машины CI.
+API_IMPORT_BUDGET_SECONDS = 3.0
+
+_MEASURE_IMPORT = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+seconds = time.perf_counter() - started
+from celery.signals import before_task_publish
+print(json.dumps({"seconds": seconds,
+                  "modules": [name for name in ("PIL", "app.tasks.tasks", "app.services.image_processor")
+                              if name in sys.modules],
+                  "publish_receivers": [receiver.__name__ for receiver in before_task_publish._live_receivers(None)]}))
+"""
+
+
+def test_api_import_is_lightweight():
+    """Проверяет, что импорт приложения API не тянет Pillow и модуль задач и укладывается в бюджет времени."""
+    output = subprocess.run([sys.executable, "-c", _MEASURE_IMPORT], capture_output=True, text=True,
+                            check=True).stdout
+    measured = json.loads(output.strip().splitlines()[-1])
+    assert measured["modules"] == []
+    assert measured["seconds"] < API_IMPORT_BUDGET_SECONDS
+
+
+def test_api_stamps_enqueue_time():
+    """Проверяет, что после импорта приложения API подключена отметка времени постановки (для queue_wait)."""
+    output = subprocess.run([sys.executable, "-c", _MEASURE_IMPORT], capture_output=True, text=True,
+                            check=True).stdout
+    measured = json.loads(output.strip().splitlines()[-1])
+    assert measured["publish_receivers"] == ["stamp_enqueue_time"]
+
+    from app.core.celery_app import stamp_enqueue_time
+
+    headers = {}
+    stamp_enqueue_time(headers=headers)
+    assert headers["enqueued_at"] > 0
+
+
+def test_task_names_match_registered_tasks():
+    """Проверяет, что имена, по которым API ставит задачи, зарегистрированы в воркере."""
+    import app.tasks.tasks  # noqa: F401
+
+    names = {*celery_service.TASK_NAMES.values(), celery_service.INLINE_TASK_NAME,
+             celery_service.VARIANTS_TASK_NAME}
+    assert names <= set(celery_app.tasks)
+
+
+def test_dispatch_sends_task_by_name():
+    """Проверяет, что диспетчер ставит задачу по имени с параметрами и маршрутом."""
+    with patch.object(celery_app, "send_task") as send_task:
+        celery_service.dispatch_image_processing_task_crop("in.jpg", "out.jpg", 0, 0, 10, 10,
+                                                           routing={"queue": QUEUE_FAST, "priority": 5})
+    send_task.assert_called_once_with(
+        celery_service.CROP_TASK_NAME, args=("in.jpg", "out.jpg", 0, 0, 10, 10),
+        kwargs={"cache_key": None, "encode_options": None, "source": None}, queue=QUEUE_FAST, priority=5)
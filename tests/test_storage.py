@@ -0,0 +1,113 @@
+import hashlib
+import io
+
+import pytest
+
+from app.services.storage import LocalStorage, S3Storage, StorageBackend
+
+
+@pytest.fixture(params=["local", "s3"])
+def storage(request, tmp_path, monkeypatch):
+    """Хранилище каждого типа: локальное во временной папке и S3 на локальной заглушке moto."""
+    if request.param == "local":
+        yield LocalStorage(tmp_path / "data", buffer_size=4)
+        return
+
+    moto = pytest.importorskip("moto")
+    import boto3
+
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket="test-bucket")
+        yield S3Storage("test-bucket", prefix="worker/", buffer_size=4, client=client)
+
+
+def test_storage_contract(storage):
+    """Проверяет общий контракт хранилища: запись с хэшем, чтение, копирование, перечисление, удаление."""
+    hasher = hashlib.sha256()
+    written = storage.save("raw", "a.jpg", io.BytesIO(b"image bytes"), hasher=hasher)
+
+    assert written == len(b"image bytes")
+    assert hasher.hexdigest() == hashlib.sha256(b"image bytes").hexdigest()
+    assert storage.exists("raw", "a.jpg")
+    with storage.open("raw", "a.jpg") as source:
+        assert source.read() == b"image bytes"
+
+    storage.copy("raw", "a.jpg", "processed", "b.jpg")
+    storage.touch("processed", "b.jpg")
+    assert [(name, size) for name, size, _ in storage.list("processed")] == [("b.jpg", len(b"image bytes"))]
+
+    assert storage.delete("raw", "a.jpg")
+    assert not storage.delete("raw", "a.jpg")
+    assert not storage.exists("raw", "a.jpg")
+
+
+def test_storage_missing_file(storage):
+    """Проверяет, что отсутствующий файл дает FileNotFoundError для всех операций чтения."""
+    with pytest.raises(FileNotFoundError):
+        storage.open("raw", "missing.jpg")
+    with pytest.raises(FileNotFoundError):
+        storage.copy("raw", "missing.jpg", "processed", "copy.jpg")
+    with pytest.raises(FileNotFoundError):
+        storage.touch("raw", "missing.jpg")
+
+
+def test_failed_write_leaves_no_file(storage):
+    """Проверяет, что прерванная запись не оставляет частичного файла."""
+    with pytest.raises(RuntimeError):
+        with storage.writer("processed", "partial.jpg") as target:
+            target.write(b"half")
+            raise RuntimeError("encoder failed")
+
+    assert not storage.exists("processed", "partial.jpg")
+    assert list(storage.list("processed")) == []
+
+
+def test_pipeline_runs_on_any_storage(storage):
+    """Проверяет, что воркер читает исходник и пишет результат через выбранное хранилище."""
+    from app.services import image_processor
+    from app.services.storage import set_storage
+
+    set_storage(storage)
+    with open("./tests/test_image.jpg", "rb") as image_file:
+        storage.save("raw", "input.jpg", image_file)
+
+    assert image_processor.run_pipeline("input.jpg", "output.png", [{"op": "resize", "width": 32, "height": 16}])
+
+    with storage.open("processed", "output.png") as output_file:
+        assert output_file.read(8) == b"\x89PNG\r\n\x1a\n"
+
+
+def test_local_storage_shards_by_name_prefix(tmp_path):
+    """Проверяет раскладку по каталогам шардов и чтение файлов, оставшихся в плоском каталоге."""
+    storage = LocalStorage(tmp_path, shard_chars=2)
+    storage.save("raw", "AB12_raw.jpg", io.BytesIO(b"new"))
+    assert (tmp_path / "raw" / "ab" / "AB12_raw.jpg").is_file()
+
+    (tmp_path / "raw" / "cd34_raw.jpg").write_bytes(b"legacy")
+    with storage.open("raw", "cd34_raw.jpg") as source:
+        assert source.read() == b"legacy"
+    assert sorted(name for name, _, _ in storage.list("raw")) == ["AB12_raw.jpg", "cd34_raw.jpg"]
+    assert storage.delete("raw", "cd34_raw.jpg")
+    assert not (tmp_path / "raw" / "cd34_raw.jpg").exists()
+
+
+def test_storage_stat(storage):
+    """Проверяет размер и время модификации файла и FileNotFoundError для отсутствующего."""
+    storage.save("processed", "s.jpg", io.BytesIO(b"12345"))
+    size, mtime = storage.stat("processed", "s.jpg")
+    assert size == 5 and mtime > 0
+    with pytest.raises(FileNotFoundError):
+        storage.stat("processed", "missing.jpg")
+
+
+def test_incomplete_backend_fails_on_creation():
+    """Проверяет, что бэкенд без обязательных методов нельзя создать (а не получить ошибку посреди запроса)."""
+    class PartialStorage(StorageBackend):
+        def open(self, area, name):
+            raise FileNotFoundError(name)
+
+    with pytest.raises(TypeError, match="abstract"):
+        PartialStorage()
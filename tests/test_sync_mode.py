@@ -0,0 +1,89 @@
+import asyncio
+import io
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+from PIL import Image
+
+from app.services.sync_executor import BoundedExecutor, PoolSaturatedError
+
+
+def _small_png() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), "red").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class _SaturatedExecutor:
+    async def run(self, fn, *args):
+        raise PoolSaturatedError("Sync pool is saturated")
+
+
+def test_sync_mode_returns_processed_bytes(sync_client, data_dir):
+    """Проверяет, что ?mode=sync возвращает готовое изображение без задачи Celery и файлов на диске."""
+    files = {"image": ("small.png", io.BytesIO(_small_png()), "image/png")}
+    with patch("app.routers.image_processing.dispatch_image_processing_task_resize") as dispatch, \
+            patch("app.routers.image_processing.dispatch_image_processing_task_inline") as dispatch_inline:
+        response = sync_client.post("/resize?mode=sync", data={"width": 32, "height": 24}, files=files)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    with Image.open(io.BytesIO(response.content)) as result:
+        assert result.size == (32, 24)
+    assert not dispatch.called and not dispatch_inline.called
+    assert not list(data_dir.rglob("*.*"))
+
+
+def test_sync_mode_rejects_undecodable_image(sync_client):
+    """Проверяет ответ 400 на файл, который не удается декодировать."""
+    files = {"image": ("broken.png", io.BytesIO(b"not an image"), "image/png")}
+    response = sync_client.post("/grayscale?mode=sync", files=files)
+    assert response.status_code == 400
+
+
+def test_saturated_pool_falls_back_to_celery(sync_client, mock_celery_tasks: MagicMock, monkeypatch):
+    """Проверяет, что при занятом пуле запрос уходит в Celery и отвечает 202 с task_id."""
+    monkeypatch.setattr("app.routers.image_processing.sync_executor", _SaturatedExecutor())
+    with open("./tests/test_image.jpg", "rb") as image_file:
+        files = {"image": ("test_image.jpg", image_file, "image/jpeg")}
+        response = sync_client.post("/crop?mode=sync", data={"left": 0, "top": 0, "right": 10, "bottom": 10},
+                                    files=files)
+
+    assert response.status_code == 202
+    assert response.json()["task_id"] == "fake_task_id_123"
+    assert mock_celery_tasks.called
+
+
+def test_saturated_pool_rejects_with_reject_policy(sync_client, monkeypatch):
+    """Проверяет ответ 429 с Retry-After при политике reject."""
+    monkeypatch.setattr("app.routers.image_processing.sync_executor", _SaturatedExecutor())
+    monkeypatch.setattr("app.routers.image_processing.SYNC_SATURATED_POLICY", "reject")
+    files = {"image": ("small.png", io.BytesIO(_small_png()), "image/png")}
+    with patch("app.routers.image_processing.dispatch_image_processing_task_grayscale") as dispatch:
+        response = sync_client.post("/grayscale?mode=sync", files=files)
+
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "1"
+    assert not dispatch.called
+
+
+@pytest.mark.asyncio
+async def test_bounded_executor_limits_in_flight_work():
+    """Проверяет, что пул принимает не больше workers + pending задач и освобождает слот по завершении."""
+    executor = BoundedExecutor(max_workers=1, max_pending=1)
+    release = threading.Event()
+    try:
+        running = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert executor.in_flight == 2
+        with pytest.raises(PoolSaturatedError):
+            await executor.run(lambda: None)
+
+        release.set()
+        await asyncio.gather(*running)
+        assert executor.in_flight == 0
+        assert await executor.run(lambda: 42) == 42
+    finally:
+        release.set()
+        executor.shutdown()
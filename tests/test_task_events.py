@@ -0,0 +1,77 @@
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from fastapi import WebSocketDisconnect
+
+from app.routers.image_processing import task_events_websocket
+from app.services.task_events import iter_task_events, publish_task_event
+
+
+@pytest.mark.asyncio
+async def test_events_streamed_until_terminal_state(fake_redis):
+    """Проверяет, что подписчик получает текущее состояние и все последующие события до финального."""
+    publish_task_event("task_1", "STARTED", progress=0)
+
+    states = []
+    async for event in iter_task_events("task_1", timeout=5, heartbeat=0.05):
+        if event is None:
+            continue
+        states.append((event["state"], event["progress"]))
+        if event["state"] == "STARTED":
+            publish_task_event("task_1", "PROGRESS", progress=50)
+            publish_task_event("task_1", "SUCCESS", progress=100, result={"output": "out.jpg"})
+
+    assert states == [("STARTED", 0), ("PROGRESS", 50), ("SUCCESS", 100)]
+
+
+@pytest.mark.asyncio
+async def test_sse_endpoint_returns_last_terminal_event(sync_client, fake_redis):
+    """Проверяет, что SSE-поток отдает уже завершенную задачу одним событием и закрывается."""
+    publish_task_event("task_2", "SUCCESS", progress=100, result={"output": "out.jpg"})
+
+    response = sync_client.get("/task-events/task_2")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [json.loads(line[len("data: "):]) for line in response.text.splitlines() if line.startswith("data: ")]
+    assert [event["state"] for event in events] == ["SUCCESS"]
+    assert events[0]["result"] == {"output": "out.jpg"}
+
+
+@pytest.mark.asyncio
+async def test_websocket_falls_back_to_result_backend(sync_client, fake_redis):
+    """Проверяет, что без опубликованных событий WebSocket отдает статус из бэкенда результатов."""
+    status = {"task_id": "task_3", "status": "SUCCESS", "ready": True, "successful": True,
+              "result": {"output": "cached.jpg"}}
+    with patch("app.routers.image_processing.get_task_meta_async", AsyncMock(return_value=status)):
+        with sync_client.websocket_connect("/task-events/task_3") as websocket:
+            event = json.loads(websocket.receive_text())
+
+    assert event["state"] == "SUCCESS"
+    assert event["result"] == {"output": "cached.jpg"}
+
+
+@pytest.mark.asyncio
+async def test_websocket_pings_and_releases_subscription_on_send_failure():
+    """Проверяет пинг в паузах между событиями и закрытие подписки, когда клиент исчез."""
+    closed = []
+
+    async def idle_events(task_id, snapshot=None):
+        try:
+            while True:
+                yield None
+        finally:
+            closed.append(task_id)
+
+    websocket = MagicMock()
+    websocket.accept = AsyncMock()
+    websocket.close = AsyncMock()
+    websocket.send_text = AsyncMock(side_effect=[None, WebSocketDisconnect(1006)])
+    with patch("app.routers.image_processing.iter_task_events", idle_events):
+        await task_events_websocket(websocket, "task_4")
+
+    assert json.loads(websocket.send_text.call_args_list[0].args[0]) == {"type": "ping"}
+    assert closed == ["task_4"]
+    websocket.close.assert_not_called()
@@ -0,0 +1,57 @@
+import pytest
+
+from app.core.celery_app import celery_app
+from app.services.celery_service import TaskMetaCache, task_meta_cache
+
+
+@pytest.fixture
+def backend_meta(fake_redis):
+    """Записывает метаданные задачи в бэкенд результатов (fakeredis) в формате Celery."""
+    task_meta_cache.clear()
+    backend = celery_app.backend
+
+    def store(task_id: str, status: str, result=None):
+        meta = {"task_id": task_id, "status": status, "result": result, "traceback": None,
+                "children": [], "date_done": None}
+        fake_redis.set(backend.get_key_for_task(task_id), backend.encode(meta))
+
+    yield store
+    task_meta_cache.clear()
+
+
+def test_finished_task_status_is_served_from_cache(sync_client, backend_meta, fake_redis):
+    """Проверяет статус из Redis и то, что повторный опрос завершенной задачи не обращается к Redis."""
+    backend_meta("done_task", "SUCCESS", {"output": "out.jpg"})
+    response = sync_client.get("/task-status/done_task")
+    assert response.json() == {"task_id": "done_task", "status": "SUCCESS", "ready": True, "successful": True,
+                               "result": {"output": "out.jpg"}}
+
+    fake_redis.flushall()
+    assert sync_client.get("/task-status/done_task").json()["status"] == "SUCCESS"
+
+
+def test_unfinished_task_status_is_not_cached(sync_client, backend_meta):
+    """Проверяет, что PENDING/PROGRESS не кэшируются и следующий опрос видит новый статус."""
+    assert sync_client.get("/task-status/running_task").json()["status"] == "PENDING"
+
+    backend_meta("running_task", "PROGRESS", {"progress": 50})
+    data = sync_client.get("/task-status/running_task").json()
+    assert (data["status"], data["ready"], data["result"]) == ("PROGRESS", False, None)
+
+    backend_meta("running_task", "SUCCESS", {"output": "out.jpg"})
+    assert sync_client.get("/task-status/running_task").json()["status"] == "SUCCESS"
+
+
+def test_task_meta_cache_expires_and_evicts(monkeypatch):
+    """Проверяет TTL записей и вытеснение самых старых при переполнении."""
+    clock = [100.0]
+    monkeypatch.setattr("app.services.celery_service.time.monotonic", lambda: clock[0])
+    cache = TaskMetaCache(ttl=10, max_entries=2)
+    for task_id in ("a", "b", "c"):
+        cache.put({"task_id": task_id, "status": "SUCCESS", "result": None})
+    cache.put({"task_id": "d", "status": "STARTED", "result": None})
+
+    assert cache.get("a") is None and cache.get("d") is None
+    assert cache.get("c")["status"] == "SUCCESS"
+    clock[0] += 11
+    assert cache.get("c") is None
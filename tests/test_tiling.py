@@ -0,0 +1,93 @@
+import functools
+import io
+
+import pytest
+from PIL import Image, ImageChops
+
+from app.services import image_processor
+from app.services.tiling import (
+    ImageTooLargeError,
+    check_memory_budget,
+    estimate_decode_bytes,
+    limit_decode_rows,
+    process_in_strips,
+)
+
+
+TEST_IMAGE_PATH = "./tests/test_image.jpg"
+
+
+def _reference_image() -> Image.Image:
+    with Image.open(TEST_IMAGE_PATH) as img:
+        return img.convert("RGB")
+
+
+def _png_stream(img: Image.Image) -> io.BytesIO:
+    stream = io.BytesIO()
+    img.save(stream, "PNG")
+    stream.seek(0)
+    return stream
+
+
+def test_strips_match_full_frame():
+    """Проверяет, что полосная обработка в нескольких потоках дает тот же результат, что и обработка кадра целиком."""
+    img = _reference_image()
+
+    tiled = process_in_strips(img, image_processor.to_sepia, strip_height=100, workers=3)
+
+    assert tiled.mode == "RGB"
+    assert ImageChops.difference(tiled, image_processor.to_sepia(img)).getbbox() is None
+
+
+def test_pointwise_operations_switch_to_strips(monkeypatch):
+    """Проверяет, что выше порога попиксельные операции в пайплайне выполняются полосами."""
+    calls = []
+    monkeypatch.setattr(image_processor, "TILED_THRESHOLD_PIXELS", 1)
+    monkeypatch.setattr(image_processor, "run_pointwise_in_bands",
+                        lambda img, operation, transform, workers: calls.append(img.size) or transform(img))
+
+    result = image_processor.apply_operations(_reference_image(), [{"op": "grayscale"}])
+
+    assert result.mode == "L"
+    assert calls == [(1280, 1280)]
+
+
+def test_crop_decodes_only_needed_rows():
+    """Проверяет, что для PNG crop декодирует только строки до нижней границы области."""
+    reference = _reference_image()
+
+    with Image.open(_png_stream(reference)) as img:
+        cropped = image_processor.to_cropped(img, 100, 50, 300, 200)
+
+        assert img.size == (1280, 200)
+    assert ImageChops.difference(cropped, reference.crop((100, 50, 300, 200))).getbbox() is None
+
+
+def test_limit_decode_rows_skips_jpeg():
+    """Проверяет, что для JPEG (декодер не умеет останавливаться раньше) ограничение не применяется."""
+    with Image.open(TEST_IMAGE_PATH) as img:
+        assert not limit_decode_rows(img, 100)
+        assert img.size == (1280, 1280)
+
+
+def test_memory_budget():
+    """Проверяет, что изображение больше потолка памяти отклоняется до декодирования."""
+    with Image.open(TEST_IMAGE_PATH) as img:
+        check_memory_budget(img, limit=1280 * 1280 * 8)
+        check_memory_budget(img, rows=100, limit=1280 * 100 * 8)
+        with pytest.raises(ImageTooLargeError):
+            check_memory_budget(img, limit=1280 * 1280 * 8 - 1)
+
+
+def test_crop_budget_counts_rows_only_when_decoding_stops_there(monkeypatch):
+    """Проверяет, что бюджет для crop считается по строкам обрезки только для PNG, а JPEG — по всему кадру."""
+    limit = estimate_decode_bytes(1280, 1279, "RGB")
+    monkeypatch.setattr(image_processor, "check_memory_budget", functools.partial(check_memory_budget, limit=limit))
+    crop = [{"op": "crop", "left": 0, "top": 0, "right": 200, "bottom": 100}]
+
+    with Image.open(_png_stream(_reference_image())) as img:
+        assert image_processor.apply_operations(img, crop).size == (200, 100)
+
+    with Image.open(TEST_IMAGE_PATH) as img:
+        with pytest.raises(ImageTooLargeError):
+            image_processor.apply_operations(img, crop)
@@ -0,0 +1,99 @@
+import io
+import zipfile
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from PIL import Image
+
+from app.services.image_processor import build_variants
+from app.services.storage import get_storage
+
+
+def _jpeg(size=(800, 600)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "blue").save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def test_build_variants_resizes_each_width_and_format():
+    """Проверяет размеры и форматы вариантов и то, что ширины больше исходной не увеличиваются."""
+    get_storage().save("raw", "source.jpg", io.BytesIO(_jpeg()))
+    progress = []
+    variants = build_variants("source.jpg", "source_variants", [200, 400, 1600], ["jpeg", "webp"],
+                              on_progress=progress.append)
+
+    assert [(v["width"], v["height"], v["format"]) for v in variants] == [
+        (200, 150, "jpeg"), (200, 150, "webp"),
+        (400, 300, "jpeg"), (400, 300, "webp"),
+        (800, 600, "jpeg"), (800, 600, "webp"),
+    ]
+    assert len(progress) == 6 and max(progress) < 100
+    for variant in variants:
+        with get_storage().open("processed", variant["filename"]) as variant_file:
+            with Image.open(variant_file) as image:
+                assert image.size == (variant["width"], variant["height"])
+                assert image.format == {"jpeg": "JPEG", "webp": "WEBP"}[variant["format"]]
+
+
+@pytest.mark.parametrize("widths, formats", [
+    ("abc", ""),
+    ("8,320", ""),
+    ("320,100000", ""),
+    ("320", "bmp"),
+])
+def test_variants_endpoint_validates_input(sync_client, widths, formats):
+    """Проверяет ответ 422 на некорректные ширины и форматы."""
+    files = {"image": ("photo.jpg", io.BytesIO(_jpeg()), "image/jpeg")}
+    with patch("app.routers.image_processing.dispatch_image_variants") as dispatch:
+        response = sync_client.post("/variants", data={"widths": widths, "formats": formats}, files=files)
+    assert response.status_code == 422
+    assert not dispatch.called
+
+
+def test_variants_endpoint_dispatches_single_task(sync_client):
+    """Проверяет, что все варианты ставятся одной задачей с разобранными ширинами и форматами."""
+    files = {"image": ("photo.jpg", io.BytesIO(_jpeg()), "image/jpeg")}
+    with patch("app.routers.image_processing.dispatch_image_variants") as dispatch:
+        dispatch.return_value.id = "variants_task"
+        dispatch.return_value.name = "app.tasks.tasks.process_image_variants"
+        response = sync_client.post("/variants", data={"widths": "[640, 320, 640]", "formats": "webp,original"},
+                                    files=files)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["manifest_url"] == "/variants/variants_task"
+    assert body["widths"] == [320, 640]
+    assert body["formats"] == ["webp", "jpeg"]
+    assert dispatch.call_args.args[2:4] == ([320, 640], ["webp", "jpeg"])
+
+
+@pytest.fixture
+def finished_variants():
+    """Готовая задача с двумя вариантами в хранилище."""
+    get_storage().save("raw", "source.jpg", io.BytesIO(_jpeg()))
+    variants = build_variants("source.jpg", "photo_variants", [100, 200], ["webp"])
+    task_meta = {"task_id": "some_task", "status": "SUCCESS",
+                 "result": {"status": "COMPLETED", "input": "source.jpg", "variants": variants}}
+    with patch("app.routers.image_processing.get_task_meta_async", AsyncMock(return_value=task_meta)):
+        yield variants
+
+
+def test_variants_manifest_and_downloads(sync_client, finished_variants):
+    """Проверяет манифест, скачивание одного варианта и zip-архив без удаления файлов."""
+    response = sync_client.get("/variants/some_task")
+    assert response.status_code == 200
+    manifest = response.json()["variants"]
+    assert [variant["width"] for variant in manifest] == [100, 200]
+
+    response = sync_client.get(manifest[0]["url"])
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert len(response.content) == manifest[0]["size_bytes"]
+
+    response = sync_client.get("/variants/some_task/zip")
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert sorted(archive.namelist()) == ["100w.webp", "200w.webp"]
+
+    assert sync_client.get("/variants/some_task/unknown.webp").status_code == 404
+    assert all(get_storage().exists("processed", variant["filename"]) for variant in finished_variants)
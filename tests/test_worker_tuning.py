@@ -0,0 +1,33 @@
+import os
+
+from app.core import worker_tuning
+from app.core.worker_tuning import available_cpus, preload_pillow, select_serializer, worker_settings
+
+
+def test_available_cpus_respects_cgroup_quota(tmp_path):
+    """Проверяет, что квота CPU контейнера ограничивает число процессов пула."""
+    affinity = len(os.sched_getaffinity(0))
+    cpu_max = tmp_path / "cpu.max"
+
+    cpu_max.write_text("max 100000\n")
+    assert available_cpus(cpu_max) == affinity
+    cpu_max.write_text("50000 100000\n")
+    assert available_cpus(cpu_max) == 1
+    assert available_cpus(tmp_path / "missing") == affinity
+
+
+def test_serializer_falls_back_to_json_without_msgpack(monkeypatch):
+    """Проверяет переход на json, если пакет msgpack не установлен, и прием json в любом случае."""
+    monkeypatch.setattr(worker_tuning.importlib.util, "find_spec", lambda name: None)
+    assert select_serializer("msgpack") == "json"
+
+    monkeypatch.setattr(worker_tuning, "select_serializer", lambda: "msgpack")
+    settings = worker_settings(concurrency=3)
+    assert settings["worker_concurrency"] == 3
+    assert settings["task_serializer"] == settings["result_serializer"] == "msgpack"
+    assert settings["accept_content"] == ["json", "msgpack"]
+
+
+def test_preload_pillow_warms_codecs():
+    """Проверяет прогрев кодеков Pillow перед fork."""
+    assert preload_pillow(("jpeg", "png")) == ["jpeg", "png"]